@@ -2,11 +2,14 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
-from openai import OpenAI
 import os
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail
+from app import transport
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -14,9 +17,17 @@ login = LoginManager()
 csrf = CSRFProtect()
 login.login_view = 'auth.login'
 login.login_message = 'Por favor, faça login para acessar esta página.'
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+client = transport.build_openai_client()
 mail = Mail()
 
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # O SQLite só aplica as chaves estrangeiras (e o ON DELETE CASCADE) com este pragma
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 def create_app():
     app = Flask(__name__, static_url_path='', static_folder='static', template_folder='templates')
     app.config.from_object(Config)
@@ -37,6 +48,24 @@ def create_app():
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
+    from app.jobs import jobs_cli
+    app.cli.add_command(jobs_cli)
+
+    from app.regenerate import regen_cli
+    app.cli.add_command(regen_cli)
+
+    from app.usage import usage_cli
+    app.cli.add_command(usage_cli)
+
+    from app.openai_stub import stub_cli
+    app.cli.add_command(stub_cli)
+
+    from app.bench import bench_cli
+    app.cli.add_command(bench_cli)
+
+    from app.query_plans import plans_cli
+    app.cli.add_command(plans_cli)
+
     @login.user_loader
     def load_user(id):
         return User.query.get(int(id))
@@ -0,0 +1,111 @@
+from flask import current_app, g
+from concurrent.futures import ThreadPoolExecutor
+from app import transport, scheduler, usage
+import asyncio
+import threading
+
+# Caminho assíncrono para as chamadas ao LLM. Um único event loop, numa
+# thread própria do processo, faz todas as chamadas ao AsyncOpenAI; centenas
+# de chamadas em andamento ocupam só essa thread. Views async e jobs async
+# mandam as corrotinas para esse loop e esperam o resultado; o trabalho de
+# banco vai para um pool de threads à parte (`db`), nunca para o loop.
+
+_loop = None
+_client = None
+_db_pool = None
+_lock = threading.Lock()
+
+
+def _identity():
+    # Usuário e ideia da requisição ou do job, para o escalonador e o registro de uso
+    return scheduler.current_user_id(), usage.current_idea_id()
+
+
+def _push_context(app, user_id, idea_id):
+    ctx = app.app_context()
+    ctx.push()
+    g.job_user_id = user_id
+    g.job_idea_id = idea_id
+    return ctx
+
+
+def get_loop():
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='llm-event-loop', daemon=True).start()
+        return _loop
+
+
+def client():
+    # Criado na primeira chamada, já dentro do loop
+    global _client
+    if _client is None:
+        _client = transport.build_async_openai_client()
+    return _client
+
+
+async def _run_in_context(app, user_id, idea_id, func, args, kwargs):
+    # Cada task do loop tem sua própria cópia do contexto, então o contexto
+    # de aplicação empilhado aqui não vaza para as outras
+    ctx = _push_context(app, user_id, idea_id)
+    try:
+        return await func(*args, **kwargs)
+    finally:
+        ctx.pop()
+
+
+def _submit(func, args, kwargs):
+    user_id, idea_id = _identity()
+    coro = _run_in_context(current_app._get_current_object(), user_id, idea_id, func, args, kwargs)
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def call(func, *args, **kwargs):
+    # Executa a corrotina `func` no loop do LLM e espera sem bloquear o loop atual
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is get_loop():
+        return await func(*args, **kwargs)
+    return await asyncio.wrap_future(_submit(func, args, kwargs))
+
+
+def run_detached(func, *args, **kwargs):
+    # Agenda a corrotina no loop do LLM sem esperar; devolve o Future
+    return _submit(func, args, kwargs)
+
+
+def run(func, *args, **kwargs):
+    # Para código síncrono (threads de job, comandos): bloqueia até o resultado
+    return _submit(func, args, kwargs).result()
+
+
+def _get_db_pool():
+    global _db_pool
+    with _lock:
+        if _db_pool is None:
+            _db_pool = ThreadPoolExecutor(
+                max_workers=current_app.config.get('DB_THREAD_POOL_SIZE', 8),
+                thread_name_prefix='db-worker'
+            )
+        return _db_pool
+
+
+async def db(func, *args, **kwargs):
+    # Roda `func` no pool de threads do banco, em um contexto de aplicação
+    # próprio que é descartado no fim (e com ele a sessão): devolva valores
+    # simples ou objetos com os atributos necessários já carregados.
+    app = current_app._get_current_object()
+    user_id, idea_id = _identity()
+
+    def run_with_context():
+        ctx = _push_context(app, user_id, idea_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            ctx.pop()
+
+    return await asyncio.get_running_loop().run_in_executor(_get_db_pool(), run_with_context)
@@ -0,0 +1,296 @@
+from flask import current_app
+from flask.cli import AppGroup
+from openai import OpenAI
+from app import memory, routing
+from app.models import Idea, Goal, ChatMessage, MarketResearch
+from app.routes import (
+    IdeaTitle, QuestionList, TaskList, SWOTAnalysisModel, idea_title_request, idea_questions_request,
+    initial_tasks_messages, swot_messages, goals_messages, market_research_messages, more_tasks_messages,
+    legal_steps_messages, prepare_assistant_context
+)
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import click
+import hashlib
+import json
+import os
+import statistics
+import time
+
+# Benchmark de prompts reais: remonta, a partir do banco (aponte
+# SQLALCHEMY_DATABASE_URI para um snapshot), exatamente os prompts que cada
+# gerador enviaria para as ideias selecionadas e os reenvia para um endpoint
+# compatível com a OpenAI (o stub de `flask openai-stub` ou a API real), sem
+# passar pelo cache, orçamento ou registro de uso do app. O relatório JSON
+# traz tokens, percentis de latência e tamanho da saída por rota e modelo, e
+# `flask bench compare` mostra a diferença entre duas execuções.
+
+bench_cli = AppGroup('bench', help='Benchmark dos prompts de geração.')
+
+
+def _goal_params(idea):
+    latest = idea.goals.order_by(Goal.created_at.desc()).first()
+    return (
+        latest.timeframe if latest and latest.timeframe else 'trimestral',
+        latest.aggression if latest and latest.aggression else 3,
+        0,
+        ''
+    )
+
+
+def _market_research_params(idea):
+    latest = MarketResearch.query.filter_by(idea_id=idea.id).order_by(MarketResearch.created_at.desc()).first()
+    return (latest.location if latest and latest.location else ''), ['competitors', 'trends', 'regulations']
+
+
+def _chat_messages(idea):
+    # Replay da última pergunta do usuário, com a memória e o contexto atuais
+    last = ChatMessage.query.filter_by(idea_id=idea.id, role='user').order_by(ChatMessage.id.desc()).first()
+    if last is None:
+        return None
+    messages = memory.build_messages(idea.id, prepare_assistant_context(idea, last.content), 'chat_with_assistant')
+    while messages[-1]['role'] == 'assistant':
+        messages.pop()
+    return messages
+
+
+# Rota -> (prompt da ideia ou None se não se aplica, formato da resposta)
+GENERATORS = {
+    'save_idea': (lambda idea: idea_title_request(idea.description)['messages'], IdeaTitle),
+    'generate_questions': (lambda idea: idea_questions_request(idea.description)['messages'], QuestionList),
+    'generate_tasks': (lambda idea: initial_tasks_messages(idea.id), TaskList),
+    'generate_swot_analysis': (swot_messages, SWOTAnalysisModel),
+    'generate_goals': (lambda idea: goals_messages(idea, *_goal_params(idea)), None),
+    'generate_market_research': (lambda idea: market_research_messages(idea, *_market_research_params(idea)), None),
+    'generate_more_tasks': (more_tasks_messages, None),
+    'generate_legal_steps': (legal_steps_messages, None),
+    'chat_with_assistant': (_chat_messages, None),
+}
+
+
+def _response_format(model):
+    if model is None:
+        return None
+    return {'type': 'json_schema', 'json_schema': {'name': model.__name__, 'schema': model.model_json_schema()}}
+
+
+def _prompt_hash(messages):
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def _select_ideas(idea_ids, limit):
+    query = Idea.query.order_by(Idea.id)
+    if idea_ids:
+        query = query.filter(Idea.id.in_(idea_ids))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _build_prompts(routes, ideas):
+    prompts = []
+    for idea in ideas:
+        for route in routes:
+            build, response_format = GENERATORS[route]
+            messages = build(idea)
+            if messages:
+                prompts.append({
+                    'route': route,
+                    'idea_id': idea.id,
+                    'messages': messages,
+                    'response_format': _response_format(response_format),
+                    'prompt_hash': _prompt_hash(messages)
+                })
+    return prompts
+
+
+def _replay(client, prompt, model, stream):
+    body = {'model': model, 'messages': prompt['messages']}
+    if prompt['response_format'] is not None:
+        body['response_format'] = prompt['response_format']
+    sample = {'route': prompt['route'], 'model': model, 'idea_id': prompt['idea_id'], 'prompt_hash': prompt['prompt_hash']}
+    start = time.monotonic()
+    try:
+        if stream:
+            first_token = None
+            parts = []
+            usage = None
+            for chunk in client.chat.completions.create(stream=True, stream_options={'include_usage': True}, **body):
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    parts.append(chunk.choices[0].delta.content)
+            content = ''.join(parts)
+            sample['ttft_ms'] = round(first_token * 1000, 1) if first_token is not None else None
+        else:
+            completion = client.chat.completions.create(**body)
+            content = completion.choices[0].message.content or ''
+            usage = completion.usage
+        sample.update(
+            ok=True,
+            latency_ms=round((time.monotonic() - start) * 1000, 1),
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+            output_chars=len(content)
+        )
+    except Exception as e:
+        sample.update(ok=False, latency_ms=round((time.monotonic() - start) * 1000, 1), error=f"{type(e).__name__}: {e}")
+    return sample
+
+
+def _percentile(values, fraction):
+    # Mesmo critério (posição mais próxima) do p95 de app/routing.py
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _summary(samples):
+    ok = [s for s in samples if s['ok']]
+    summary = {'requests': len(samples), 'errors': len(samples) - len(ok)}
+    if not ok:
+        return summary
+    latencies = [s['latency_ms'] for s in ok]
+    summary['latency_ms'] = {
+        'mean': round(statistics.mean(latencies), 1),
+        'p50': _percentile(latencies, 0.5),
+        'p90': _percentile(latencies, 0.9),
+        'p95': _percentile(latencies, 0.95),
+        'p99': _percentile(latencies, 0.99),
+        'max': max(latencies)
+    }
+    ttfts = [s['ttft_ms'] for s in ok if s.get('ttft_ms') is not None]
+    if ttfts:
+        summary['ttft_ms'] = {'p50': _percentile(ttfts, 0.5), 'p95': _percentile(ttfts, 0.95)}
+    for field in ('prompt_tokens', 'completion_tokens', 'output_chars'):
+        values = [s[field] for s in ok if s.get(field) is not None]
+        if values:
+            summary[field] = {'mean': round(statistics.mean(values), 1), 'total': sum(values)}
+    return summary
+
+
+def _group(samples):
+    groups = {}
+    for sample in samples:
+        groups.setdefault(f"{sample['route']}|{sample['model']}", []).append(sample)
+    return {key: _summary(group) for key, group in sorted(groups.items())}
+
+
+def _default_output():
+    base = current_app.config.get('BENCH_REPORT_DIR') or os.path.join(current_app.instance_path, 'benchmarks')
+    return os.path.join(base, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+
+
+@bench_cli.command('run')
+@click.option('--route', 'routes', multiple=True, type=click.Choice(sorted(GENERATORS)), help='Rota a medir (pode repetir; padrão: todas).')
+@click.option('--model', 'models', multiple=True, help='Modelo a usar (pode repetir; padrão: o primeiro da rota).')
+@click.option('--idea-id', 'idea_ids', multiple=True, type=int, help='Ideia usada como entrada (pode repetir).')
+@click.option('--limit', default=20, help='Número máximo de ideias.')
+@click.option('--repeat', default=1, help='Vezes que cada prompt é enviado.')
+@click.option('--concurrency', default=4, help='Chamadas simultâneas.')
+@click.option('--stream', is_flag=True, help='Usa streaming e mede o tempo até o primeiro token.')
+@click.option('--base-url', help='Endpoint compatível com a OpenAI (padrão: OPENAI_BASE_URL).')
+@click.option('--api-key', help='Chave da API (padrão: OPENAI_API_KEY).')
+@click.option('--timeout', default=120.0, help='Prazo de cada chamada, em segundos.')
+@click.option('--label', default='', help='Descrição da execução gravada no relatório.')
+@click.option('--output', help='Arquivo do relatório JSON.')
+def run_command(routes, models, idea_ids, limit, repeat, concurrency, stream, base_url, api_key, timeout, label, output):
+    """Reenvia os prompts de geração remontados do banco e grava um relatório JSON."""
+    config = current_app.config
+    routes = routes or sorted(GENERATORS)
+    ideas = _select_ideas(idea_ids, limit)
+    prompts = _build_prompts(routes, ideas)
+    if not prompts:
+        click.echo('Nenhum prompt para as ideias selecionadas.')
+        return
+
+    base_url = base_url or config.get('OPENAI_BASE_URL')
+    client = OpenAI(
+        api_key=api_key or config.get('OPENAI_API_KEY') or 'bench',
+        base_url=base_url,
+        max_retries=0,
+        timeout=timeout
+    )
+    calls = [
+        (prompt, model)
+        for prompt in prompts
+        for model in (models or routing.tiers(prompt['route'])[:1])
+        for _ in range(repeat)
+    ]
+    click.echo(f"{len(prompts)} prompt(s) de {len(ideas)} ideia(s); {len(calls)} chamada(s) para {base_url or 'a OpenAI'}.")
+
+    started_at = datetime.utcnow()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda call: _replay(client, call[0], call[1], stream), calls))
+    elapsed = time.monotonic() - start
+
+    report = {
+        'label': label,
+        'started_at': started_at.isoformat(),
+        'elapsed_s': round(elapsed, 2),
+        'base_url': base_url,
+        'stream': stream,
+        'concurrency': concurrency,
+        'repeat': repeat,
+        'idea_ids': [idea.id for idea in ideas],
+        'summary': _group(samples),
+        'samples': samples
+    }
+    output = output or _default_output()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for key, summary in report['summary'].items():
+        latency = summary.get('latency_ms', {})
+        click.echo(
+            f"{key}: {summary['requests']} chamada(s), {summary['errors']} erro(s), "
+            f"p50 {latency.get('p50', '-')} ms, p95 {latency.get('p95', '-')} ms, "
+            f"{summary.get('completion_tokens', {}).get('mean', '-')} tokens de saída em média"
+        )
+    click.echo(f"Relatório gravado em {output}.")
+
+
+def _metric(summary, path):
+    value = summary
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+COMPARED_METRICS = (
+    ('p50 ms', ('latency_ms', 'p50')),
+    ('p95 ms', ('latency_ms', 'p95')),
+    ('tokens entrada', ('prompt_tokens', 'mean')),
+    ('tokens saída', ('completion_tokens', 'mean')),
+    ('caracteres saída', ('output_chars', 'mean')),
+    ('erros', ('errors',)),
+)
+
+
+@bench_cli.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('candidate', type=click.Path(exists=True, dir_okay=False))
+def compare_command(baseline, candidate):
+    """Compara dois relatórios de `flask bench run` por rota e modelo."""
+    with open(baseline, encoding='utf-8') as f:
+        before = json.load(f)['summary']
+    with open(candidate, encoding='utf-8') as f:
+        after = json.load(f)['summary']
+
+    for key in sorted(set(before) | set(after)):
+        if key not in before or key not in after:
+            click.echo(f"{key}: só em {'candidate' if key in after else 'baseline'}")
+            continue
+        parts = []
+        for name, path in COMPARED_METRICS:
+            old, new = _metric(before[key], path), _metric(after[key], path)
+            if old is None or new is None:
+                continue
+            change = f" ({(new - old) / old * 100:+.1f}%)" if old else ''
+            parts.append(f"{name} {old} -> {new}{change}")
+        click.echo(f"{key}: " + '; '.join(parts))
@@ -0,0 +1,100 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.models import Question
+from collections import OrderedDict
+from threading import Lock
+import time
+
+# Trechos de contexto dos prompts ("Ideia + Q&A") montados uma vez por ideia e
+# seção e reaproveitados entre chamadas. Os eventos do ORM em Question
+# invalidam as seções afetadas. Gastos e tarefas entram no contexto do
+# assistente pela busca de app/retrieval.py.
+
+_cache = OrderedDict()  # (idea_id, seção) -> (criado_em, texto)
+_lock = Lock()
+
+
+def _questions(idea_id):
+    questions = Question.query.filter_by(idea_id=idea_id).all()
+    return ''.join(f"Q: {q.text}\nA: {q.answer}\n\n" for q in questions)
+
+
+def _questions_detailed(idea_id):
+    questions = Question.query.filter_by(idea_id=idea_id).all()
+    return ''.join(f"Pergunta: {q.text}\nResposta: {q.answer}\n" for q in questions)
+
+
+SECTIONS = {
+    'questions': _questions,
+    'questions_detailed': _questions_detailed,
+}
+
+# Seções que dependem de cada modelo
+_DEPENDENCIES = {
+    Question: ('questions', 'questions_detailed'),
+}
+
+
+def section(idea_id, name):
+    key = (idea_id, name)
+    ttl = current_app.config.get('CONTEXT_CACHE_TTL', 300)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    text = SECTIONS[name](idea_id)
+
+    with _lock:
+        _cache[key] = (now, text)
+        _cache.move_to_end(key)
+        max_entries = current_app.config.get('CONTEXT_CACHE_MAX_ENTRIES', 2000)
+        while len(_cache) > max_entries:
+            _cache.popitem(last=False)
+    return text
+
+
+def business_context(idea):
+    return f"Ideia de negócio: {idea.description}\n\n" + section(idea.id, 'questions')
+
+
+def invalidate(idea_id, sections=None):
+    with _lock:
+        for name in sections or SECTIONS:
+            _cache.pop((idea_id, name), None)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def _on_change(mapper, connection, target):
+    if target.idea_id is None:
+        return
+    sections = _DEPENDENCIES[mapper.class_]
+    invalidate(target.idea_id, sections)
+    # Invalida de novo após o commit, para descartar snapshots montados por
+    # outras requisições enquanto esta transação ainda estava aberta
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('context_invalidations', set()).add((target.idea_id, sections))
+
+
+for _model in _DEPENDENCIES:
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _on_change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for idea_id, sections in session.info.pop('context_invalidations', ()):
+        invalidate(idea_id, sections)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('context_invalidations', None)
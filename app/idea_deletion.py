@@ -0,0 +1,104 @@
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, with_loader_criteria
+from app import db, jobs, idea_context, legal_answers, retrieval
+from app.models import (
+    Idea, Question, Task, SWOT, SWOTItem, SWOTAnalysis, Expense, ChatMessage, NetworkingContact, NetworkingPost,
+    Goal, LegalStep, LegalConsultation, MarketResearch, Customer
+)
+from datetime import datetime
+import time
+
+# Exclusão de ideias pelas chaves estrangeiras com ON DELETE CASCADE: um
+# único DELETE na ideia remove tarefas, despesas, SWOT, associações de tags e
+# o resto. Ideias grandes (mais de IDEA_PURGE_THRESHOLD linhas) são marcadas
+# com `deleted_at` e somem na hora para o usuário; um job remove os dados em
+# blocos de IDEA_PURGE_BATCH linhas, cada bloco numa transação curta, e por
+# fim apaga a ideia. Ideias marcadas ficam fora de todas as consultas ORM,
+# salvo com execution_options(include_deleted=True).
+
+CHILDREN = (
+    ChatMessage, Task, Question, Expense, Goal, MarketResearch, LegalStep, LegalConsultation,
+    NetworkingContact, NetworkingPost, Customer
+)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _hide_deleted_ideas(state):
+    if (
+        state.is_select
+        and not state.is_column_load
+        and not state.is_relationship_load
+        and not state.execution_options.get('include_deleted', False)
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(Idea, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
+
+
+def _swot_ids(idea_id):
+    return select(SWOT.id).where(SWOT.idea_id == idea_id)
+
+
+def _purge_targets(idea_id):
+    # Netos antes dos filhos, para que nenhum DELETE em cascata fique grande
+    return [
+        (SWOTItem, SWOTItem.swot_id.in_(_swot_ids(idea_id))),
+        (SWOTAnalysis, SWOTAnalysis.swot_id.in_(_swot_ids(idea_id))),
+    ] + [(model, model.idea_id == idea_id) for model in CHILDREN]
+
+
+def child_count(idea_id):
+    counts = [
+        select(func.count()).select_from(model).where(condition).scalar_subquery()
+        for model, condition in _purge_targets(idea_id)
+    ]
+    return sum(db.session.execute(select(*counts)).one())
+
+
+def _forget(idea_id):
+    idea_context.invalidate(idea_id)
+    legal_answers.forget_idea(idea_id)
+    retrieval.invalidate(idea_id)
+
+
+# Exclui a ideia; devolve True quando a remoção dos dados ficou para o job
+def delete_idea(idea):
+    idea_id = idea.id
+    if child_count(idea_id) > current_app.config.get('IDEA_PURGE_THRESHOLD', 2000):
+        idea.deleted_at = datetime.utcnow()
+        # enqueue confirma a marcação e o job na mesma transação
+        jobs.enqueue('purge_idea', {'idea_id': idea_id}, user_id=idea.user_id, idea_id=idea_id)
+        background = True
+    else:
+        db.session.execute(db.delete(Idea).where(Idea.id == idea_id).execution_options(synchronize_session=False))
+        db.session.commit()
+        background = False
+    _forget(idea_id)
+    return background
+
+
+@jobs.handler('purge_idea')
+def purge_idea(idea_id):
+    config = current_app.config
+    batch = config.get('IDEA_PURGE_BATCH', 500)
+    pause = config.get('IDEA_PURGE_PAUSE', 0.05)
+
+    removed = 0
+    for model, condition in _purge_targets(idea_id):
+        while True:
+            ids = select(model.id).where(condition).limit(batch)
+            deleted = db.session.execute(
+                db.delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            removed += deleted
+            if deleted < batch:
+                break
+            # Deixa outras escritas passarem entre os blocos
+            time.sleep(pause)
+
+    db.session.execute(db.delete(Idea).where(Idea.id == idea_id).execution_options(synchronize_session=False))
+    db.session.commit()
+    _forget(idea_id)
+    return {'success': True, 'removed': removed}
@@ -0,0 +1,147 @@
+from flask import current_app, request, jsonify, make_response
+from flask_login import current_user
+from functools import wraps
+from app import db
+from app.models import IdempotencyRecord
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+
+# Coalescência de requisições de geração. Requisições idênticas do mesmo
+# usuário para a mesma operação (ou com o mesmo cabeçalho Idempotency-Key)
+# compartilham uma única execução: a primeira vira líder e as demais esperam
+# o resultado dela. Respostas concluídas são reaproveitadas por um período:
+# IDEMPOTENCY_TTL com chave explícita, SINGLE_FLIGHT_REPLAY_WINDOW sem chave
+# (cobre o clique duplo). O registro fica no banco para valer entre processos.
+
+_events = {}
+_events_lock = threading.Lock()
+_claims_since_purge = 0
+_purge_lock = threading.Lock()
+
+
+def _claim(key, user_id, operation, request_hash, lease):
+    global _claims_since_purge
+    table = IdempotencyRecord.__table__
+    now = datetime.utcnow()
+    with _purge_lock:
+        _claims_since_purge += 1
+        purge_all = _claims_since_purge >= current_app.config.get('IDEMPOTENCY_PURGE_INTERVAL', 100)
+        if purge_all:
+            _claims_since_purge = 0
+    with db.engine.begin() as conn:
+        # Registros vencidos (inclusive de líderes que morreram) não bloqueiam
+        expired = table.c.expires_at < now
+        conn.execute(table.delete().where(expired if purge_all else db.and_(table.c.key == key, expired)))
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(
+                key=key, user_id=user_id, operation=operation, request_hash=request_hash,
+                status='pending', created_at=now, expires_at=now + timedelta(seconds=lease)
+            ))
+        return True
+    except IntegrityError:
+        return False
+
+
+def _load(key):
+    table = IdempotencyRecord.__table__
+    with db.engine.connect() as conn:
+        return conn.execute(db.select(table).where(table.c.key == key)).first()
+
+
+def _finish(key, response, ttl):
+    table = IdempotencyRecord.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.key == key).values(
+            status='done',
+            status_code=response.status_code,
+            mimetype=response.mimetype,
+            response=response.get_data(as_text=True),
+            expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+        ))
+
+
+def _release(key):
+    table = IdempotencyRecord.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.key == key, table.c.status == 'pending'))
+
+
+def _wait(key, timeout):
+    deadline = time.monotonic() + timeout
+    poll_interval = current_app.config.get('SINGLE_FLIGHT_POLL_INTERVAL', 0.2)
+    while True:
+        record = _load(key)
+        if record is None or record.status == 'done':
+            return record
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return record
+        # Líder no mesmo processo avisa pelo evento; de outro processo, só pelo banco
+        with _events_lock:
+            event = _events.get(key)
+        if event is not None:
+            event.wait(min(poll_interval * 10, remaining))
+        else:
+            time.sleep(min(poll_interval, remaining))
+
+
+def _replay(record):
+    response = make_response(record.response, record.status_code)
+    response.mimetype = record.mimetype
+    response.headers['Idempotent-Replay'] = 'true'
+    return response
+
+
+def single_flight(operation):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'POST':
+                return current_app.ensure_sync(view)(*args, **kwargs)
+
+            config = current_app.config
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            client_key = request.headers.get('Idempotency-Key')
+            identity = client_key or f"{request_hash}:{sorted(kwargs.items())}"
+            key = hashlib.sha256(f"{current_user.id}:{operation}:{identity}".encode('utf-8')).hexdigest()
+            ttl = config.get('IDEMPOTENCY_TTL', 86400) if client_key else config.get('SINGLE_FLIGHT_REPLAY_WINDOW', 10)
+
+            for _ in range(2):
+                if _claim(key, current_user.id, operation, request_hash, config.get('SINGLE_FLIGHT_LEASE', 120)):
+                    break
+                record = _wait(key, config.get('SINGLE_FLIGHT_WAIT', 60))
+                if record is None:
+                    # O líder falhou e liberou a vaga; tenta assumir
+                    continue
+                if client_key and record.request_hash != request_hash:
+                    return jsonify({'success': False, 'error': 'Idempotency-Key já usada com outra requisição'}), 422
+                if record.status == 'done':
+                    return _replay(record)
+                return jsonify({'success': False, 'error': 'Uma requisição idêntica ainda está em andamento'}), 409
+            else:
+                return jsonify({'success': False, 'error': 'Uma requisição idêntica ainda está em andamento'}), 409
+
+            event = threading.Event()
+            with _events_lock:
+                _events[key] = event
+            try:
+                response = make_response(current_app.ensure_sync(view)(*args, **kwargs))
+                # Só respostas de sucesso completas são reaproveitadas
+                if 200 <= response.status_code < 300 and not response.is_streamed:
+                    _finish(key, response, ttl)
+                else:
+                    _release(key)
+                return response
+            except Exception:
+                _release(key)
+                raise
+            finally:
+                with _events_lock:
+                    _events.pop(key, None)
+                event.set()
+        return wrapper
+    return decorator
@@ -0,0 +1,220 @@
+from flask import current_app, g
+from flask.cli import AppGroup
+from app import db, aio, unit_of_work
+from app.models import Job
+from datetime import datetime, timedelta
+import asyncio
+import click
+import inspect
+import json
+import random
+import threading
+
+# Fila de jobs em segundo plano usando a própria tabela `job` como fila, sem
+# broker externo. Os workers podem rodar dentro do processo web (threads) ou
+# em um processo separado com `flask jobs worker`. Handlers `async def` podem
+# rodar também em "vagas" no event loop de app/aio.py (JOBS_ASYNC_SLOTS), que
+# seguram muitas chamadas ao LLM ao mesmo tempo sem uma thread por job.
+
+_handlers = {}
+_workers = []
+_async_slots = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+
+jobs_cli = AppGroup('jobs', help='Fila de geração em segundo plano.')
+
+
+def handler(kind):
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, user_id=None, idea_id=None, speculative=False):
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        user_id=user_id,
+        idea_id=idea_id,
+        speculative=speculative,
+        # Especulação que falha não vale novas tentativas
+        max_attempts=1 if speculative else current_app.config.get('JOBS_MAX_ATTEMPTS', 3)
+    )
+    db.session.add(job)
+    db.session.commit()
+    ensure_workers(current_app._get_current_object())
+    _wakeup.set()
+    return job
+
+
+def ensure_workers(app, count=None, async_slots=None):
+    count = app.config.get('JOBS_WORKERS', 2) if count is None else count
+    async_slots = app.config.get('JOBS_ASYNC_SLOTS', 0) if async_slots is None else async_slots
+    with _workers_lock:
+        if not _workers and count > 0:
+            for i in range(count):
+                thread = threading.Thread(target=_worker_loop, args=(app,), name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                _workers.append(thread)
+        if not _async_slots and async_slots > 0:
+            with app.app_context():
+                for _ in range(async_slots):
+                    _async_slots.append(aio.run_detached(_async_worker_loop, app))
+
+
+def _ready_filter(now):
+    # Jobs na fila prontos para rodar, ou jobs "running" abandonados por um worker que morreu
+    stale = now - timedelta(seconds=current_app.config.get('JOBS_STALE_AFTER', 600))
+    return db.or_(
+        db.and_(Job.status == 'queued', Job.run_after <= now),
+        db.and_(Job.status == 'running', Job.started_at < stale)
+    )
+
+
+def claim_next():
+    now = datetime.utcnow()
+    # Jobs pedidos pelo usuário passam na frente dos especulativos
+    candidates = db.session.query(Job.id).filter(_ready_filter(now)).order_by(db.func.coalesce(Job.speculative, False), Job.id).limit(5).all()
+    for (job_id,) in candidates:
+        # O UPDATE condicional garante que apenas um worker pegue cada job
+        claimed = Job.query.filter(Job.id == job_id, _ready_filter(now)).update({
+            'status': 'running',
+            'started_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def _finish(job_id, result):
+    job = db.session.get(Job, job_id)
+    job.result = json.dumps(result, ensure_ascii=False)
+    job.status = 'done'
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _fail(job_id, error):
+    db.session.rollback()
+    job = db.session.get(Job, job_id)
+    current_app.logger.error(f"Erro no job {job_id} ({job.kind}): {str(error)}")
+    job.error = str(error)
+    if job.attempts < job.max_attempts and getattr(error, 'retryable', True):
+        # Backoff exponencial com jitter antes da próxima tentativa
+        base = current_app.config.get('JOBS_RETRY_BACKOFF', 5)
+        delay = base * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5)
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    else:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run(job):
+    job_id = job.id
+    func = _handlers.get(job.kind)
+    try:
+        if func is None:
+            raise LookupError(f"Nenhum handler registrado para '{job.kind}'")
+        g.job_user_id = job.user_id
+        g.job_idea_id = job.idea_id
+        payload = json.loads(job.payload or '{}')
+        if inspect.iscoroutinefunction(func):
+            # Handler async numa thread de worker: roda no loop do LLM e espera,
+            # sem segurar a conexão desta thread enquanto isso
+            unit_of_work.release()
+            result = aio.run(func, **payload)
+        else:
+            result = func(**payload)
+        _finish(job_id, result)
+    except Exception as e:
+        _fail(job_id, e)
+    finally:
+        g.pop('job_user_id', None)
+        g.pop('job_idea_id', None)
+    return db.session.get(Job, job_id)
+
+
+def _claim_for_async():
+    job = claim_next()
+    if job is None:
+        return None
+    return job.id, job.kind, json.loads(job.payload or '{}'), job.user_id, job.idea_id
+
+
+def _run_by_id(job_id):
+    return run(db.session.get(Job, job_id)).status
+
+
+async def _run_async(job_id, kind, payload, user_id, idea_id):
+    func = _handlers.get(kind)
+    if not inspect.iscoroutinefunction(func):
+        # Handlers síncronos pegos por uma vaga async rodam no pool do banco
+        await aio.db(_run_by_id, job_id)
+        return
+    g.job_user_id = user_id
+    g.job_idea_id = idea_id
+    try:
+        result = await func(**payload)
+        await aio.db(_finish, job_id, result)
+    except Exception as e:
+        await aio.db(_fail, job_id, e)
+    finally:
+        g.job_user_id = None
+        g.job_idea_id = None
+
+
+async def _async_worker_loop(app):
+    g.job_user_id = None
+    g.job_idea_id = None
+    poll_interval = app.config.get('JOBS_POLL_INTERVAL', 2)
+    while True:
+        try:
+            claimed = await aio.db(_claim_for_async)
+            if claimed is not None:
+                await _run_async(*claimed)
+        except Exception as e:
+            app.logger.error(f"Erro na vaga async de jobs: {str(e)}")
+            claimed = None
+        if claimed is None:
+            await asyncio.sleep(poll_interval)
+
+
+def _worker_loop(app):
+    with app.app_context():
+        poll_interval = app.config.get('JOBS_POLL_INTERVAL', 2)
+        while True:
+            try:
+                job = claim_next()
+                if job is not None:
+                    run(job)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erro no worker de jobs: {str(e)}")
+                job = None
+            finally:
+                db.session.remove()
+
+            if job is None:
+                _wakeup.wait(poll_interval)
+                _wakeup.clear()
+
+
+@jobs_cli.command('worker')
+@click.option('--threads', default=2, help='Número de threads do worker.')
+@click.option('--async-slots', default=0, help='Jobs async simultâneos no event loop.')
+def worker_command(threads, async_slots):
+    """Processa a fila de jobs em um processo separado."""
+    app = current_app._get_current_object()
+    click.echo(f"Worker de jobs iniciado com {threads} thread(s) e {async_slots} vaga(s) async.")
+    ensure_workers(app, threads, async_slots)
+    for thread in list(_workers):
+        thread.join()
+    for slot in list(_async_slots):
+        slot.result()
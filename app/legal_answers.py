@@ -0,0 +1,164 @@
+from flask import current_app
+from app import db
+from app.models import Idea, LegalConsultation
+from collections import Counter, defaultdict
+import math
+import re
+import threading
+import time
+import unicodedata
+
+# Índice local de similaridade sobre as consultas jurídicas já respondidas
+# (TF-IDF de n-gramas de caracteres e palavras, similaridade do cosseno).
+# Perguntas quase iguais a uma já respondida reaproveitam a resposta sem
+# chamar a OpenAI. Por padrão só são reaproveitadas respostas da mesma
+# ideia, já que o prompt inclui o contexto dela. Os documentos guardam só o
+# TF; o IDF vem das contagens atuais a cada busca, então perguntas novas
+# pesam certo desde a primeira inserção, sem esperar a reconstrução.
+
+_lock = threading.Lock()
+_index = None
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def features(text):
+    normalized = normalize(text)
+    counts = Counter(normalized.split())
+    padded = f" {normalized} "
+    counts.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return counts
+
+
+def term_weights(text):
+    # TF sublinear
+    return {term: 1 + math.log(count) for term, count in features(text).items()}
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self.docs = {}
+        self.postings = defaultdict(set)
+        self.df = Counter()
+        self.version = 0  # muda a cada inserção ou remoção; invalida as normas
+        self.built_at = time.monotonic()
+
+    def add(self, doc_id, question, answer, user_id, idea_id):
+        if doc_id in self.docs:
+            return
+        tf = term_weights(question)
+        if not tf:
+            return
+        self.docs[doc_id] = {'tf': tf, 'norm': None, 'norm_version': None, 'answer': answer, 'user_id': user_id, 'idea_id': idea_id}
+        for term in tf:
+            self.postings[term].add(doc_id)
+            self.df[term] += 1
+        self.version += 1
+
+    def remove_idea(self, idea_id):
+        for doc_id in [d for d, doc in self.docs.items() if doc['idea_id'] == idea_id]:
+            for term in self.docs.pop(doc_id)['tf']:
+                self.postings[term].discard(doc_id)
+                self.df[term] -= 1
+            self.version += 1
+
+    def _idf(self, term):
+        # IDF suavizado: positivo mesmo com uma única pergunta no índice
+        return math.log((len(self.docs) + 1) / (self.df[term] + 1)) + 1
+
+    def _norm(self, doc):
+        # Norma do documento com o IDF atual, recalculada só quando o índice mudou
+        if doc['norm_version'] != self.version:
+            doc['norm'] = math.sqrt(sum((weight * self._idf(term)) ** 2 for term, weight in doc['tf'].items())) or 1
+            doc['norm_version'] = self.version
+        return doc['norm']
+
+    def _candidates(self, terms):
+        # Termos presentes em mais da metade das perguntas quase não pesam e
+        # só aumentariam a lista de candidatas; ficam de fora da seleção, a
+        # não ser que a pergunta só tenha termos assim
+        max_df = max(len(self.docs) // 2, 1)
+        rare, common = set(), set()
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings:
+                (common if self.df[term] > max_df else rare).update(postings)
+        return rare or common
+
+    def search(self, question, user_id=None, idea_id=None):
+        query = {term: weight * self._idf(term) for term, weight in term_weights(question).items()}
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values())) or 1
+
+        best_score, best_doc = 0, None
+        for doc_id in self._candidates(query):
+            doc = self.docs[doc_id]
+            if user_id is not None and doc['user_id'] != user_id:
+                continue
+            if idea_id is not None and doc['idea_id'] != idea_id:
+                continue
+            tf = doc['tf']
+            dot = sum(weight * tf[term] * self._idf(term) for term, weight in query.items() if term in tf)
+            score = dot / (query_norm * self._norm(doc))
+            if score > best_score:
+                best_score, best_doc = score, doc
+        return best_score, best_doc
+
+
+def _build():
+    index = SimilarityIndex()
+    limit = current_app.config.get('LEGAL_ANSWER_INDEX_MAX', 20000)
+    rows = (
+        db.session.query(LegalConsultation.id, LegalConsultation.idea_id, LegalConsultation.message,
+                         LegalConsultation.is_user, Idea.user_id)
+        .join(Idea, Idea.id == LegalConsultation.idea_id)
+        .order_by(LegalConsultation.id.desc())
+        .limit(limit)
+        .all()
+    )
+    # Cada pergunta do usuário forma um par com a resposta seguinte da mesma ideia
+    last_question = {}
+    for row in sorted(rows, key=lambda r: r.id):
+        if row.is_user:
+            last_question[row.idea_id] = row
+        elif row.idea_id in last_question:
+            question = last_question.pop(row.idea_id)
+            index.add(question.id, question.message, row.message, row.user_id, row.idea_id)
+    return index
+
+
+def _get_index():
+    global _index
+    ttl = current_app.config.get('LEGAL_ANSWER_INDEX_TTL', 600)
+    with _lock:
+        if _index is None or time.monotonic() - _index.built_at > ttl:
+            _index = _build()
+        return _index
+
+
+def lookup(question, user_id, idea_id):
+    if not current_app.config.get('LEGAL_ANSWER_REUSE_ENABLED', True):
+        return None
+    if current_app.config.get('LEGAL_ANSWER_SHARE_ACROSS_USERS', False):
+        user_id = idea_id = None
+    index = _get_index()
+    with _lock:
+        score, doc = index.search(question, user_id, idea_id)
+    if doc is None or score < current_app.config.get('LEGAL_ANSWER_MIN_SIMILARITY', 0.85):
+        return None
+    current_app.logger.info(f"Resposta jurídica reaproveitada (similaridade {score:.2f})")
+    return doc['answer']
+
+
+def add(question_id, question, answer, user_id, idea_id):
+    with _lock:
+        if _index is not None:
+            _index.add(question_id, question, answer, user_id, idea_id)
+
+
+def forget_idea(idea_id):
+    with _lock:
+        if _index is not None:
+            _index.remove_idea(idea_id)
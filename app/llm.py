@@ -0,0 +1,494 @@
+from flask import current_app, g
+from app import db, client, scheduler, transport, routing, usage, unit_of_work, aio
+from app.models import LLMCacheEntry
+from datetime import datetime, timedelta
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import asyncio
+import hashlib
+import time
+import json
+
+# Gateway único para chamadas à OpenAI. Todas as rotas devem passar por aqui
+# em vez de usar o `client` diretamente.
+
+_stats_lock = Lock()
+_stats = {}
+_writes_since_eviction = 0
+
+
+def _record(route, outcome):
+    with _stats_lock:
+        route_stats = _stats.setdefault(route, {'hits': 0, 'misses': 0, 'bypass': 0})
+        route_stats[outcome] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        per_route = {route: dict(counts) for route, counts in _stats.items()}
+    totals = {'hits': 0, 'misses': 0, 'bypass': 0}
+    for counts in per_route.values():
+        for key in totals:
+            totals[key] += counts[key]
+    return {
+        'totals': totals,
+        'routes': per_route,
+        'entries': LLMCacheEntry.query.count()
+    }
+
+
+def cache_key(model, messages, response_format=None):
+    schema = response_format.model_json_schema() if response_format is not None else None
+    payload = json.dumps({'model': model, 'messages': messages, 'schema': schema}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cache_enabled_for(route, cache):
+    if not current_app.config.get('LLM_CACHE_ENABLED', True):
+        return False
+    if cache is not None:
+        return cache
+    return route not in current_app.config.get('LLM_CACHE_DISABLED_ROUTES', set())
+
+
+def _decode(content, response_format):
+    if response_format is not None:
+        return response_format.model_validate_json(content)
+    return content
+
+
+# O cache usa uma conexão própria (fora da db.session) para não confirmar
+# alterações pendentes da rota que está chamando o gateway. `keys` vem na
+# ordem de preferência dos modelos da rota.
+def _cache_get(keys):
+    table = LLMCacheEntry.__table__
+    ttl = current_app.config.get('LLM_CACHE_TTL', 7 * 24 * 3600)
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        rows = conn.execute(
+            db.select(table.c.key, table.c.response, table.c.created_at).where(table.c.key.in_(keys))
+        ).all()
+        by_key = {row.key: row for row in rows}
+        for key in keys:
+            row = by_key.get(key)
+            if row is None:
+                continue
+            if row.created_at < now - timedelta(seconds=ttl):
+                conn.execute(table.delete().where(table.c.key == key))
+                continue
+            conn.execute(
+                table.update()
+                .where(table.c.key == key)
+                .values(last_used_at=now, hits=table.c.hits + 1)
+            )
+            return row.response
+        return None
+
+
+def _cache_put(key, route, model, response):
+    global _writes_since_eviction
+    table = LLMCacheEntry.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.key == key))
+        conn.execute(table.insert().values(
+            key=key, route=route, model=model, response=response,
+            created_at=now, last_used_at=now, hits=0
+        ))
+    _writes_since_eviction += 1
+    if _writes_since_eviction >= current_app.config.get('LLM_CACHE_EVICTION_INTERVAL', 50):
+        _writes_since_eviction = 0
+        evict()
+
+
+def evict():
+    # Remove entradas expiradas e, se ainda passar do limite, as menos usadas recentemente (LRU)
+    table = LLMCacheEntry.__table__
+    ttl = current_app.config.get('LLM_CACHE_TTL', 7 * 24 * 3600)
+    max_entries = current_app.config.get('LLM_CACHE_MAX_ENTRIES', 5000)
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.created_at < datetime.utcnow() - timedelta(seconds=ttl)))
+        total = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+        if total > max_entries:
+            oldest = db.select(table.c.id).order_by(table.c.last_used_at).limit(total - max_entries)
+            conn.execute(table.delete().where(table.c.id.in_(oldest.scalar_subquery())))
+
+
+def clear_cache():
+    with db.engine.begin() as conn:
+        conn.execute(LLMCacheEntry.__table__.delete())
+
+
+def _estimate_tokens(messages):
+    # ~4 caracteres por token, mais uma reserva para a resposta
+    return sum(len(m.get('content') or '') for m in messages) // 4 + 500
+
+
+def _call_provider(route, model, messages, response_format):
+    estimated_tokens = _estimate_tokens(messages)
+    usage.check_budget(estimated_tokens)
+    fair_scheduler = scheduler.get_scheduler()
+    with fair_scheduler.slot(scheduler.current_user_id(), scheduler.priority_for(route), estimated_tokens), \
+            transport.guard('openai'), routing.measure(model):
+        start = time.monotonic()
+        if response_format is not None:
+            raw = client.beta.chat.completions.with_raw_response.parse(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                timeout=transport.deadline_for(route)
+            )
+        else:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                timeout=transport.deadline_for(route)
+            )
+        fair_scheduler.update_from_headers(raw.headers)
+        completion = raw.parse()
+
+    if completion.usage is not None:
+        usage.record(route, model, completion.usage.prompt_tokens, completion.usage.completion_tokens, time.monotonic() - start)
+
+    if response_format is not None:
+        return completion.choices[0].message.parsed.model_dump_json()
+    return completion.choices[0].message.content
+
+
+def _in_app_context(func):
+    # Threads auxiliares não têm o contexto da requisição; levam o app e o usuário junto
+    app = current_app._get_current_object()
+    user_id = scheduler.current_user_id()
+    idea_id = usage.current_idea_id()
+
+    def run(*args, **kwargs):
+        with app.app_context():
+            g.job_user_id = user_id
+            g.job_idea_id = idea_id
+            return func(*args, **kwargs)
+    return run
+
+
+def _with_fallback(route, candidates, messages, response_format):
+    for i, model in enumerate(candidates):
+        try:
+            return model, _call_provider(route, model, messages, response_format)
+        except Exception as e:
+            if i == len(candidates) - 1 or not transport.is_upstream_failure(e):
+                raise
+            current_app.logger.warning(f"Modelo {model} falhou em '{route}', usando {candidates[i + 1]}: {str(e)}")
+
+
+def _hedged(route, candidates, messages, response_format, delay):
+    # Se a primeira chamada demorar mais que `delay`, dispara uma segunda
+    # (no próximo modelo da lista) e usa a que responder primeiro. A perdedora
+    # termina em segundo plano e é descartada.
+    call = _in_app_context(_with_fallback)
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        primary = executor.submit(call, route, candidates, messages, response_format)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge_candidates = candidates[1:] or candidates
+        current_app.logger.info(f"Hedge em '{route}' após {delay}s usando {hedge_candidates[0]}")
+        hedge = executor.submit(call, route, hedge_candidates, messages, response_format)
+        for future in as_completed([primary, hedge]):
+            if future.exception() is None:
+                return future.result()
+        return primary.result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _generate(route, messages, response_format):
+    candidates = routing.plan(route)
+    delay = routing.hedge_delay(route)
+    if delay is not None:
+        return _hedged(route, candidates, messages, response_format, delay)
+    return _with_fallback(route, candidates, messages, response_format)
+
+
+# Retorna o texto da resposta ou, quando `response_format` é informado, a
+# instância pydantic já validada. O modelo é escolhido por `routing` a partir
+# da rota; `cache=False` força uma nova geração.
+def complete(route, messages, response_format=None, cache=None):
+    use_cache = _cache_enabled_for(route, cache)
+
+    if use_cache:
+        try:
+            cached = _cache_get([cache_key(model, messages, response_format) for model in routing.tiers(route)])
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao ler cache LLM: {str(e)}")
+            cached = None
+        if cached is not None:
+            _record(route, 'hits')
+            return _decode(cached, response_format)
+        _record(route, 'misses')
+    else:
+        _record(route, 'bypass')
+
+    unit_of_work.warn_if_held(route)
+    model, content = _generate(route, messages, response_format)
+
+    if use_cache and content is not None:
+        try:
+            _cache_put(cache_key(model, messages, response_format), route, model, content)
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao gravar cache LLM: {str(e)}")
+
+    return _decode(content, response_format)
+
+
+def _stream_provider(route, model, messages):
+    estimated_tokens = _estimate_tokens(messages)
+    usage.check_budget(estimated_tokens)
+    # O slot fica ocupado enquanto o stream estiver aberto
+    fair_scheduler = scheduler.get_scheduler()
+    with fair_scheduler.slot(scheduler.current_user_id(), scheduler.priority_for(route), estimated_tokens), \
+            transport.guard('openai'), routing.measure(model):
+        start = time.monotonic()
+        raw = client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=transport.deadline_for(route)
+        )
+        fair_scheduler.update_from_headers(raw.headers)
+        stream_usage = None
+        completion_chars = 0
+        try:
+            for chunk in raw.parse():
+                if chunk.usage is not None:
+                    stream_usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    completion_chars += len(delta)
+                    yield delta
+        finally:
+            # Se o cliente desconectar antes do último trecho, registra uma estimativa
+            if stream_usage is not None:
+                usage.record(route, model, stream_usage.prompt_tokens, stream_usage.completion_tokens, time.monotonic() - start)
+            else:
+                usage.record(route, model, estimated_tokens - 500, completion_chars // 4, time.monotonic() - start)
+
+
+# Versão em streaming de `complete`: gera os trechos de texto conforme chegam
+# da OpenAI. Em caso de acerto no cache a resposta inteira é emitida de uma vez.
+# O fallback para outro modelo só acontece antes do primeiro trecho.
+def stream(route, messages, cache=None):
+    use_cache = _cache_enabled_for(route, cache)
+
+    if use_cache:
+        try:
+            cached = _cache_get([cache_key(model, messages) for model in routing.tiers(route)])
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao ler cache LLM: {str(e)}")
+            cached = None
+        if cached is not None:
+            _record(route, 'hits')
+            yield cached
+            return
+        _record(route, 'misses')
+    else:
+        _record(route, 'bypass')
+
+    unit_of_work.warn_if_held(route)
+    candidates = routing.plan(route)
+    parts = []
+    for i, model in enumerate(candidates):
+        try:
+            for delta in _stream_provider(route, model, messages):
+                parts.append(delta)
+                yield delta
+            break
+        except Exception as e:
+            if parts or i == len(candidates) - 1 or not transport.is_upstream_failure(e):
+                raise
+            current_app.logger.warning(f"Modelo {model} falhou em '{route}', usando {candidates[i + 1]}: {str(e)}")
+
+    if use_cache and parts:
+        try:
+            _cache_put(cache_key(model, messages), route, model, ''.join(parts))
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao gravar cache LLM: {str(e)}")
+
+
+# Executa várias chamadas `complete` em paralelo, cada uma com seu próprio
+# contexto de aplicação. `calls` é uma lista de dicts com os argumentos de
+# `complete`; os resultados voltam na mesma ordem. Com `return_exceptions`
+# as exceções são devolvidas no lugar do resultado em vez de propagadas.
+# Se `timings` for uma lista, recebe a duração de cada chamada, na mesma ordem.
+def complete_concurrently(calls, return_exceptions=False, timings=None):
+    if calls:
+        unit_of_work.warn_if_held(calls[0]['route'])
+    durations = [None] * len(calls)
+
+    def timed(i, kwargs):
+        start = time.monotonic()
+        try:
+            return complete(**kwargs)
+        finally:
+            durations[i] = time.monotonic() - start
+
+    run = _in_app_context(timed)
+    with ThreadPoolExecutor(max_workers=max(len(calls), 1)) as executor:
+        futures = [executor.submit(run, i, kwargs) for i, kwargs in enumerate(calls)]
+
+    if timings is not None:
+        timings.extend(durations)
+
+    results = []
+    for future in futures:
+        error = future.exception()
+        if error is not None and not return_exceptions:
+            raise error
+        results.append(error if error is not None else future.result())
+    return results
+
+
+# Versões assíncronas, para views async e jobs async. As chamadas à OpenAI
+# rodam no event loop de app/aio.py com o AsyncOpenAI; cache, orçamento e
+# espera por vaga no escalonador vão para threads, fora do loop.
+async def _aacquire(fair_scheduler, user_id, priority, estimated_tokens):
+    acquiring = asyncio.ensure_future(asyncio.to_thread(fair_scheduler.acquire, user_id, priority, estimated_tokens))
+
+    def release_late(future):
+        if not future.cancelled() and future.exception() is None:
+            fair_scheduler.release(user_id)
+
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # Cancelar a task (o hedge perdedor, por exemplo) não interrompe a
+        # thread que espera a vaga; a vaga que ela ainda pegar é devolvida
+        acquiring.add_done_callback(release_late)
+        raise
+
+
+async def _acall_provider(route, model, messages, response_format):
+    estimated_tokens = _estimate_tokens(messages)
+    await aio.db(usage.check_budget, estimated_tokens)
+    fair_scheduler = scheduler.get_scheduler()
+    user_id = scheduler.current_user_id()
+    await _aacquire(fair_scheduler, user_id, scheduler.priority_for(route), estimated_tokens)
+    try:
+        with transport.guard('openai'), routing.measure(model):
+            start = time.monotonic()
+            if response_format is not None:
+                raw = await aio.client().beta.chat.completions.with_raw_response.parse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    timeout=transport.deadline_for(route)
+                )
+            else:
+                raw = await aio.client().chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    timeout=transport.deadline_for(route)
+                )
+            fair_scheduler.update_from_headers(raw.headers)
+            completion = raw.parse()
+    finally:
+        fair_scheduler.release(user_id)
+
+    if completion.usage is not None:
+        usage.record(route, model, completion.usage.prompt_tokens, completion.usage.completion_tokens, time.monotonic() - start)
+
+    if response_format is not None:
+        return completion.choices[0].message.parsed.model_dump_json()
+    return completion.choices[0].message.content
+
+
+async def _awith_fallback(route, candidates, messages, response_format):
+    for i, model in enumerate(candidates):
+        try:
+            return model, await _acall_provider(route, model, messages, response_format)
+        except Exception as e:
+            if i == len(candidates) - 1 or not transport.is_upstream_failure(e):
+                raise
+            current_app.logger.warning(f"Modelo {model} falhou em '{route}', usando {candidates[i + 1]}: {str(e)}")
+
+
+async def _ahedged(route, candidates, messages, response_format, delay):
+    primary = asyncio.ensure_future(_awith_fallback(route, candidates, messages, response_format))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    hedge_candidates = candidates[1:] or candidates
+    current_app.logger.info(f"Hedge em '{route}' após {delay}s usando {hedge_candidates[0]}")
+    hedge = asyncio.ensure_future(_awith_fallback(route, hedge_candidates, messages, response_format))
+    pending = {primary, hedge}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                # Aqui a perdedora pode ser cancelada de fato
+                for other in pending:
+                    other.cancel()
+                return task.result()
+    return primary.result()
+
+
+async def _acomplete(route, messages, response_format, cache):
+    use_cache = _cache_enabled_for(route, cache)
+
+    if use_cache:
+        try:
+            cached = await aio.db(_cache_get, [cache_key(model, messages, response_format) for model in routing.tiers(route)])
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao ler cache LLM: {str(e)}")
+            cached = None
+        if cached is not None:
+            _record(route, 'hits')
+            return _decode(cached, response_format)
+        _record(route, 'misses')
+    else:
+        _record(route, 'bypass')
+
+    candidates = routing.plan(route)
+    delay = routing.hedge_delay(route)
+    if delay is not None:
+        model, content = await _ahedged(route, candidates, messages, response_format, delay)
+    else:
+        model, content = await _awith_fallback(route, candidates, messages, response_format)
+
+    if use_cache and content is not None:
+        try:
+            await aio.db(_cache_put, cache_key(model, messages, response_format), route, model, content)
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao gravar cache LLM: {str(e)}")
+
+    return _decode(content, response_format)
+
+
+# Mesmo contrato de `complete`, para ser aguardado de qualquer event loop
+async def acomplete(route, messages, response_format=None, cache=None):
+    unit_of_work.warn_if_held(route)
+    return await aio.call(_acomplete, route, messages, response_format, cache)
+
+
+# Mesmo contrato de `complete_concurrently`, sem uma thread por chamada
+async def acomplete_concurrently(calls, return_exceptions=False, timings=None, limit=None):
+    durations = [None] * len(calls)
+    # `limit` segura as chamadas excedentes aqui, antes da fila do escalonador
+    semaphore = asyncio.Semaphore(limit or max(len(calls), 1))
+
+    async def timed(i, kwargs):
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                return await acomplete(**kwargs)
+            finally:
+                durations[i] = time.monotonic() - start
+
+    results = await asyncio.gather(*(timed(i, kwargs) for i, kwargs in enumerate(calls)), return_exceptions=return_exceptions)
+    if timings is not None:
+        timings.extend(durations)
+    return list(results)
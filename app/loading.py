@@ -0,0 +1,26 @@
+from flask import current_app
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+from app.models import Task, Expense
+
+# Perfis de carregamento das rotas de listagem: cada perfil diz quais
+# relacionamentos a resposta usa, e eles vêm junto com a consulta principal
+# (joinedload para muitos-para-um, selectinload para coleções). Assim a
+# rota faz o mesmo número de consultas com 3 ou 300 linhas. Com
+# EAGER_LOAD_STRICT ligado, qualquer outro relacionamento acessado nas linhas
+# levanta erro em vez de virar uma consulta por linha.
+
+PROFILES = {
+    # Quadro de tarefas e respostas da geração de tarefas
+    'task_list': (selectinload(Task.tags),),
+    # Listagem de despesas com categoria e tags
+    'expense_list': (joinedload(Expense.category), selectinload(Expense.tags)),
+    # Resumo de despesas (só a categoria)
+    'expense_summary': (joinedload(Expense.category),),
+}
+
+
+def apply(query, profile):
+    options = PROFILES[profile]
+    if current_app.config.get('EAGER_LOAD_STRICT'):
+        options += (raiseload('*'),)
+    return query.options(*options)
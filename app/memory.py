@@ -0,0 +1,109 @@
+from flask import current_app
+from app import db, llm, jobs, routing, unit_of_work
+from app.models import ChatMessage, ConversationMemory, Job
+
+# Memória de conversa do assistente: uma janela com as mensagens mais recentes
+# mais um resumo incremental das mais antigas, sempre dentro de um orçamento
+# de tokens por modelo. O resumo é atualizado em segundo plano, fora do
+# caminho da requisição.
+
+
+def estimate_tokens(text):
+    # Aproximação de ~4 caracteres por token, suficiente para o orçamento
+    return len(text or '') // 4 + 1
+
+
+def _token_budget(route):
+    # O modelo só é escolhido na hora da chamada; usa o menor orçamento entre os possíveis
+    budgets = current_app.config.get('CHAT_TOKEN_BUDGETS', {})
+    budget = min(budgets.get(model, budgets.get('default', 6000)) for model in routing.tiers(route))
+    return budget - current_app.config.get('CHAT_REPLY_RESERVE', 1000)
+
+
+def _unsummarized(idea_id, since):
+    return ChatMessage.query.filter(ChatMessage.idea_id == idea_id, ChatMessage.id > since)
+
+
+def build_messages(idea_id, system_context, route):
+    memory = ConversationMemory.query.filter_by(idea_id=idea_id).first()
+    since = memory.summarized_until if memory else 0
+    window = current_app.config.get('CHAT_MEMORY_WINDOW', 6)
+
+    # A última mensagem da janela é a pergunta atual do usuário, já gravada
+    recent = _unsummarized(idea_id, since).order_by(ChatMessage.id.desc()).limit(window).all()
+    recent.reverse()
+    history = [{"role": m.role, "content": m.content} for m in recent]
+
+    system = system_context
+    if memory and memory.summary:
+        system += f"\n\nResumo da conversa até aqui:\n{memory.summary}"
+
+    budget = _token_budget(route)
+    used = estimate_tokens(system) + sum(estimate_tokens(m['content']) for m in history)
+    while used > budget and len(history) > 1:
+        used -= estimate_tokens(history.pop(0)['content'])
+    if used > budget:
+        available = max(budget - sum(estimate_tokens(m['content']) for m in history), 0)
+        system = system[:available * 4]
+
+    return [{"role": "system", "content": system}] + history
+
+
+def schedule_summary(idea_id, user_id):
+    window = current_app.config.get('CHAT_MEMORY_WINDOW', 6)
+    batch = current_app.config.get('CHAT_SUMMARY_BATCH', 4)
+    memory = ConversationMemory.query.filter_by(idea_id=idea_id).first()
+    since = memory.summarized_until if memory else 0
+    if _unsummarized(idea_id, since).count() < window + batch:
+        return None
+
+    pending = Job.query.filter(
+        Job.kind == 'summarize_chat',
+        Job.idea_id == idea_id,
+        Job.status.in_(['queued', 'running'])
+    ).first()
+    if pending:
+        return pending
+    # Em nome do dono da ideia: os tokens do resumo contam no orçamento e na vaga dele
+    return jobs.enqueue('summarize_chat', {'idea_id': idea_id}, user_id=user_id, idea_id=idea_id)
+
+
+@jobs.handler('summarize_chat')
+def summarize(idea_id):
+    window = current_app.config.get('CHAT_MEMORY_WINDOW', 6)
+    memory = ConversationMemory.query.filter_by(idea_id=idea_id).first()
+    summary = memory.summary if memory else ''
+    since = (memory.summarized_until if memory else 0) or 0
+
+    messages = _unsummarized(idea_id, since).order_by(ChatMessage.id).all()
+    to_fold = messages[:-window]
+    if not to_fold:
+        return {'success': True, 'summarized_until': since}
+
+    transcript = ''.join(
+        f"{'Usuário' if m.role == 'user' else 'Assistente'}: {m.content}\n" for m in to_fold
+    )
+    summarized_until = to_fold[-1].id
+    max_words = current_app.config.get('CHAT_SUMMARY_MAX_WORDS', 250)
+    unit_of_work.release()
+
+    summary = llm.complete(
+        'summarize_chat',
+        messages=[
+            {"role": "system", "content": f"Você mantém o resumo de uma conversa entre um empreendedor e um assistente de negócios. Atualize o resumo existente incorporando as novas mensagens, preservando decisões, fatos e pendências importantes. Responda apenas com o resumo atualizado, em no máximo {max_words} palavras."},
+            {"role": "user", "content": f"Resumo atual:\n{summary or '(vazio)'}\n\nNovas mensagens:\n{transcript}"}
+        ],
+        cache=False
+    )
+
+    with unit_of_work.transaction():
+        memory = ConversationMemory.query.filter_by(idea_id=idea_id).first()
+        if memory is None:
+            memory = ConversationMemory(idea_id=idea_id, summary='', summarized_until=0)
+            db.session.add(memory)
+        elif (memory.summarized_until or 0) != since:
+            # Outro resumo foi gravado durante a chamada; este ficou velho
+            return {'success': True, 'summarized_until': memory.summarized_until}
+        memory.summary = summary
+        memory.summarized_until = summarized_until
+    return {'success': True, 'summarized_until': summarized_until}
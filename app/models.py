@@ -2,6 +2,7 @@ from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
+import json
 
 # Modelos serão adicionados posteriormente
 
@@ -33,72 +34,88 @@ class Idea(db.Model):
     description = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    questions = db.relationship('Question', backref='idea', lazy='dynamic')
-    tasks = db.relationship('Task', backref='idea', lazy='dynamic')
-    expenses = db.relationship('Expense', backref='idea', lazy='dynamic')
+    deleted_at = db.Column(db.DateTime)  # excluída, aguardando a remoção dos dados em segundo plano
+    questions = db.relationship('Question', backref='idea', lazy='dynamic', passive_deletes=True)
+    tasks = db.relationship('Task', backref='idea', lazy='dynamic', passive_deletes=True)
+    expenses = db.relationship('Expense', backref='idea', lazy='dynamic', passive_deletes=True)
+
+    __table_args__ = (db.Index('ix_idea_user_timestamp', 'user_id', 'timestamp'),)
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.Text)
     answer = db.Column(db.Text)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'))
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'))
+
+    __table_args__ = (db.Index('ix_question_idea', 'idea_id'),)
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(200), nullable=False)
     status = db.Column(db.String(20), default='to_do')
     order = db.Column(db.Integer)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'))
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'))
     tags = db.relationship('Tag', secondary='task_tags', backref=db.backref('tasks', lazy='dynamic'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     due_date = db.Column(db.DateTime)
     criticality = db.Column(db.Integer, default=0)  # 0: Low, 1: Medium, 2: High
 
+    __table_args__ = (
+        db.Index('ix_task_idea_order', 'idea_id', 'order'),
+        db.Index('ix_task_idea_status', 'idea_id', 'status'),
+    )
+
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
 
 task_tags = db.Table('task_tags',
-    db.Column('task_id', db.Integer, db.ForeignKey('task.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('task_id', db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_task_tags_tag', 'tag_id')
 )
 
 class SWOT(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), unique=True)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    idea = db.relationship('Idea', backref=db.backref('swot', uselist=False))
-    analyses = db.relationship('SWOTAnalysis', back_populates='swot', lazy='dynamic')
+    idea = db.relationship('Idea', backref=db.backref('swot', uselist=False, passive_deletes=True))
+    analyses = db.relationship('SWOTAnalysis', back_populates='swot', lazy='dynamic', passive_deletes=True)
 
 class SWOTAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    swot_id = db.Column(db.Integer, db.ForeignKey('swot.id'))
+    swot_id = db.Column(db.Integer, db.ForeignKey('swot.id', ondelete='CASCADE'))
     content = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     swot = db.relationship('SWOT', back_populates='analyses')
 
+    __table_args__ = (db.Index('ix_swot_analysis_swot_timestamp', 'swot_id', 'timestamp'),)
+
 class SWOTItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    swot_id = db.Column(db.Integer, db.ForeignKey('swot.id'))
+    swot_id = db.Column(db.Integer, db.ForeignKey('swot.id', ondelete='CASCADE'))
     category = db.Column(db.String(20))  # 'strength', 'weakness', 'opportunity', 'threat'
     content = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    swot = db.relationship('SWOT', backref=db.backref('items', lazy='dynamic'))
+    swot = db.relationship('SWOT', backref=db.backref('items', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_swot_item_swot_category', 'swot_id', 'category'),)
 
 class ExpenseCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
 
 expense_tags = db.Table('expense_tags',
-    db.Column('expense_id', db.Integer, db.ForeignKey('expense.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('expense_id', db.Integer, db.ForeignKey('expense.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_expense_tags_tag', 'tag_id')
 )
 
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -108,18 +125,22 @@ class Expense(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_expense_idea_date', 'idea_id', 'date'),)
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     role = db.Column(db.String(10), nullable=False)  # 'user' ou 'assistant'
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('chat_messages', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('chat_messages', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_chat_message_idea_id', 'idea_id', 'id'),)
 
 class NetworkingContact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     title = db.Column(db.String(100))
     company = db.Column(db.String(100))
@@ -127,11 +148,13 @@ class NetworkingContact(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('networking_contacts', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('networking_contacts', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_networking_contact_idea_created', 'idea_id', 'created_at'),)
 
 class NetworkingPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     author_name = db.Column(db.String(100))
     content = db.Column(db.Text)
     linkedin_url = db.Column(db.String(200))
@@ -139,11 +162,13 @@ class NetworkingPost(db.Model):
     comments_count = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('networking_posts', lazy=True))
+    idea = db.relationship('Idea', backref=db.backref('networking_posts', lazy=True, passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_networking_post_idea_created', 'idea_id', 'created_at'),)
 
 class Goal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     deadline = db.Column(db.Date)
@@ -155,41 +180,51 @@ class Goal(db.Model):
     timeframe = db.Column(db.String(20))
     aggression = db.Column(db.Integer)
 
-    idea = db.relationship('Idea', backref=db.backref('goals', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('goals', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_goal_idea_created', 'idea_id', 'created_at'),)
 
 class LegalStep(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     description = db.Column(db.Text, nullable=False)
     order = db.Column(db.Integer, nullable=False)
     progress = db.Column(db.Integer, default=0)
+    details = db.Column(db.Text)  # detalhamento gerado pela IA
+    details_hash = db.Column(db.String(64))  # sha256 do texto usado para gerar `details`
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('legal_steps', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('legal_steps', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_legal_step_idea_order', 'idea_id', 'order'),)
 
 class LegalConsultation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     is_user = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('legal_consultations', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('legal_consultations', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_legal_consultation_idea_created', 'idea_id', 'created_at'),)
 
 class MarketResearch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     location = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('market_researches', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('market_researches', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_market_research_idea_created', 'idea_id', 'created_at'),)
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
@@ -204,7 +239,9 @@ class Customer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    idea = db.relationship('Idea', backref=db.backref('customers', lazy='dynamic'))
+    idea = db.relationship('Idea', backref=db.backref('customers', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (db.Index('ix_customer_idea_name', 'idea_id', 'name'),)
 
     def to_dict(self):
         return {
@@ -224,3 +261,85 @@ class Customer(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+class LLMCacheEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 de (modelo, mensagens, schema)
+    route = db.Column(db.String(50))
+    model = db.Column(db.String(50))
+    response = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='queued', index=True)  # 'queued', 'running', 'done', 'failed'
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    idea_id = db.Column(db.Integer, index=True)
+    speculative = db.Column(db.Boolean, default=False)  # gerado sem pedido do usuário, até ser adotado
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ConversationMemory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), unique=True, nullable=False)
+    summary = db.Column(db.Text, default='')
+    summarized_until = db.Column(db.Integer, default=0)  # id da última ChatMessage incluída no resumo
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    idea = db.relationship('Idea', backref=db.backref('conversation_memory', uselist=False, passive_deletes=True))
+
+class LLMUsage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    idea_id = db.Column(db.Integer, index=True)
+    route = db.Column(db.String(50), index=True)
+    model = db.Column(db.String(50))
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    total_tokens = db.Column(db.Integer, default=0)
+    cost = db.Column(db.Float, default=0)  # USD, pela tabela LLM_PRICES
+    latency_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.Index('ix_llm_usage_user_created', 'user_id', 'created_at'),)
+
+class UsageBudget(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+    daily_tokens = db.Column(db.Integer, nullable=False)  # 0 = sem limite
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdempotencyRecord(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 de (usuário, operação, chave ou corpo)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    operation = db.Column(db.String(50))
+    request_hash = db.Column(db.String(64))
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'done'
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(100))
+    response = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
@@ -0,0 +1,293 @@
+from flask.cli import AppGroup
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import click
+import hashlib
+import httpx
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+# Servidor compatível com a API de chat da OpenAI para testes de carga e
+# benchmarks sem custo: `flask openai-stub serve` e depois
+# OPENAI_BASE_URL=http://localhost:8765/v1 no app. Suporta respostas
+# simples, saídas estruturadas (json_schema, usado por `parse`) e streaming,
+# com latência e taxa de erros configuráveis. No modo `record` repassa as
+# chamadas para a OpenAI real e grava cada resposta (com os tempos) em
+# fixtures; no modo `replay` devolve as fixtures gravadas com o mesmo ritmo.
+
+stub_cli = AppGroup('openai-stub', help='Servidor local compatível com a OpenAI.')
+
+WORDS = (
+    "negócio cliente mercado produto serviço empresa estratégia custo receita "
+    "parceria marketing vendas equipe plano licença registro contrato imposto "
+    "investimento crescimento inovação qualidade prazo meta risco oportunidade"
+).split()
+
+
+def _sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _text(rng, tokens):
+    # Lista numerada: funciona com as rotas que separam a resposta por linhas
+    lines = max(tokens // 20, 1)
+    return '\n'.join(f"{i + 1}. {_sentence(rng)}" for i in range(lines))
+
+
+def _sample(schema, defs, rng):
+    if '$ref' in schema:
+        return _sample(defs[schema['$ref'].split('/')[-1]], defs, rng)
+    if 'anyOf' in schema:
+        return _sample(schema['anyOf'][0], defs, rng)
+    if 'enum' in schema:
+        return schema['enum'][0]
+    kind = schema.get('type')
+    if kind == 'object':
+        return {name: _sample(prop, defs, rng) for name, prop in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [_sample(schema.get('items', {}), defs, rng) for _ in range(max(schema.get('minItems', 0), 5))]
+    if kind == 'string':
+        return _sentence(rng)
+    if kind in ('integer', 'number'):
+        return rng.randint(1, 100)
+    if kind == 'boolean':
+        return True
+    return None
+
+
+def _count_tokens(messages):
+    return sum(len(m.get('content') or '') for m in messages) // 4 + 1
+
+
+def fixture_key(body):
+    relevant = {k: body.get(k) for k in ('model', 'messages', 'response_format', 'stream')}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class RateWindow:
+    # Janela deslizante de um minuto para os cabeçalhos x-ratelimit-*
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def headers(self, tokens):
+        now = time.monotonic()
+        with self.lock:
+            self.events.append((now, tokens))
+            while self.events and self.events[0][0] < now - 60:
+                self.events.popleft()
+            used_requests = len(self.events)
+            used_tokens = sum(t for _, t in self.events)
+            reset = max(60 - (now - self.events[0][0]), 0) if self.events else 0
+        return {
+            'x-ratelimit-limit-requests': str(self.rpm),
+            'x-ratelimit-remaining-requests': str(max(self.rpm - used_requests, 0)),
+            'x-ratelimit-reset-requests': f"{reset:.3f}s",
+            'x-ratelimit-limit-tokens': str(self.tpm),
+            'x-ratelimit-remaining-tokens': str(max(self.tpm - used_tokens, 0)),
+            'x-ratelimit-reset-tokens': f"{reset:.3f}s",
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.options['verbose']:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+    def _write_line(self, line):
+        self.wfile.write((line + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Rota não suportada: {self.path}", 'type': 'invalid_request_error'}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        mode = self.server.options['mode']
+        try:
+            if mode == 'record':
+                self._record(body)
+            elif mode == 'replay' and self._replay(body):
+                return
+            elif mode == 'replay' and self.server.options['strict']:
+                self._send_json(404, {'error': {'message': 'Fixture não encontrada', 'type': 'invalid_request_error'}})
+            else:
+                self._synthetic(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # --- respostas sintéticas ---
+
+    def _synthetic(self, body):
+        options = self.server.options
+        rng = random.Random()
+        prompt_tokens = _count_tokens(body.get('messages', []))
+        rate_headers = self.server.rate_window.headers(prompt_tokens + options['completion_tokens'])
+
+        roll = rng.random()
+        if roll < options['rate_limit_rate']:
+            time.sleep(options['error_latency'])
+            self._send_json(429, {'error': {'message': 'Rate limit reached (stub)', 'type': 'rate_limit_error'}},
+                            dict(rate_headers, **{'retry-after': '1'}))
+            return
+        if roll < options['rate_limit_rate'] + options['error_rate']:
+            time.sleep(options['error_latency'])
+            self._send_json(500, {'error': {'message': 'Internal server error (stub)', 'type': 'server_error'}}, rate_headers)
+            return
+
+        response_format = body.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            schema = response_format['json_schema']['schema']
+            content = json.dumps(_sample(schema, schema.get('$defs', {}), rng), ensure_ascii=False)
+        else:
+            content = _text(rng, options['completion_tokens'])
+        completion_tokens = len(content) // 4 + 1
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get('model', 'gpt-4o-mini')
+
+        # Latência até o primeiro token com distribuição log-normal
+        first_token = rng.lognormvariate(0, options['latency_sigma']) * options['latency_median']
+        time.sleep(first_token)
+
+        if not body.get('stream'):
+            time.sleep(completion_tokens * options['token_delay'])
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content, 'refusal': None}, 'finish_reason': 'stop', 'logprobs': None}],
+                'usage': usage
+            }, rate_headers)
+            return
+
+        def chunk(delta, finish_reason=None, chunk_usage=None, choices=True):
+            payload = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                       'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason, 'logprobs': None}] if choices else []}
+            if chunk_usage is not None:
+                payload['usage'] = chunk_usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n"
+
+        self._start_stream(headers=rate_headers)
+        self._write_line(chunk({'role': 'assistant', 'content': ''}))
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for piece in pieces:
+            time.sleep(options['token_delay'])
+            self._write_line(chunk({'content': piece}))
+        self._write_line(chunk({}, finish_reason='stop'))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._write_line(chunk(None, chunk_usage=usage, choices=False))
+        self._write_line('data: [DONE]\n')
+
+    # --- gravação e reprodução ---
+
+    def _fixture_path(self, body):
+        return os.path.join(self.server.options['fixtures'], f"{fixture_key(body)}.json")
+
+    def _record(self, body):
+        options = self.server.options
+        headers = {'Content-Type': 'application/json', 'Authorization': self.headers.get('Authorization', '')}
+        start = time.monotonic()
+        fixture = {'request': body, 'stream': bool(body.get('stream'))}
+        with httpx.stream('POST', f"{options['upstream'].rstrip('/')}/chat/completions", json=body, headers=headers, timeout=300) as upstream:
+            kept_headers = {k: v for k, v in upstream.headers.items() if k.startswith('x-ratelimit') or k == 'retry-after'}
+            fixture.update(status=upstream.status_code, headers=kept_headers)
+            if fixture['stream'] and upstream.status_code == 200:
+                self._start_stream(upstream.status_code, kept_headers)
+                chunks = []
+                for line in upstream.iter_lines():
+                    chunks.append({'t': round(time.monotonic() - start, 4), 'line': line})
+                    self._write_line(line)
+                fixture['chunks'] = chunks
+            else:
+                upstream.read()
+                fixture.update(latency=round(time.monotonic() - start, 4), body=upstream.json())
+                self._send_json(upstream.status_code, fixture['body'], kept_headers)
+
+        # Só respostas bem-sucedidas viram fixture
+        if fixture['status'] == 200:
+            os.makedirs(options['fixtures'], exist_ok=True)
+            path = self._fixture_path(body)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(fixture, f, ensure_ascii=False, indent=1)
+            os.replace(f"{path}.tmp", path)
+
+    def _replay(self, body):
+        path = self._fixture_path(body)
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding='utf-8') as f:
+            fixture = json.load(f)
+        speed = self.server.options['replay_speed']
+        if 'chunks' in fixture:
+            self._start_stream(fixture['status'], fixture.get('headers'))
+            start = time.monotonic()
+            for chunk in fixture['chunks']:
+                delay = chunk['t'] * speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                self._write_line(chunk['line'])
+        else:
+            time.sleep(fixture['latency'] * speed)
+            self._send_json(fixture['status'], fixture['body'], fixture.get('headers'))
+        return True
+
+
+@stub_cli.command('serve')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=8765)
+@click.option('--mode', type=click.Choice(['synthetic', 'record', 'replay']), default='synthetic', help='Origem das respostas.')
+@click.option('--fixtures', default='instance/openai_fixtures', help='Diretório das fixtures de gravação/reprodução.')
+@click.option('--upstream', default='https://api.openai.com/v1', help='API real usada no modo record.')
+@click.option('--strict', is_flag=True, help='No modo replay, responde 404 em vez de gerar uma resposta sintética.')
+@click.option('--replay-speed', default=1.0, help='Multiplicador dos tempos gravados (0 = sem espera).')
+@click.option('--latency-median', default=0.8, help='Mediana, em segundos, até o primeiro token.')
+@click.option('--latency-sigma', default=0.5, help='Dispersão (sigma da log-normal) da latência.')
+@click.option('--token-delay', default=0.01, help='Segundos por trecho de resposta.')
+@click.option('--completion-tokens', default=200, help='Tamanho aproximado das respostas de texto.')
+@click.option('--error-rate', default=0.0, help='Fração de respostas 500.')
+@click.option('--rate-limit-rate', default=0.0, help='Fração de respostas 429.')
+@click.option('--error-latency', default=0.2, help='Segundos antes de responder com erro.')
+@click.option('--rpm', default=500, help='Limite de requisições por minuto anunciado nos cabeçalhos.')
+@click.option('--tpm', default=200000, help='Limite de tokens por minuto anunciado nos cabeçalhos.')
+@click.option('--verbose', is_flag=True)
+def serve_command(host, port, rpm, tpm, **options):
+    """Sobe o servidor local compatível com a OpenAI."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.rate_window = RateWindow(rpm, tpm)
+    click.echo(f"Stub da OpenAI ({options['mode']}) em http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
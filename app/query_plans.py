@@ -0,0 +1,161 @@
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, select
+from app import db
+from app.models import (
+    Idea, Question, Task, Tag, task_tags, SWOT, SWOTItem, SWOTAnalysis, Expense, ExpenseCategory, expense_tags,
+    ChatMessage, NetworkingContact, NetworkingPost, Goal, LegalStep, LegalConsultation, MarketResearch, Customer
+)
+import click
+import json
+import re
+
+# Verificação dos planos de execução: roda EXPLAIN nas consultas que cada
+# rota faz (com ids de exemplo) e aponta leituras completas de tabela, que
+# indicam um índice faltando. Funciona com SQLite (EXPLAIN QUERY PLAN) e
+# PostgreSQL (EXPLAIN em JSON, com enable_seqscan desligado para que o
+# planejador use um índice sempre que houver um). `flask plans check` sai
+# com código 1 se alguma consulta fizer leitura completa.
+
+plans_cli = AppGroup('plans', help='Planos de execução das consultas das rotas.')
+
+SAMPLE_ID = 1
+
+
+# Rota -> [(descrição, consulta, leitura completa esperada)]
+def route_queries(sample_id=SAMPLE_ID):
+    ids = [sample_id, sample_id + 1]
+    return {
+        'index': [
+            ('ideias do usuário', select(Idea).where(Idea.user_id == sample_id).order_by(Idea.timestamp.desc()), False),
+        ],
+        'get_tasks': [
+            ('tarefas da ideia', select(Task).where(Task.idea_id == sample_id).order_by(Task.order), False),
+            ('tags das tarefas', select(task_tags.c.task_id, Tag).join(task_tags, Tag.id == task_tags.c.tag_id).where(task_tags.c.task_id.in_(ids)), False),
+        ],
+        'generate_more_tasks': [
+            ('tarefas concluídas', select(Task).where(Task.idea_id == sample_id, Task.status == 'closed'), False),
+        ],
+        'get_idea': [
+            ('perguntas da ideia', select(Question).where(Question.idea_id == sample_id), False),
+        ],
+        'view_idea': [
+            ('SWOT da ideia', select(SWOT).where(SWOT.idea_id == sample_id), False),
+            ('itens SWOT agrupados', select(SWOTItem).where(SWOTItem.swot_id == sample_id).order_by(SWOTItem.category, SWOTItem.id), False),
+            ('análises SWOT', select(SWOTAnalysis).where(SWOTAnalysis.swot_id == sample_id).order_by(SWOTAnalysis.timestamp.desc()), False),
+        ],
+        'api_expenses': [
+            ('despesas com categoria', select(Expense).join(ExpenseCategory, ExpenseCategory.id == Expense.category_id).where(Expense.idea_id == sample_id), False),
+            ('tags das despesas', select(expense_tags.c.expense_id, Tag).join(expense_tags, Tag.id == expense_tags.c.tag_id).where(expense_tags.c.expense_id.in_(ids)), False),
+        ],
+        'api_categories': [
+            ('categorias', select(ExpenseCategory).order_by(ExpenseCategory.id), True),
+        ],
+        'tag_usage': [
+            ('tarefas de uma tag', select(task_tags.c.task_id).where(task_tags.c.tag_id == sample_id), False),
+            ('despesas de uma tag', select(expense_tags.c.expense_id).where(expense_tags.c.tag_id == sample_id), False),
+        ],
+        'assistant': [
+            ('histórico do chat', select(ChatMessage).where(ChatMessage.idea_id == sample_id).order_by(ChatMessage.timestamp), False),
+            ('janela da memória', select(ChatMessage).where(ChatMessage.idea_id == sample_id, ChatMessage.id > 0).order_by(ChatMessage.id.desc()).limit(6), False),
+        ],
+        'goals': [
+            ('metas da ideia', select(Goal).where(Goal.idea_id == sample_id).order_by(Goal.created_at.desc()), False),
+        ],
+        'market_research': [
+            ('pesquisas da ideia', select(MarketResearch).where(MarketResearch.idea_id == sample_id).order_by(MarketResearch.created_at.desc()), False),
+        ],
+        'legal': [
+            ('etapas legais', select(LegalStep).where(LegalStep.idea_id == sample_id).order_by(LegalStep.order), False),
+            ('consultas jurídicas', select(LegalConsultation).where(LegalConsultation.idea_id == sample_id).order_by(LegalConsultation.created_at), False),
+        ],
+        'networking': [
+            ('posts salvos', select(NetworkingPost).where(NetworkingPost.idea_id == sample_id).order_by(NetworkingPost.created_at.desc()), False),
+            ('contatos', select(NetworkingContact).where(NetworkingContact.idea_id == sample_id), False),
+        ],
+        'customers': [
+            ('clientes da ideia', select(Customer).where(Customer.idea_id == sample_id).order_by(Customer.name), False),
+        ],
+    }
+
+
+def _sqlite_plan(conn, sql):
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    details = [row[-1] for row in rows]
+    # "SCAN tabela" sem "USING ... INDEX" é leitura da tabela inteira
+    scans = [
+        re.match(r'SCAN (?:TABLE )?(\S+)', d).group(1)
+        for d in details
+        if d.startswith('SCAN ') and 'INDEX' not in d and 'PRIMARY KEY' not in d
+    ]
+    sorts = [d for d in details if 'TEMP B-TREE' in d]
+    return details, scans, sorts
+
+
+def _postgres_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _postgres_nodes(child)
+
+
+def _postgres_plan(conn, sql):
+    with conn.begin() as transaction:
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        result = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        transaction.rollback()
+    plan = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+    nodes = list(_postgres_nodes(plan))
+    details = [f"{node['Node Type']} {node.get('Relation Name', '')} {node.get('Index Name', '')}".strip() for node in nodes]
+    scans = [node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan']
+    sorts = [node['Node Type'] for node in nodes if node['Node Type'] in ('Sort', 'Incremental Sort')]
+    return details, scans, sorts
+
+
+def check_plans(engine, sample_id=SAMPLE_ID, verbose=False):
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        explain = _sqlite_plan
+    elif dialect == 'postgresql':
+        explain = _postgres_plan
+    else:
+        raise click.UsageError(f"Banco '{dialect}' não suportado; use SQLite ou PostgreSQL.")
+
+    problems = 0
+    with engine.connect() as conn:
+        for route, queries in route_queries(sample_id).items():
+            for description, query, full_scan_ok in queries:
+                sql = str(query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+                details, scans, sorts = explain(conn, sql)
+                if scans and not full_scan_ok:
+                    problems += 1
+                    status = f"LEITURA COMPLETA de {', '.join(scans)}"
+                else:
+                    status = 'ok'
+                if sorts:
+                    status += ' (ordenação em memória)'
+                click.echo(f"[{dialect}] {route} / {description}: {status}")
+                if verbose:
+                    for detail in details:
+                        click.echo(f"    {detail}")
+    return problems
+
+
+@plans_cli.command('check')
+@click.option('--url', 'urls', multiple=True, help='URL de outro banco a verificar (pode repetir; padrão: o banco do app).')
+@click.option('--sample-id', default=SAMPLE_ID, help='Id usado nos filtros das consultas.')
+@click.option('--verbose', is_flag=True, help='Mostra o plano completo de cada consulta.')
+def check_command(urls, sample_id, verbose):
+    """Roda EXPLAIN nas consultas das rotas e aponta leituras completas de tabela."""
+    problems = 0
+    if not urls:
+        problems += check_plans(db.engine, sample_id, verbose)
+    for url in urls:
+        engine = create_engine(url)
+        try:
+            problems += check_plans(engine, sample_id, verbose)
+        finally:
+            engine.dispose()
+
+    if problems:
+        click.echo(f"{problems} consulta(s) com leitura completa de tabela.")
+        raise SystemExit(1)
+    click.echo('Nenhuma leitura completa fora das esperadas.')
@@ -0,0 +1,175 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models import Tag, ExpenseCategory
+from collections import OrderedDict
+from threading import Lock
+import time
+
+# Dados de referência compartilhados entre ideias (tags e categorias de
+# despesa). Uma lista de nomes é resolvida em ids com uma consulta só, e os
+# que faltam são criados num único INSERT ... ON CONFLICT DO NOTHING, então
+# duas requisições criando a mesma tag não brigam pelo nome único. Os ids
+# ficam num cache limitado por processo; as entradas só entram no cache
+# depois do commit da transação que as resolveu, e os eventos do ORM limpam o
+# cache quando uma tag ou categoria é alterada ou removida.
+
+_caches = {Tag: OrderedDict(), ExpenseCategory: OrderedDict()}  # modelo -> nome -> id
+_categories = None  # (carregado_em, [{'id', 'name'}])
+_lock = Lock()
+
+
+def clean_names(model, names):
+    # Sem espaços nas pontas, sem vazios e sem repetidos, na ordem recebida
+    length = model.name.type.length
+    return list(dict.fromkeys(name for name in ((name or '').strip()[:length] for name in names) if name))
+
+
+def _insert_missing(model, names):
+    rows = [{'name': name} for name in names]
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        db.session.execute(postgresql.insert(model).on_conflict_do_nothing(index_elements=['name']), rows)
+    elif dialect == 'sqlite':
+        db.session.execute(sqlite.insert(model).on_conflict_do_nothing(index_elements=['name']), rows)
+    else:
+        # Bancos sem ON CONFLICT: um savepoint por nome, ignorando os que outra transação criou
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(model), [row])
+            except IntegrityError:
+                pass
+
+
+def _stage(*change):
+    db.session.info.setdefault('reference_data', []).append(change)
+
+
+def resolve(model, names):
+    wanted = clean_names(model, names)
+    ids = {}
+    with _lock:
+        cache = _caches[model]
+        for name in wanted:
+            if name in cache:
+                cache.move_to_end(name)
+                ids[name] = cache[name]
+
+    missing = [name for name in wanted if name not in ids]
+    if missing:
+        found = dict(db.session.execute(db.select(model.name, model.id).where(model.name.in_(missing))).all())
+        new = [name for name in missing if name not in found]
+        if new:
+            _insert_missing(model, new)
+            found.update(db.session.execute(db.select(model.name, model.id).where(model.name.in_(new))).all())
+            if model is ExpenseCategory:
+                _stage('categories',)
+        for name, model_id in found.items():
+            _stage('id', model, name, model_id)
+        ids.update(found)
+
+    return {name: ids[name] for name in wanted}
+
+
+def tag_ids(names):
+    return resolve(Tag, names)
+
+
+def category_ids(names):
+    return resolve(ExpenseCategory, names)
+
+
+def _evict(model, names):
+    with _lock:
+        cache = _caches[model]
+        for name in names:
+            cache.pop(name, None)
+
+
+def tags(names):
+    # Objetos Tag na ordem dos nomes, para atribuir a relacionamentos
+    ids = tag_ids(names)
+    if not ids:
+        return []
+    by_id = {tag.id: tag for tag in Tag.query.filter(Tag.id.in_(list(ids.values())))}
+    stale = [name for name, tag_id in ids.items() if tag_id not in by_id]
+    if stale:
+        # Ids em cache de tags removidas (por outro processo) desde então:
+        # descarta as entradas e resolve esses nomes de novo, recriando as tags
+        _evict(Tag, stale)
+        ids.update(tag_ids(stale))
+        by_id.update((tag.id, tag) for tag in Tag.query.filter(Tag.id.in_([ids[name] for name in stale])))
+    return [by_id[tag_id] for tag_id in ids.values()]
+
+
+def categories():
+    global _categories
+    ttl = current_app.config.get('REFERENCE_CATEGORY_TTL', 300)
+    with _lock:
+        if _categories is not None and time.monotonic() - _categories[0] < ttl:
+            return _categories[1]
+
+    rows = [{'id': c.id, 'name': c.name} for c in ExpenseCategory.query.order_by(ExpenseCategory.id)]
+
+    with _lock:
+        _categories = (time.monotonic(), rows)
+    return rows
+
+
+def clear():
+    global _categories
+    with _lock:
+        for cache in _caches.values():
+            cache.clear()
+        _categories = None
+
+
+def _on_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('reference_data', []).append(('clear', mapper.class_))
+
+
+def _on_category_insert(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('reference_data', []).append(('categories',))
+
+
+for _model in (Tag, ExpenseCategory):
+    event.listen(_model, 'after_update', _on_change)
+    event.listen(_model, 'after_delete', _on_change)
+event.listen(ExpenseCategory, 'after_insert', _on_category_insert)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    global _categories
+    changes = session.info.pop('reference_data', ())
+    if not changes:
+        return
+    max_entries = current_app.config.get('REFERENCE_CACHE_SIZE', 5000)
+    with _lock:
+        for change in changes:
+            if change[0] == 'id':
+                _, model, name, model_id = change
+                cache = _caches[model]
+                cache[name] = model_id
+                cache.move_to_end(name)
+                while len(cache) > max_entries:
+                    cache.popitem(last=False)
+            elif change[0] == 'clear':
+                _caches[change[1]].clear()
+                if change[1] is ExpenseCategory:
+                    _categories = None
+            else:
+                _categories = None
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('reference_data', None)
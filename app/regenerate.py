@@ -0,0 +1,334 @@
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, client, routing
+from app.models import Idea, SWOT, SWOTItem, Goal, LegalStep
+from app.routes import (
+    SWOTAnalysisModel, swot_messages, swot_item_rows, goals_messages, goal_rows,
+    legal_steps_messages, legal_step_rows
+)
+from datetime import datetime
+from uuid import uuid4
+import click
+import json
+import os
+import shutil
+import time
+
+# Regeneração em lote (SWOT, metas, etapas legais) para muitas ideias de uma
+# vez, usando a Batch API da OpenAI fora do tráfego ao vivo. Cada execução
+# guarda seu estado em um diretório próprio (manifesto, arquivo de entrada,
+# saída e ids já aplicados), então rodar o mesmo comando de novo retoma de
+# onde parou.
+
+regen_cli = AppGroup('regen', help='Regeneração em lote de conteúdo gerado por IA.')
+
+KINDS = {
+    'swot': {'route': 'generate_swot_analysis', 'response_format': SWOTAnalysisModel},
+    'goals': {'route': 'generate_goals', 'response_format': None},
+    'legal': {'route': 'generate_legal_steps', 'response_format': None},
+}
+
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+class OpenAIBatchBackend:
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            uploaded = client.files.create(file=f, purpose='batch')
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        return client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id, output_path):
+        batch = client.batches.retrieve(batch_id)
+        # Lotes expirados ou cancelados ainda podem ter saída parcial
+        if batch.output_file_id:
+            client.files.content(batch.output_file_id).write_to_file(output_path)
+        else:
+            open(output_path, 'w').close()
+
+
+# Substituto local da Batch API: processa o arquivo de entrada linha a linha
+# com chamadas síncronas e grava a saída no mesmo formato do provedor. Serve
+# para desenvolvimento e testes com o cliente apontado para um servidor
+# compatível com a OpenAI.
+class LocalBatchBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id, suffix):
+        return os.path.join(self.directory, f"{batch_id}.{suffix}.jsonl")
+
+    def submit(self, input_path):
+        batch_id = f"local-{uuid4().hex}"
+        shutil.copyfile(input_path, self._path(batch_id, 'input'))
+        return batch_id
+
+    def poll(self, batch_id):
+        output_path = self._path(batch_id, 'output')
+        done = {line['custom_id'] for line in _read_jsonl(output_path)}
+        with open(output_path, 'a', encoding='utf-8') as output:
+            for request in _read_jsonl(self._path(batch_id, 'input')):
+                if request['custom_id'] in done:
+                    continue
+                try:
+                    completion = client.chat.completions.create(**request['body'])
+                    line = {'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': completion.model_dump()}, 'error': None}
+                except Exception as e:
+                    line = {'custom_id': request['custom_id'], 'response': None, 'error': {'message': str(e)}}
+                output.write(json.dumps(line, ensure_ascii=False) + '\n')
+                output.flush()
+        return 'completed'
+
+    def download(self, batch_id, output_path):
+        shutil.copyfile(self._path(batch_id, 'output'), output_path)
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _backend(name, run_dir):
+    if name == 'local':
+        return LocalBatchBackend(os.path.join(run_dir, 'local'))
+    return OpenAIBatchBackend()
+
+
+def _select_ideas(idea_ids, user_id, all_ideas, limit):
+    query = Idea.query.order_by(Idea.id)
+    if idea_ids:
+        query = query.filter(Idea.id.in_(idea_ids))
+    elif user_id is not None:
+        query = query.filter(Idea.user_id == user_id)
+    elif not all_ideas:
+        raise click.UsageError('Informe --idea-id, --user-id ou --all.')
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _params(kind, idea):
+    if kind != 'goals':
+        return {}
+    # Reaproveita o período e a agressividade das últimas metas da ideia
+    latest = idea.goals.order_by(Goal.created_at.desc()).first()
+    return {
+        'timeframe': (latest.timeframe if latest and latest.timeframe else 'trimestral'),
+        'aggression': (latest.aggression if latest and latest.aggression else 3),
+        'budget': 0,
+        'context': ''
+    }
+
+
+def _messages(kind, idea, params):
+    if kind == 'swot':
+        return swot_messages(idea)
+    if kind == 'goals':
+        return goals_messages(idea, **params)
+    return legal_steps_messages(idea)
+
+
+def _request_line(kind, idea, params):
+    spec = KINDS[kind]
+    body = {'model': routing.tiers(spec['route'])[0], 'messages': _messages(kind, idea, params)}
+    if spec['response_format'] is not None:
+        body['response_format'] = {
+            'type': 'json_schema',
+            'json_schema': {'name': spec['response_format'].__name__, 'schema': spec['response_format'].model_json_schema()}
+        }
+    return {'custom_id': f"idea-{idea.id}", 'method': 'POST', 'url': '/v1/chat/completions', 'body': body}
+
+
+def _content(line):
+    response = line.get('response')
+    if line.get('error') or not response or response.get('status_code') != 200:
+        return None
+    return response['body']['choices'][0]['message']['content']
+
+
+def _apply_swot(results):
+    idea_ids = list(results)
+    swot_ids = dict(db.session.query(SWOT.idea_id, SWOT.id).filter(SWOT.idea_id.in_(idea_ids)))
+    missing = [{'idea_id': idea_id} for idea_id in idea_ids if idea_id not in swot_ids]
+    if missing:
+        db.session.execute(db.insert(SWOT), missing)
+        swot_ids = dict(db.session.query(SWOT.idea_id, SWOT.id).filter(SWOT.idea_id.in_(idea_ids)))
+
+    SWOTItem.query.filter(SWOTItem.swot_id.in_(swot_ids.values())).delete(synchronize_session=False)
+    return [row for idea_id, swot_data in results.items() for row in swot_item_rows(swot_ids[idea_id], swot_data)], SWOTItem
+
+
+def _apply_goals(results, params):
+    Goal.query.filter(
+        Goal.idea_id.in_(list(results)),
+        Goal.description == "Meta gerada automaticamente"
+    ).delete(synchronize_session=False)
+    rows = [
+        row
+        for idea_id, content in results.items()
+        for row in goal_rows(idea_id, content, params[str(idea_id)]['timeframe'], params[str(idea_id)]['aggression'])
+    ]
+    return rows, Goal
+
+
+def _apply_legal(results):
+    LegalStep.query.filter(LegalStep.idea_id.in_(list(results))).delete(synchronize_session=False)
+    return [row for idea_id, content in results.items() for row in legal_step_rows(idea_id, content)], LegalStep
+
+
+# Aplica um bloco de resultados em uma única transação. Reaplicar um bloco é
+# seguro: o conteúdo anterior das ideias do bloco é sempre substituído.
+def _apply_chunk(kind, lines, manifest):
+    existing = {idea_id for (idea_id,) in db.session.query(Idea.id).filter(
+        Idea.id.in_([int(line['custom_id'].split('-', 1)[1]) for line in lines])
+    )}
+    results = {}
+    failed = 0
+    for line in lines:
+        idea_id = int(line['custom_id'].split('-', 1)[1])
+        content = _content(line)
+        if content is None or idea_id not in existing:
+            failed += 1
+            continue
+        try:
+            results[idea_id] = SWOTAnalysisModel.model_validate_json(content) if kind == 'swot' else content
+        except ValueError:
+            failed += 1
+
+    if results:
+        if kind == 'swot':
+            rows, model = _apply_swot(results)
+        elif kind == 'goals':
+            rows, model = _apply_goals(results, manifest['params'])
+        else:
+            rows, model = _apply_legal(results)
+        if rows:
+            db.session.execute(db.insert(model), rows)
+    db.session.commit()
+    return len(results), failed
+
+
+def _run_dir(name):
+    base = current_app.config.get('REGEN_STATE_DIR') or os.path.join(current_app.instance_path, 'regeneration')
+    return os.path.join(base, name)
+
+
+@regen_cli.command('run')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('name')
+@click.option('--idea-id', 'idea_ids', multiple=True, type=int, help='Ideia a regenerar (pode repetir).')
+@click.option('--user-id', type=int, help='Regenera todas as ideias deste usuário.')
+@click.option('--all', 'all_ideas', is_flag=True, help='Regenera todas as ideias.')
+@click.option('--limit', type=int, help='Número máximo de ideias.')
+@click.option('--backend', type=click.Choice(['openai', 'local']), help='Onde processar o lote.')
+@click.option('--wait/--no-wait', default=True, help='Aguarda o lote terminar e aplica os resultados.')
+def run_command(kind, name, idea_ids, user_id, all_ideas, limit, backend, wait):
+    """Regenera KIND em lote; rodar de novo com o mesmo NAME retoma a execução."""
+    run_dir = _run_dir(name)
+    manifest_path = os.path.join(run_dir, 'manifest.json')
+    input_path = os.path.join(run_dir, 'input.jsonl')
+    output_path = os.path.join(run_dir, 'output.jsonl')
+    applied_path = os.path.join(run_dir, 'applied.txt')
+    os.makedirs(run_dir, exist_ok=True)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['kind'] != kind:
+            raise click.UsageError(f"A execução '{name}' é do tipo '{manifest['kind']}'.")
+        click.echo(f"Retomando '{name}' (etapa: {manifest['status']}).")
+    else:
+        manifest = {
+            'kind': kind,
+            'backend': backend or current_app.config.get('REGEN_BATCH_BACKEND', 'openai'),
+            'status': 'new',
+            'created_at': datetime.utcnow().isoformat()
+        }
+
+    batch_backend = _backend(manifest['backend'], run_dir)
+
+    if manifest['status'] == 'new':
+        ideas = _select_ideas(idea_ids, user_id, all_ideas, limit)
+        params = {str(idea.id): _params(kind, idea) for idea in ideas}
+        tmp_path = f"{input_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for idea in ideas:
+                f.write(json.dumps(_request_line(kind, idea, params[str(idea.id)]), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, input_path)
+        manifest.update(status='prepared', params=params, total=len(ideas))
+        _write_json(manifest_path, manifest)
+        click.echo(f"{len(ideas)} prompt(s) preparados.")
+
+    if manifest['status'] == 'prepared':
+        if not manifest['total']:
+            click.echo('Nenhuma ideia selecionada.')
+            return
+        manifest.update(status='submitted', batch_id=batch_backend.submit(input_path))
+        _write_json(manifest_path, manifest)
+        click.echo(f"Lote {manifest['batch_id']} enviado.")
+
+    if manifest['status'] == 'submitted':
+        poll_interval = current_app.config.get('REGEN_POLL_INTERVAL', 60)
+        while True:
+            batch_status = batch_backend.poll(manifest['batch_id'])
+            if batch_status in TERMINAL_STATUSES or not wait:
+                break
+            click.echo(f"Lote {manifest['batch_id']}: {batch_status}. Aguardando...")
+            time.sleep(poll_interval)
+        if batch_status not in TERMINAL_STATUSES:
+            click.echo(f"Lote {manifest['batch_id']}: {batch_status}. Rode o comando de novo para continuar.")
+            return
+        batch_backend.download(manifest['batch_id'], output_path)
+        manifest.update(status='downloaded', batch_status=batch_status)
+        _write_json(manifest_path, manifest)
+
+    if manifest['status'] == 'downloaded':
+        applied = set()
+        if os.path.exists(applied_path):
+            with open(applied_path, encoding='utf-8') as f:
+                applied = {line.strip() for line in f if line.strip()}
+        pending = [line for line in _read_jsonl(output_path) if line['custom_id'] not in applied]
+        chunk_size = current_app.config.get('REGEN_APPLY_CHUNK', 500)
+        total_applied = total_failed = 0
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            ok, failed = _apply_chunk(kind, chunk, manifest)
+            # Só marca o bloco depois do commit; uma interrupção aqui reaplica o bloco
+            with open(applied_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{line['custom_id']}\n" for line in chunk)
+            total_applied += ok
+            total_failed += failed
+            click.echo(f"{start + len(chunk)}/{len(pending)} resultado(s) processados.")
+        manifest.update(status='done', finished_at=datetime.utcnow().isoformat())
+        _write_json(manifest_path, manifest)
+        click.echo(f"Concluído: {total_applied} ideia(s) atualizadas, {total_failed} falha(s).")
+
+
+@regen_cli.command('status')
+@click.argument('name')
+def status_command(name):
+    """Mostra o estado de uma execução de regeneração."""
+    manifest_path = os.path.join(_run_dir(name), 'manifest.json')
+    if not os.path.exists(manifest_path):
+        raise click.UsageError(f"Execução '{name}' não encontrada.")
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.pop('params', None)
+    click.echo(json.dumps(manifest, ensure_ascii=False, indent=2))
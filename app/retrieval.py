@@ -0,0 +1,246 @@
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app import memory
+from app.models import Question, Task, Expense, Goal, SWOT, SWOTItem, Customer
+from collections import Counter, OrderedDict, defaultdict
+from threading import Lock
+import math
+import re
+import time
+import unicodedata
+
+# Índice de busca local (BM25) por ideia sobre tarefas, gastos, metas, itens
+# SWOT, clientes e perguntas e respostas. O assistente recebe só os itens mais
+# relevantes para a mensagem do usuário, dentro de um orçamento de tokens, em
+# vez de todas as linhas da ideia. Os eventos do ORM atualizam os índices já
+# montados após o commit; escritas em lote chamam `invalidate`, e o índice é
+# remontado do banco a cada RETRIEVAL_INDEX_TTL segundos.
+
+_indexes = OrderedDict()  # idea_id -> BM25Index
+_lock = Lock()
+
+_STOPWORDS = set(
+    "a o as os um uma uns umas de do da dos das em no na nos nas por para com sem e ou que se "
+    "ao aos como mais mas ja nao sim eu voce ele ela isso isto esse essa este esta meu minha "
+    "seu sua qual quais quando onde ser ter foi sao esta estao pelo pela".split()
+)
+
+SWOT_LABELS = {'strength': 'Força', 'weakness': 'Fraqueza', 'opportunity': 'Oportunidade', 'threat': 'Ameaça'}
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    tokens = []
+    for word in re.findall(r'[a-z0-9]+', text):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        # Plural simples, para "tarefa" encontrar "tarefas"
+        if len(word) > 3 and word.endswith('s'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _task_text(task):
+    return f"Tarefa: {task.content} (Status: {task.status})"
+
+
+def _expense_text(expense):
+    date = expense.date.strftime('%d/%m/%Y') if expense.date else ''
+    return f"Gasto: {expense.description}: R${expense.amount} ({date})"
+
+
+def _goal_text(goal):
+    return f"Meta ({goal.category}): {goal.title} - {goal.status}, {goal.progress or 0}% concluída"
+
+
+def _swot_text(item):
+    return f"SWOT - {SWOT_LABELS.get(item.category, item.category)}: {item.content}"
+
+
+def _customer_text(customer):
+    details = ', '.join(value for value in (customer.company, customer.category, customer.notes) if value)
+    return f"Cliente: {customer.name}" + (f" ({details})" if details else '')
+
+
+def _question_text(question):
+    return f"Pergunta: {question.text}\nResposta: {question.answer}"
+
+
+# Modelo -> (prefixo da chave do documento, texto do documento)
+SOURCES = {
+    Task: ('task', _task_text),
+    Expense: ('expense', _expense_text),
+    Goal: ('goal', _goal_text),
+    SWOTItem: ('swot', _swot_text),
+    Customer: ('customer', _customer_text),
+    Question: ('question', _question_text),
+}
+
+
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}  # chave -> (texto, tf, tamanho)
+        self.postings = defaultdict(set)
+        self.df = Counter()
+        self.total_length = 0
+        self.built_at = time.monotonic()
+
+    def upsert(self, key, text):
+        self.remove(key)
+        tf = Counter(tokenize(text))
+        length = sum(tf.values())
+        self.docs[key] = (text, tf, length)
+        self.total_length += length
+        for term in tf:
+            self.postings[term].add(key)
+            self.df[term] += 1
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        self.total_length -= doc[2]
+        for term in doc[1]:
+            self.postings[term].discard(key)
+            self.df[term] -= 1
+
+    def search(self, query):
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            df = self.df[term]
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for key in self.postings[term]:
+                _, tf, length = self.docs[key]
+                freq = tf[term]
+                scores[key] += idf * freq * (self.k1 + 1) / (freq + self.k1 * (1 - self.b + self.b * length / avg_length))
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _build(idea_id):
+    config = current_app.config
+    index = BM25Index(config.get('RETRIEVAL_BM25_K1', 1.2), config.get('RETRIEVAL_BM25_B', 0.75))
+    for model, (prefix, text) in SOURCES.items():
+        if model is SWOTItem:
+            rows = SWOTItem.query.join(SWOT, SWOT.id == SWOTItem.swot_id).filter(SWOT.idea_id == idea_id)
+        else:
+            rows = model.query.filter_by(idea_id=idea_id)
+        for row in rows:
+            index.upsert((prefix, row.id), text(row))
+    return index
+
+
+def get_index(idea_id):
+    ttl = current_app.config.get('RETRIEVAL_INDEX_TTL', 600)
+    with _lock:
+        index = _indexes.get(idea_id)
+        if index is not None and time.monotonic() - index.built_at < ttl:
+            _indexes.move_to_end(idea_id)
+            return index
+
+    index = _build(idea_id)
+
+    with _lock:
+        _indexes[idea_id] = index
+        _indexes.move_to_end(idea_id)
+        max_indexes = current_app.config.get('RETRIEVAL_MAX_INDEXES', 500)
+        while len(_indexes) > max_indexes:
+            _indexes.popitem(last=False)
+    return index
+
+
+# Itens da ideia mais relevantes para `query`, do mais para o menos relevante,
+# limitados a RETRIEVAL_TOP_K e ao orçamento de tokens. Se a ideia inteira
+# cabe no orçamento, todos os itens são devolvidos.
+def relevant_items(idea_id, query, token_budget=None):
+    config = current_app.config
+    token_budget = config.get('RETRIEVAL_TOKEN_BUDGET', 1500) if token_budget is None else token_budget
+    index = get_index(idea_id)
+    with _lock:
+        texts = {key: doc[0] for key, doc in index.docs.items()}
+        ranked = index.search(query)
+
+    if sum(memory.estimate_tokens(text) for text in texts.values()) <= token_budget:
+        return list(texts.values())
+
+    selected = []
+    used = 0
+    for key, _ in ranked[:config.get('RETRIEVAL_TOP_K', 12)]:
+        cost = memory.estimate_tokens(texts[key])
+        if used + cost > token_budget:
+            continue
+        selected.append(texts[key])
+        used += cost
+    return selected
+
+
+def invalidate(idea_id=None):
+    with _lock:
+        if idea_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(idea_id, None)
+
+
+def _idea_id_for(target, connection):
+    if isinstance(target, SWOTItem):
+        if target.swot_id is None:
+            return None
+        return connection.execute(select(SWOT.idea_id).where(SWOT.id == target.swot_id)).scalar()
+    return target.idea_id
+
+
+def _on_write(mapper, connection, target):
+    idea_id = _idea_id_for(target, connection)
+    if idea_id is None:
+        return
+    prefix, text = SOURCES[mapper.class_]
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('retrieval_changes', []).append((idea_id, (prefix, target.id), text(target)))
+
+
+def _on_delete(mapper, connection, target):
+    idea_id = _idea_id_for(target, connection)
+    if idea_id is None:
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('retrieval_changes', []).append((idea_id, (SOURCES[mapper.class_][0], target.id), None))
+
+
+for _model in SOURCES:
+    event.listen(_model, 'after_insert', _on_write)
+    event.listen(_model, 'after_update', _on_write)
+    event.listen(_model, 'after_delete', _on_delete)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    changes = session.info.pop('retrieval_changes', ())
+    if not changes:
+        return
+    # Só os índices já montados são atualizados; os demais nascem do banco
+    with _lock:
+        for idea_id, key, text in changes:
+            index = _indexes.get(idea_id)
+            if index is None:
+                continue
+            if text is None:
+                index.remove(key)
+            else:
+                index.upsert(key, text)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('retrieval_changes', None)
@@ -1,13 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, jsonify, current_app, redirect, url_for, flash, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from pydantic import BaseModel
-from typing import List
-from app import db, client, csrf, mail
-from app.models import Idea, Question, Task, Tag, SWOT, SWOTItem, SWOTAnalysis, Expense, ExpenseCategory, ChatMessage, NetworkingContact, NetworkingPost, Goal, LegalStep, LegalConsultation, MarketResearch, Customer
+from typing import List, Literal
+from app import db, csrf, mail, llm, jobs, idea_context, memory, scheduler, transport, routing, usage, legal_answers, idempotency, speculative, retrieval, unit_of_work, aio, loading, reference_data, idea_deletion
+from app.models import Idea, Question, Task, Tag, SWOT, SWOTItem, SWOTAnalysis, Expense, ExpenseCategory, ChatMessage, NetworkingContact, NetworkingPost, Goal, LegalStep, LegalConsultation, MarketResearch, Customer, Job, task_tags
 from datetime import datetime, timedelta
+from functools import wraps
 import logging
-import http.client
 import json
+import asyncio
+import hashlib
+import time
 import urllib.parse
 import pywhatkit
 import pytz
@@ -20,6 +23,8 @@ import csv
 from flask import send_file
 
 main = Blueprint('main', __name__)
+main.register_error_handler(scheduler.Overloaded, scheduler.overloaded_response)
+main.register_error_handler(usage.BudgetExceeded, usage.budget_exceeded_response)
 
 class QuestionModel(BaseModel):
     text: str
@@ -44,6 +49,73 @@ class SWOTAnalysisModel(BaseModel):
     opportunities: List[str]
     threats: List[str]
 
+class GoalModel(BaseModel):
+    title: str
+    category: Literal['especifica', 'mensuravel', 'alcancavel', 'relevante', 'temporal']
+
+class GoalList(BaseModel):
+    goals: List[GoalModel]
+
+class LegalStepModel(BaseModel):
+    description: str
+
+class LegalStepList(BaseModel):
+    steps: List[LegalStepModel]
+
+def wants_stream():
+    return request.args.get('stream') == '1' or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Encaminha os tokens da OpenAI via Server-Sent Events. `on_complete` recebe o
+# texto completo ao final do stream, persiste o resultado e devolve o payload
+# do evento 'done'.
+def sse_response(route, messages, on_complete):
+    def generate():
+        parts = []
+        try:
+            for token in llm.stream(route, messages):
+                parts.append(token)
+                yield sse_event({'token': token})
+            yield sse_event(on_complete(''.join(parts)), event='done')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error streaming {route}: {str(e)}")
+            yield sse_event({'success': False, 'error': str(e)}, event='error')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Enfileira uma geração longa e responde imediatamente com o id do job,
+# que pode ser acompanhado em /api/jobs/<id>.
+def enqueue_generation(kind, idea, **payload):
+    payload = dict(payload, idea_id=idea.id)
+    # Um job igual ainda na fila ou rodando é reaproveitado em vez de duplicado,
+    # assim como um especulativo da mesma geração que já tenha terminado
+    job = speculative.adopt(kind, idea.id, payload) or Job.query.filter(
+        Job.kind == kind,
+        Job.idea_id == idea.id,
+        Job.status.in_(['queued', 'running']),
+        Job.payload == json.dumps(payload)
+    ).first()
+    if job is None:
+        job = jobs.enqueue(kind, payload, user_id=current_user.id, idea_id=idea.id)
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+
+@main.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        abort(403)
+    jobs.ensure_workers(current_app._get_current_object())
+    return jsonify(job.to_dict())
+
 @main.route('/')
 @login_required
 def index():
@@ -51,60 +123,126 @@ def index():
     selected_idea_id = ideas[0].id if ideas else None
     return render_template('index.html', ideas=ideas, selected_idea_id=selected_idea_id)
 
+def idea_title_request(description):
+    return dict(
+        route='save_idea',
+        messages=[
+            {"role": "system", "content": "Você é um assistente especializado em criar títulos concisos para ideias de negócio. Gere um título curto e atrativo baseado na descrição fornecida."},
+            {"role": "user", "content": f"Descrição da ideia: {description}"}
+        ],
+        response_format=IdeaTitle,
+    )
+
+def idea_questions_request(description):
+    return dict(
+        route='generate_questions',
+        messages=[
+            {"role": "system", "content": "Você é um assistente especializado em empreendedorismo. Gere 5 perguntas relevantes para aprofundar o entendimento da ideia de negócio apresentada."},
+            {"role": "user", "content": f"Ideia de negócio: {description}"}
+        ],
+        response_format=QuestionList,
+    )
+
 @main.route('/save_idea', methods=['POST'])
 @login_required
-def save_idea():
+@idempotency.single_flight('save_idea')
+@scheduler.admit
+async def save_idea():
     description = request.json['description']
+    unit_of_work.release()
     
     try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em criar títulos concisos para ideias de negócio. Gere um título curto e atrativo baseado na descrição fornecida."},
-                {"role": "user", "content": f"Descrição da ideia: {description}"}
-            ],
-            response_format=IdeaTitle,
-        )
+        parsed = await llm.acomplete(**idea_title_request(description))
         
-        title = completion.choices[0].message.parsed.title
+        title = parsed.title
     except Exception as e:
         current_app.logger.error(f"Error generating title: {str(e)}")
         title = "Nova Ideia"
     
-    idea = Idea(title=title, description=description, author=current_user)
-    db.session.add(idea)
-    db.session.commit()
-    return jsonify({'success': True, 'id': idea.id, 'title': title})
+    idea_id = await aio.db(create_idea, current_user.id, title, description)
+    return jsonify({'success': True, 'id': idea_id, 'title': title})
+
+def create_idea(user_id, title, description, questions=()):
+    with unit_of_work.transaction():
+        idea = Idea(title=title, description=description, user_id=user_id)
+        db.session.add(idea)
+        for text in questions:
+            db.session.add(Question(text=text, idea=idea))
+        db.session.flush()
+        idea_id = idea.id
+    return idea_id
+
+def idea_description(idea_id):
+    return Idea.query.get_or_404(idea_id).description
+
+def save_questions(idea_id, questions):
+    with unit_of_work.transaction():
+        for text in questions:
+            db.session.add(Question(text=text, idea_id=idea_id))
 
 @main.route('/generate_questions', methods=['POST'])
 @login_required
-def generate_questions():
+@idempotency.single_flight('generate_questions')
+@scheduler.admit
+async def generate_questions():
     data = request.json
     idea_id = data['idea_id']
-    idea = Idea.query.get_or_404(idea_id)
+    unit_of_work.release()
+    description = await aio.db(idea_description, idea_id)
     
     try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em empreendedorismo. Gere 5 perguntas relevantes para aprofundar o entendimento da ideia de negócio apresentada."},
-                {"role": "user", "content": f"Ideia de negócio: {idea.description}"}
-            ],
-            response_format=QuestionList,
-        )
-        
-        questions = completion.choices[0].message.parsed.questions
+        parsed = await llm.acomplete(**idea_questions_request(description))
         
-        for q in questions:
-            question = Question(text=q.text, idea=idea)
-            db.session.add(question)
-        db.session.commit()
+        questions = [q.text for q in parsed.questions]
+        await aio.db(save_questions, idea_id, questions)
         
-        return jsonify([q.text for q in questions])
+        return jsonify(questions)
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error generating questions: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Cria a ideia gerando título e perguntas em paralelo e grava tudo em uma
+# única transação, substituindo a sequência /save_idea -> /generate_questions.
+@main.route('/onboard_idea', methods=['POST'])
+@login_required
+@idempotency.single_flight('onboard_idea')
+@scheduler.admit
+async def onboard_idea():
+    description = request.json['description']
+    unit_of_work.release()
+
+    title_result, questions_result = await llm.acomplete_concurrently([
+        idea_title_request(description),
+        idea_questions_request(description)
+    ], return_exceptions=True)
+
+    if isinstance(title_result, Exception):
+        current_app.logger.error(f"Error generating title: {str(title_result)}")
+        title = "Nova Ideia"
+    else:
+        title = title_result.title
+
+    if isinstance(questions_result, scheduler.Overloaded):
+        return scheduler.overloaded_response(questions_result)
+    if isinstance(questions_result, Exception):
+        current_app.logger.error(f"Error generating questions: {str(questions_result)}")
+        return jsonify({"error": str(questions_result)}), 500
+
+    try:
+        idea_id = await aio.db(create_idea, current_user.id, title, description, [q.text for q in questions_result.questions])
+    except Exception as e:
+        current_app.logger.error(f"Error saving idea: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        'success': True,
+        'id': idea_id,
+        'title': title,
+        'questions': [q.text for q in questions_result.questions]
+    })
+
 @main.route('/save_answers', methods=['POST'])
 @login_required
 def save_answers():
@@ -117,7 +255,10 @@ def save_answers():
         q.answer = a
     
     db.session.commit()
-    return jsonify({'success': True})
+
+    # Antecipa as gerações que normalmente vêm em seguida (se habilitado)
+    scheduled = speculative.schedule(Idea.query.get_or_404(idea_id), current_user.id)
+    return jsonify({'success': True, 'speculative_jobs': [job.id for job in scheduled]})
 
 @main.route('/get_idea/<int:idea_id>')
 @login_required
@@ -131,60 +272,233 @@ def get_idea(idea_id):
         'questions': [{'text': q.text, 'answer': q.answer} for q in questions]
     })
 
+def initial_tasks_messages(idea_id):
+    idea = Idea.query.get(idea_id)
+    if idea is None:
+        return None
+    context = f"Ideia: {idea.description}\n" + idea_context.section(idea.id, 'questions_detailed')
+    return [
+        {"role": "system", "content": "Você é um assistente especializado em planejamento de projetos. Gere 10 tarefas iniciais para tirar a ideia do papel, baseando-se na descrição da ideia e nas perguntas e respostas fornecidas. Para cada tarefa, inclua um nível de criticidade (0 para baixa, 1 para média, 2 para alta) e até 3 tags relevantes."},
+        {"role": "user", "content": context}
+    ]
+
+def save_initial_tasks(idea_id, tasks):
+    with unit_of_work.transaction():
+        # Tags de todas as tarefas resolvidas de uma vez
+        tags_by_name = {tag.name: tag for tag in reference_data.tags([name for task in tasks for name in task.tags])}
+        for i, task in enumerate(tasks):
+            db.session.add(Task(
+                content=task.content,
+                status='to_do',
+                order=i,
+                idea_id=idea_id,
+                criticality=task.criticality,
+                tags=[tags_by_name[name] for name in reference_data.clean_names(Tag, task.tags) if name in tags_by_name]
+            ))
+    
+    tasks = loading.apply(Task.query.filter_by(idea_id=idea_id), 'task_list').all()
+    return [{'id': t.id, 'content': t.content, 'status': t.status, 'criticality': t.criticality, 'tags': [{'id': tag.id, 'name': tag.name} for tag in t.tags]} for t in tasks]
+
+# Os handlers async carregam as entradas e gravam o resultado no pool de
+# threads do banco (aio.db) e esperam a OpenAI no event loop, sem segurar
+# thread nem conexão durante a chamada.
+def idea_messages(idea_id, build, *args):
+    idea = Idea.query.get(idea_id)
+    return build(idea, *args) if idea is not None else None
+
+@jobs.handler('generate_tasks')
+async def create_initial_tasks(idea_id):
+    messages = await aio.db(initial_tasks_messages, idea_id)
+    if messages is None:
+        return {'success': False, 'error': 'Ideia não encontrada'}
+    
+    parsed = await llm.acomplete('generate_tasks', messages=messages, response_format=TaskList)
+    
+    tasks = await aio.db(save_initial_tasks, idea_id, parsed.tasks)
+    return {'success': True, 'tasks': tasks}
+
 @main.route('/generate_tasks', methods=['POST'])
 @login_required
+@idempotency.single_flight('generate_tasks')
 def generate_tasks():
     data = request.json
-    idea_id = data['idea_id']
+    idea = Idea.query.get_or_404(data['idea_id'])
+    return enqueue_generation('generate_tasks', idea)
+
+# Gera tarefas, SWOT, metas e etapas legais de uma ideia recém-criada de uma
+# vez: as quatro chamadas partem do mesmo contexto e rodam em paralelo, e
+# todas as linhas são gravadas numa única transação. Etapas que falharem são
+# informadas no resultado sem impedir a gravação das demais.
+def bootstrap_requests(idea, timeframe, aggression, budget):
+    # Os mesmos prompts das gerações avulsas; o bootstrap só pede resposta estruturada
+    return {
+        'tasks': dict(route='generate_tasks', messages=initial_tasks_messages(idea.id), response_format=TaskList),
+        'swot': dict(route='generate_swot_analysis', messages=swot_messages(idea), response_format=SWOTAnalysisModel),
+        'goals': dict(route='generate_goals', messages=goals_messages(idea, timeframe, aggression, budget, ''), response_format=GoalList),
+        'legal': dict(route='generate_legal_steps', messages=legal_steps_messages(idea), response_format=LegalStepList),
+    }
+
+def insert_bootstrap_tasks(idea_id, tasks):
+    start_order = Task.query.filter_by(idea_id=idea_id).count()
+    task_ids = db.session.scalars(
+        db.insert(Task).returning(Task.id, sort_by_parameter_order=True),
+        [
+            {'content': task.content, 'status': 'to_do', 'order': start_order + i, 'idea_id': idea_id, 'criticality': task.criticality}
+            for i, task in enumerate(tasks)
+        ]
+    ).all()
+
+    tag_ids = reference_data.tag_ids([name for task in tasks for name in task.tags])
+    links = {
+        (task_id, tag_ids[name])
+        for task_id, task in zip(task_ids, tasks)
+        for name in reference_data.clean_names(Tag, task.tags)
+    }
+    if links:
+        db.session.execute(task_tags.insert(), [{'task_id': task_id, 'tag_id': tag_id} for task_id, tag_id in links])
+    return len(task_ids)
+
+def swot_for_write(idea_id):
+    # A linha SWOT é criada na primeira escrita, nunca ao abrir a página
+    swot = SWOT.query.filter_by(idea_id=idea_id).first()
+    if not swot:
+        swot = SWOT(idea_id=idea_id)
+        db.session.add(swot)
+        db.session.flush()
+    return swot
+
+def insert_bootstrap_swot(idea_id, swot_data):
+    swot = swot_for_write(idea_id)
+    SWOTItem.query.filter_by(swot_id=swot.id).delete()
+    rows = swot_item_rows(swot.id, swot_data)
+    if rows:
+        db.session.execute(db.insert(SWOTItem), rows)
+    return len(rows)
+
+def insert_bootstrap_goals(idea_id, goal_list, timeframe, aggression):
+    deadline = (datetime.now() + timedelta(days=180)).date()
+    rows = [
+        {
+            'idea_id': idea_id,
+            'title': goal.title,
+            'description': "Meta gerada automaticamente",
+            'deadline': deadline,
+            'status': "Em andamento",
+            'category': goal.category,
+            'timeframe': timeframe,
+            'aggression': aggression
+        }
+        for goal in goal_list.goals
+    ]
+    if rows:
+        db.session.execute(db.insert(Goal), rows)
+    return len(rows)
+
+def strip_step_number(description):
+    # O prompt pede lista numerada; o número vem da coluna `order`
+    description = description.strip()
+    if description[:1].isdigit() and ' ' in description:
+        return description[description.index(' ')+1:]
+    return description
+
+def insert_bootstrap_legal_steps(idea_id, step_list):
+    LegalStep.query.filter_by(idea_id=idea_id).delete()
+    rows = [
+        {'idea_id': idea_id, 'description': strip_step_number(step.description), 'order': i + 1, 'progress': 0}
+        for i, step in enumerate(step_list.steps)
+    ]
+    if rows:
+        db.session.execute(db.insert(LegalStep), rows)
+    return len(rows)
+
+def insert_bootstrap_results(idea_id, results, timeframe, aggression):
+    inserters = {
+        'tasks': lambda result: insert_bootstrap_tasks(idea_id, result.tasks),
+        'swot': lambda result: insert_bootstrap_swot(idea_id, result),
+        'goals': lambda result: insert_bootstrap_goals(idea_id, result, timeframe, aggression),
+        'legal': lambda result: insert_bootstrap_legal_steps(idea_id, result),
+    }
+    counts = {}
+    with unit_of_work.transaction():
+        for stage, result in results.items():
+            counts[stage] = inserters[stage](result)
+    # Inserções em lote não disparam os eventos do ORM
+    retrieval.invalidate(idea_id)
+    return counts
+
+@jobs.handler('bootstrap_idea')
+async def bootstrap_idea_pipeline(idea_id, timeframe, aggression, budget, skip=()):
+    started = time.monotonic()
+    calls = await aio.db(idea_messages, idea_id, bootstrap_requests, timeframe, aggression, budget)
+    if calls is None:
+        return {'success': False, 'error': 'Ideia não encontrada'}
+
+    timings = {'context': time.monotonic() - started}
+
+    # Etapas já cobertas por jobs especulativos adotados ficam de fora
+    requests_by_stage = {stage: call for stage, call in calls.items() if stage not in skip}
+    generation_started = time.monotonic()
+    durations = []
+    # No máximo tantas chamadas quanto as vagas do usuário no escalonador,
+    # para que as últimas etapas não estourem LLM_MAX_QUEUE_WAIT na fila
+    results = await llm.acomplete_concurrently(
+        list(requests_by_stage.values()), return_exceptions=True, timings=durations,
+        limit=current_app.config.get('LLM_PER_USER_CONCURRENCY', 2)
+    )
+    timings['generation'] = time.monotonic() - generation_started
+    results = dict(zip(requests_by_stage, results))
+
+    errors = {}
+    for stage, result in results.items():
+        if isinstance(result, Exception):
+            current_app.logger.error(f"Bootstrap da ideia {idea_id}: etapa {stage} falhou: {str(result)}")
+            errors[stage] = str(result)
+    if len(errors) == len(results):
+        # Nada a gravar; deixa o job falhar (e ser repetido, se for o caso)
+        raise next(iter(results.values()))
+
+    insert_started = time.monotonic()
+    counts = await aio.db(
+        insert_bootstrap_results, idea_id,
+        {stage: result for stage, result in results.items() if stage not in errors},
+        timeframe, aggression
+    )
+    timings['insert'] = time.monotonic() - insert_started
+    timings['total'] = time.monotonic() - started
+
+    stages = {
+        stage: {
+            'success': stage not in errors,
+            'seconds': round(duration, 3),
+            'rows': counts.get(stage, 0),
+            'error': errors.get(stage)
+        }
+        for stage, duration in zip(requests_by_stage, durations)
+    }
+    timings = {name: round(value, 3) for name, value in timings.items()}
+    current_app.logger.info(f"Bootstrap da ideia {idea_id}: {timings} {counts}")
+    return {'success': True, 'stages': stages, 'skipped': list(skip), 'timings': timings}
+
+@main.route('/api/ideas/<int:idea_id>/bootstrap', methods=['POST'])
+@login_required
+@idempotency.single_flight('bootstrap_idea')
+def bootstrap_idea(idea_id):
     idea = Idea.query.get_or_404(idea_id)
-    
-    context = f"Ideia: {idea.description}\n"
-    questions = Question.query.filter_by(idea_id=idea_id).all()
-    for q in questions:
-        context += f"Pergunta: {q.text}\nResposta: {q.answer}\n"
-    
-    try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em planejamento de projetos. Gere 10 tarefas iniciais para tirar a ideia do papel, baseando-se na descrição da ideia e nas perguntas e respostas fornecidas. Para cada tarefa, inclua um nível de criticidade (0 para baixa, 1 para média, 2 para alta) e até 3 tags relevantes."},
-                {"role": "user", "content": context}
-            ],
-            response_format=TaskList,
-        )
-        
-        tasks = completion.choices[0].message.parsed.tasks
-        
-        for i, task in enumerate(tasks):
-            new_task = Task(
-                content=task.content,
-                status='to_do',
-                order=i,
-                idea=idea,
-                criticality=task.criticality
-            )
-            db.session.add(new_task)
-            db.session.flush()  # Isso atribui um ID à nova tarefa
-            
-            # Adicionar tags
-            for tag_name in task.tags:
-                tag = Tag.query.filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(name=tag_name)
-                    db.session.add(tag)
-                    db.session.flush()  # Isso atribui um ID à nova tag
-                
-                # Verificar se a relação já existe antes de adicionar
-                if tag not in new_task.tags:
-                    new_task.tags.append(tag)
-        
-        db.session.commit()
-        
-        return jsonify({'success': True, 'tasks': [{'id': t.id, 'content': t.content, 'status': t.status, 'criticality': t.criticality, 'tags': [{'id': tag.id, 'name': tag.name} for tag in t.tags]} for t in idea.tasks]})
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Error generating tasks: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    if idea.user_id != current_user.id:
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    skip = [
+        stage for kind, stage in (('generate_tasks', 'tasks'), ('generate_swot', 'swot'))
+        if speculative.adopt(kind, idea.id, {'idea_id': idea.id}) is not None
+    ]
+    return enqueue_generation(
+        'bootstrap_idea', idea,
+        timeframe=data.get('timeframe', 'trimestral'),
+        aggression=int(data.get('aggression', 3)),
+        budget=float(data.get('budget', 0)),
+        skip=skip
+    )
 
 @main.route('/kanban')
 @login_required
@@ -202,7 +516,7 @@ def kanban(idea_id):
 @main.route('/get_tasks/<int:idea_id>')
 @login_required
 def get_tasks(idea_id):
-    tasks = Task.query.filter_by(idea_id=idea_id).order_by(Task.order).all()
+    tasks = loading.apply(Task.query.filter_by(idea_id=idea_id).order_by(Task.order), 'task_list').all()
     return jsonify([{
         'id': task.id,
         'content': task.content,
@@ -223,21 +537,10 @@ def add_task():
         order=data.get('order', 0),
         idea_id=data['idea_id'],
         due_date=datetime.fromisoformat(data['due_date']) if data.get('due_date') else None,
-        criticality=data.get('criticality', 0)
+        criticality=data.get('criticality', 0),
+        tags=reference_data.tags(data.get('tags', []))
     )
     db.session.add(new_task)
-    db.session.flush()
-
-    # Add tags
-    for tag_name in data.get('tags', []):
-        tag = Tag.query.filter_by(name=tag_name).first()
-        if not tag:
-            tag = Tag(name=tag_name)
-            db.session.add(tag)
-            db.session.flush()
-        if tag not in new_task.tags:
-            new_task.tags.append(tag)
-
     db.session.commit()
     return jsonify({
         'id': new_task.id,
@@ -269,13 +572,7 @@ def update_task():
         task.criticality = data.get('criticality', task.criticality)
 
         # Atualizar tags
-        task.tags = []
-        for tag_name in data.get('tags', []):
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.session.add(tag)
-            task.tags.append(tag)
+        task.tags = reference_data.tags(data.get('tags', []))
 
         db.session.commit()
         
@@ -310,12 +607,13 @@ def add_tag():
     tag_name = request.json['tag_name']
     
     task = Task.query.get_or_404(task_id)
-    tag = Tag.query.filter_by(name=tag_name).first()
-    if not tag:
-        tag = Tag(name=tag_name)
-        db.session.add(tag)
+    tags = reference_data.tags([tag_name])
+    if not tags:
+        return jsonify({'success': False, 'error': 'Nome da tag é obrigatório'}), 400
+    tag = tags[0]
     
-    task.tags.append(tag)
+    if tag not in task.tags:
+        task.tags.append(tag)
     db.session.commit()
     return jsonify({'success': True, 'tag_id': tag.id})
 
@@ -350,18 +648,37 @@ def swot_overview():
 def swot_analysis(idea_id):
     return view_idea(idea_id, 'swot')
 
-@main.route('/generate_swot/<int:idea_id>')
+@main.route('/generate_swot/<int:idea_id>', methods=['GET', 'POST'])
 @login_required
+@idempotency.single_flight('generate_swot')
 def generate_swot(idea_id):
     idea = Idea.query.get_or_404(idea_id)
-    swot = generate_swot_analysis(idea)
+    if request.method == 'POST':
+        return enqueue_generation('generate_swot', idea)
+    if speculative.adopt('generate_swot', idea.id, {'idea_id': idea.id}) is None:
+        jobs.enqueue('generate_swot', {'idea_id': idea.id}, user_id=current_user.id, idea_id=idea.id)
+    flash('A análise SWOT está sendo gerada. Atualize a página em alguns instantes.')
     return redirect(url_for('main.swot_analysis', idea_id=idea_id))
 
+@jobs.handler('generate_swot')
+async def run_swot_generation(idea_id):
+    messages = await aio.db(idea_messages, idea_id, swot_messages)
+    if messages is None:
+        return {'success': False, 'error': 'Ideia não encontrada'}
+    swot_id = await generate_swot_analysis(idea_id, messages)
+    return {'success': True, 'swot_id': swot_id}
+
 @main.route('/add_swot_item', methods=['POST'])
 @login_required
 def add_swot_item():
     data = request.json
-    swot_id = data['swot_id']
+    swot_id = data.get('swot_id')
+    if not swot_id:
+        # Ideia ainda sem SWOT: a linha nasce com o primeiro item
+        idea = Idea.query.get_or_404(data.get('idea_id'))
+        if idea.user_id != current_user.id:
+            return jsonify({'success': False, 'error': 'Não autorizado'}), 403
+        swot_id = swot_for_write(idea.id).id
     category = data['category']
     content = data['content']
     
@@ -383,57 +700,50 @@ def remove_swot_item():
     
     return jsonify({'success': True})
 
-def generate_swot_analysis(idea):
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    
-    context = f"Ideia: {idea.description}\n"
-    for q in questions:
-        context += f"Pergunta: {q.text}\nResposta: {q.answer}\n"
-    
-    swot = SWOT.query.filter_by(idea_id=idea.id).first()
-    if not swot:
-        swot = SWOT(idea_id=idea.id)
-        db.session.add(swot)
-    else:
+def swot_messages(idea):
+    context = f"Ideia: {idea.description}\n" + idea_context.section(idea.id, 'questions_detailed')
+    return [
+        {"role": "system", "content": "Você é um especialista em análise de negócios. Com base na ideia e nas perguntas e respostas fornecidas, gere uma análise SWOT (Forças, Fraquezas, Oportunidades e Ameaças) para o negócio proposto."},
+        {"role": "user", "content": context}
+    ]
+
+def swot_item_rows(swot_id, swot_data):
+    categories = (
+        ('strength', swot_data.strengths),
+        ('weakness', swot_data.weaknesses),
+        ('opportunity', swot_data.opportunities),
+        ('threat', swot_data.threats)
+    )
+    return [
+        {'swot_id': swot_id, 'category': category, 'content': content}
+        for category, contents in categories
+        for content in contents
+    ]
+
+def save_swot_analysis(idea_id, swot_data):
+    # Os itens antigos só são trocados quando a nova análise chega
+    with unit_of_work.transaction():
+        swot = swot_for_write(idea_id)
         # Limpar itens SWOT existentes
         SWOTItem.query.filter_by(swot_id=swot.id).delete()
-    
-    db.session.commit()
-    
+        swot_id = swot.id
+        rows = swot_item_rows(swot_id, swot_data)
+        if rows:
+            db.session.execute(db.insert(SWOTItem), rows)
+    retrieval.invalidate(idea_id)
+    return swot_id
+
+async def generate_swot_analysis(idea_id, messages):
     try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um especialista em análise de negócios. Com base na ideia e nas perguntas e respostas fornecidas, gere uma análise SWOT (Forças, Fraquezas, Oportunidades e Ameaças) para o negócio proposto."},
-                {"role": "user", "content": context}
-            ],
+        swot_data = await llm.acomplete(
+            'generate_swot_analysis',
+            messages=messages,
             response_format=SWOTAnalysisModel,
         )
-        
-        swot_data = completion.choices[0].message.parsed
-        
-        for strength in swot_data.strengths:
-            item = SWOTItem(swot_id=swot.id, category='strength', content=strength)
-            db.session.add(item)
-        
-        for weakness in swot_data.weaknesses:
-            item = SWOTItem(swot_id=swot.id, category='weakness', content=weakness)
-            db.session.add(item)
-        
-        for opportunity in swot_data.opportunities:
-            item = SWOTItem(swot_id=swot.id, category='opportunity', content=opportunity)
-            db.session.add(item)
-        
-        for threat in swot_data.threats:
-            item = SWOTItem(swot_id=swot.id, category='threat', content=threat)
-            db.session.add(item)
-        
-        db.session.commit()
+        return await aio.db(save_swot_analysis, idea_id, swot_data)
     except Exception as e:
         current_app.logger.error(f"Error generating SWOT analysis: {str(e)}")
-        db.session.rollback()
-    
-    return swot
+        raise
 
 @main.route('/assistant/<int:idea_id>')
 @login_required
@@ -447,74 +757,63 @@ def assistant(idea_id):
 @main.route('/api/assistant/<int:idea_id>/chat', methods=['POST'])
 @login_required
 @csrf.exempt
-def chat_with_assistant(idea_id):
-    idea = Idea.query.get_or_404(idea_id)
-    if idea.user_id != current_user.id:
-        abort(403)
-
+@scheduler.admit
+async def chat_with_assistant(idea_id):
     data = request.json
     if not data or 'message' not in data:
         return jsonify({"success": False, "error": "Mensagem não fornecida"}), 400
 
     user_message = data['message']
+    unit_of_work.release()
 
-    # Salvar a mensagem do usuário
-    user_chat_message = ChatMessage(idea_id=idea_id, role='user', content=user_message)
-    db.session.add(user_chat_message)
-    db.session.commit()
+    # Salva a mensagem e prepara o contexto (mensagens recentes e resumo da
+    # conversa) no pool do banco; a resposta da OpenAI é esperada no event loop
+    user_id = current_user.id
+    messages = await aio.db(chat_messages, idea_id, user_id, user_message)
 
-    # Preparar o contexto para o assistente
-    context = prepare_assistant_context(idea)
+    if wants_stream():
+        return sse_response('chat_with_assistant', messages, lambda text: save_chat_response(idea_id, user_id, text))
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": user_message}
-            ]
-        )
-        
-        assistant_response = completion.choices[0].message.content
-
-        # Salvar a resposta do assistente
-        assistant_chat_message = ChatMessage(idea_id=idea_id, role='assistant', content=assistant_response)
-        db.session.add(assistant_chat_message)
-        db.session.commit()
-
-        return jsonify({'success': True, 'response': assistant_response})
+        assistant_response = await llm.acomplete('chat_with_assistant', messages=messages)
+        return jsonify(await aio.db(save_chat_response, idea_id, user_id, assistant_response))
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in chat with assistant: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-def prepare_assistant_context(idea):
-    context = f"Você é um assistente IA especializado em ajudar com a seguinte ideia de negócio: {idea.description}\n\n"
-    
-    # Adicionar informações sobre gastos
-    expenses = Expense.query.filter_by(idea_id=idea.id).all()
-    if expenses:
-        context += "Gastos registrados:\n"
-        for expense in expenses:
-            context += f"- {expense.description}: R${expense.amount} ({expense.date.strftime('%d/%m/%Y')})\n"
-    
-    # Adicionar informações sobre tarefas do Kanban
-    tasks = Task.query.filter_by(idea_id=idea.id).all()
-    if tasks:
-        context += "\nTarefas do Kanban:\n"
-        for task in tasks:
-            context += f"- {task.content} (Status: {task.status})\n"
+def chat_messages(idea_id, user_id, user_message):
+    idea = Idea.query.get_or_404(idea_id)
+    if idea.user_id != user_id:
+        abort(403)
+
+    # Salvar a mensagem do usuário
+    with unit_of_work.transaction():
+        db.session.add(ChatMessage(idea_id=idea_id, role='user', content=user_message))
+
+    context = prepare_assistant_context(idea, user_message)
+    return memory.build_messages(idea_id, context, 'chat_with_assistant')
+
+def save_chat_response(idea_id, user_id, assistant_response):
+    # Salvar a resposta do assistente
+    with unit_of_work.transaction():
+        db.session.add(ChatMessage(idea_id=idea_id, role='assistant', content=assistant_response))
+    memory.schedule_summary(idea_id, user_id)
+    return {'success': True, 'response': assistant_response}
+
+def prepare_assistant_context(idea, user_message):
+    parts = [f"Você é um assistente IA especializado em ajudar com a seguinte ideia de negócio: {idea.description}\n\n"]
     
-    # Adicionar perguntas e respostas
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    if questions:
-        context += "\nPerguntas e respostas sobre a ideia:\n"
-        for question in questions:
-            context += f"Q: {question.text}\n"
-            context += f"A: {question.answer}\n\n"
+    # Só os itens da ideia (tarefas, gastos, metas, SWOT, clientes e Q&A)
+    # relevantes para a mensagem, dentro do orçamento de tokens
+    items = retrieval.relevant_items(idea.id, user_message)
+    if items:
+        parts.append("Informações registradas sobre a ideia relacionadas à mensagem:\n" + ''.join(f"- {item}\n" for item in items))
     
-    context += "\nCom base nessas informações, ajude o usuário com suas dúvidas e forneça insights relevantes para o desenvolvimento do negócio."
+    parts.append("\nCom base nessas informações, ajude o usuário com suas dúvidas e forneça insights relevantes para o desenvolvimento do negócio.")
     
-    return context
+    return ''.join(parts)
 
 @main.route('/expenses/<int:idea_id>')
 @login_required
@@ -523,7 +822,7 @@ def view_expenses(idea_id):
     if idea.user_id != current_user.id:
         abort(403)
     expenses = Expense.query.filter_by(idea_id=idea_id).all()
-    categories = ExpenseCategory.query.all()
+    categories = reference_data.categories()
     return render_template('expenses.html', idea=idea, expenses=expenses, categories=categories)
 
 @main.route('/goals/<int:idea_id>')
@@ -590,62 +889,72 @@ def api_goal(goal_id):
         db.session.commit()
         return jsonify({'success': True})
 
+def goals_messages(idea, timeframe, aggression, budget, context):
+    context_text = (
+        idea_context.business_context(idea)
+        + f"Período: {timeframe}\n"
+        + f"Nível de agressividade: {aggression}/5\n"
+        + f"Orçamento: R$ {budget}\n"
+        + f"Contexto adicional: {context}\n"
+    )
+    return [
+        {"role": "system", "content": f"Você é um especialista em planejamento estratégico. Com base nas informações fornecidas sobre a ideia de negócio, sugira 5 metas SMART (Específicas, Mensuráveis, Alcançáveis, Relevantes e Temporais) para o período de {timeframe} com um nível de agressividade de {aggression}/5 e um orçamento de R$ {budget}. Forneça uma meta para cada categoria: Específica, Mensurável, Alcançável, Relevante e Temporal. Separe cada meta com um caractere de nova linha."},
+        {"role": "user", "content": context_text}
+    ]
+
+def goal_rows(idea_id, content, timeframe, aggression):
+    generated_goals = content.split('\n')
+    generated_goals = [goal.strip() for goal in generated_goals if goal.strip()]  # Remove linhas vazias
+
+    categories = ['especifica', 'mensuravel', 'alcancavel', 'relevante', 'temporal']
+    deadline = (datetime.now() + timedelta(days=180)).date()
+    return [
+        {
+            'idea_id': idea_id,
+            'title': goal,
+            'description': "Meta gerada automaticamente",
+            'deadline': deadline,
+            'status': "Em andamento",
+            'category': category,
+            'timeframe': timeframe,
+            'aggression': aggression
+        }
+        for goal, category in zip(generated_goals, categories)
+    ]
+
+def save_goals(idea_id, rows):
+    with unit_of_work.transaction():
+        if rows:
+            db.session.execute(db.insert(Goal), rows)
+    retrieval.invalidate(idea_id)
+
+@jobs.handler('generate_goals')
+async def create_goals(idea_id, timeframe, aggression, budget, context):
+    messages = await aio.db(idea_messages, idea_id, goals_messages, timeframe, aggression, budget, context)
+    if messages is None:
+        return {"success": False, "error": "Ideia não encontrada"}
+
+    content = await llm.acomplete('generate_goals', messages=messages)
+
+    await aio.db(save_goals, idea_id, goal_rows(idea_id, content, timeframe, aggression))
+    return {"success": True, "message": f"Metas geradas com sucesso para o período {timeframe} com agressividade {aggression}/5."}
+
 @main.route('/api/goals/<int:idea_id>/generate', methods=['POST'])
 @login_required
+@idempotency.single_flight('generate_goals')
 def generate_goals(idea_id):
     idea = Idea.query.get_or_404(idea_id)
     if idea.user_id != current_user.id:
         abort(403)
 
     data = request.json
-    timeframe = data.get('timeframe', 'trimestral')
-    aggression = int(data.get('aggression', 3))
-    budget = float(data.get('budget', 0))
-    context = data.get('context', '')
-
-    context_text = f"Ideia de negócio: {idea.description}\n\n"
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    for question in questions:
-        context_text += f"Q: {question.text}\nA: {question.answer}\n\n"
-    context_text += f"Período: {timeframe}\n"
-    context_text += f"Nível de agressividade: {aggression}/5\n"
-    context_text += f"Orçamento: R$ {budget}\n"
-    context_text += f"Contexto adicional: {context}\n"
-
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": f"Você é um especialista em planejamento estratégico. Com base nas informações fornecidas sobre a ideia de negócio, sugira 5 metas SMART (Específicas, Mensuráveis, Alcançáveis, Relevantes e Temporais) para o período de {timeframe} com um nível de agressividade de {aggression}/5 e um orçamento de R$ {budget}. Forneça uma meta para cada categoria: Específica, Mensurável, Alcançável, Relevante e Temporal. Separe cada meta com um caractere de nova linha."},
-                {"role": "user", "content": context_text}
-            ]
-        )
-        
-        generated_goals = completion.choices[0].message.content.split('\n')
-        generated_goals = [goal.strip() for goal in generated_goals if goal.strip()]  # Remove linhas vazias
-        
-        categories = ['especifica', 'mensuravel', 'alcancavel', 'relevante', 'temporal']
-        for i, goal in enumerate(generated_goals):
-            if i < len(categories):
-                new_goal = Goal(
-                    idea_id=idea_id,
-                    title=goal,
-                    description="Meta gerada automaticamente",
-                    deadline=(datetime.now() + timedelta(days=180)).date(),
-                    status="Em andamento",
-                    category=categories[i],
-                    timeframe=timeframe,
-                    aggression=aggression
-                )
-                db.session.add(new_goal)
-        
-        db.session.commit()
-        return jsonify({"success": True, "message": f"Metas geradas com sucesso para o período {timeframe} com agressividade {aggression}/5."})
-
-    except Exception as e:
-        current_app.logger.error(f"Error in goal generation: {str(e)}")
-        db.session.rollback()
-        return jsonify({"success": False, "error": str(e)}), 500
+    return enqueue_generation(
+        'generate_goals', idea,
+        timeframe=data.get('timeframe', 'trimestral'),
+        aggression=int(data.get('aggression', 3)),
+        budget=float(data.get('budget', 0)),
+        context=data.get('context', '')
+    )
 
 @main.route('/market_research/<int:idea_id>')
 @login_required
@@ -656,21 +965,8 @@ def market_research(idea_id):
     researches = MarketResearch.query.filter_by(idea_id=idea_id).order_by(MarketResearch.created_at.desc()).all()
     return render_template('market_research.html', idea=idea, researches=researches)
 
-@main.route('/api/market_research/<int:idea_id>/generate', methods=['POST'])
-@login_required
-def generate_market_research(idea_id):
-    idea = Idea.query.get_or_404(idea_id)
-    if idea.user_id != current_user.id:
-        abort(403)
-
-    data = request.json
-    location = data.get('location', '')
-    options = data.get('options', [])
-
-    context = f"Ideia de negócio: {idea.description}\n\n"
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    for question in questions:
-        context += f"Q: {question.text}\nA: {question.answer}\n\n"
+def market_research_messages(idea, location, options):
+    context = idea_context.business_context(idea)
 
     prompt = f"""Você é um especialista em pesquisa de mercado. Com base nas informações fornecidas sobre a ideia de negócio, realize uma pesquisa de mercado abrangente. Use a internet para encontrar informações atualizadas e relevantes. Inclua links acessíveis para as fontes de informação.
 
@@ -690,26 +986,50 @@ Forneça uma análise detalhada que inclua:
 
 Certifique-se de incluir links para todas as fontes de informação utilizadas."""
 
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um assistente de pesquisa de mercado especializado."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        research_content = completion.choices[0].message.content
+    messages = [
+        {"role": "system", "content": "Você é um assistente de pesquisa de mercado especializado."},
+        {"role": "user", "content": prompt}
+    ]
+    return messages
 
+def save_market_research(idea_id, location, research_content):
+    with unit_of_work.transaction():
         new_research = MarketResearch(idea_id=idea_id, content=research_content, location=location)
         db.session.add(new_research)
-        db.session.commit()
+        db.session.flush()
+        research_id = new_research.id
+    return {"success": True, "id": research_id, "content": research_content}
+
+@jobs.handler('generate_market_research')
+async def create_market_research(idea_id, location, options):
+    messages = await aio.db(idea_messages, idea_id, market_research_messages, location, options)
+    if messages is None:
+        return {"success": False, "error": "Ideia não encontrada"}
+    research_content = await llm.acomplete('generate_market_research', messages=messages)
+    return await aio.db(save_market_research, idea_id, location, research_content)
+
+@main.route('/api/market_research/<int:idea_id>/generate', methods=['POST'])
+@login_required
+@idempotency.single_flight('generate_market_research')
+@scheduler.admit
+def generate_market_research(idea_id):
+    idea = Idea.query.get_or_404(idea_id)
+    if idea.user_id != current_user.id:
+        abort(403)
 
-        return jsonify({"success": True, "content": research_content})
+    data = request.json
+    location = data.get('location', '')
+    options = data.get('options', [])
 
-    except Exception as e:
-        current_app.logger.error(f"Error in market research generation: {str(e)}")
-        return jsonify({"success": False, "error": str(e)}), 500
+    if wants_stream():
+        messages = market_research_messages(idea, location, options)
+        unit_of_work.release()
+        return sse_response(
+            'generate_market_research', messages,
+            lambda research_content: save_market_research(idea_id, location, research_content)
+        )
+
+    return enqueue_generation('generate_market_research', idea, location=location, options=options)
 
 @main.route('/api/market_research/<int:research_id>', methods=['DELETE'])
 @login_required
@@ -730,82 +1050,95 @@ def legal(idea_id):
         abort(403)
     legal_steps = LegalStep.query.filter_by(idea_id=idea_id).order_by(LegalStep.order).all()
     consultations = LegalConsultation.query.filter_by(idea_id=idea_id).order_by(LegalConsultation.created_at).all()
-    return render_template('legal.html', idea=idea, legal_steps=legal_steps, consultations=consultations)
+    budget = usage.budget_status(current_user.id)
+    return render_template('legal.html', idea=idea, legal_steps=legal_steps, consultations=consultations, budget=budget)
 
 
 
-@main.route('/generate_more_tasks', methods=['POST'])
-@login_required
-def generate_more_tasks():
-    idea_id = request.json['idea_id']
-    idea = Idea.query.get_or_404(idea_id)
-    completed_tasks = Task.query.filter_by(idea_id=idea_id, status='closed').all()
+def more_tasks_messages(idea):
+    completed_tasks = Task.query.filter_by(idea_id=idea.id, status='closed').all()
     
     context = f"Ideia: {idea.description}\n"
     context += "Tarefas concluídas:\n"
     for task in completed_tasks:
         context += f"- {task.content}\n"
     
-    try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em planejamento de projetos. Gere 5 novas tarefas para continuar o desenvolvimento da ideia, considerando as tarefas já concluídas."},
-                {"role": "user", "content": context}
-            ],
-            response_format=TaskList,
-        )
-        
-        tasks = completion.choices[0].message.parsed.tasks
-        
+    return [
+        {"role": "system", "content": "Você é um assistente especializado em planejamento de projetos. Gere 5 novas tarefas para continuar o desenvolvimento da ideia, considerando as tarefas já concluídas."},
+        {"role": "user", "content": context}
+    ]
+
+def save_more_tasks(idea_id, tasks):
+    with unit_of_work.transaction():
         for i, task in enumerate(tasks):
-            new_task = Task(content=task.content, status='to_do', order=i, idea=idea)
-            db.session.add(new_task)
-        
-        db.session.commit()
-        
-        return jsonify({'success': True, 'tasks': [{'id': t.id, 'content': t.content, 'status': t.status} for t in idea.tasks.filter_by(status='to_do')]})
-    except Exception as e:
-        current_app.logger.error(f"Error generating more tasks: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+            db.session.add(Task(content=task.content, status='to_do', order=i, idea_id=idea_id))
+
+    return [{'id': t.id, 'content': t.content, 'status': t.status} for t in Task.query.filter_by(idea_id=idea_id, status='to_do')]
+
+@jobs.handler('generate_more_tasks')
+async def create_more_tasks(idea_id):
+    messages = await aio.db(idea_messages, idea_id, more_tasks_messages)
+    if messages is None:
+        return {'success': False, 'error': 'Ideia não encontrada'}
+
+    parsed = await llm.acomplete('generate_more_tasks', messages=messages, response_format=TaskList)
+
+    tasks = await aio.db(save_more_tasks, idea_id, parsed.tasks)
+    return {'success': True, 'tasks': tasks}
+
+@main.route('/generate_more_tasks', methods=['POST'])
+@login_required
+@idempotency.single_flight('generate_more_tasks')
+def generate_more_tasks():
+    idea = Idea.query.get_or_404(request.json['idea_id'])
+    return enqueue_generation('generate_more_tasks', idea)
 
 @main.route('/analyze_swot', methods=['POST'])
 @login_required
-def analyze_swot():
+@idempotency.single_flight('analyze_swot')
+@scheduler.admit
+async def analyze_swot():
     data = request.json
     swot_id = data['swot_id']
-    swot = SWOT.query.get_or_404(swot_id)
-    
-    # Preparar o contexto para a IA
-    context = "Análise SWOT:\n"
-    for category in ['strength', 'weakness', 'opportunity', 'threat']:
-        items = SWOTItem.query.filter_by(swot_id=swot.id, category=category).all()
-        context += f"{category.capitalize()}s:\n"
-        for item in items:
-            context += f"- {item.content}\n"
+    unit_of_work.release()
+    context = await aio.db(swot_analysis_context, swot_id)
     
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4",
+        analysis = await llm.acomplete(
+            'analyze_swot',
             messages=[
                 {"role": "system", "content": "Você é um especialista em análise de negócios. Com base na análise SWOT fornecida, faça uma análise concisa e forneça insights estratégicos em no máximo 150 palavras."},
                 {"role": "user", "content": context}
             ]
         )
-        
-        analysis = completion.choices[0].message.content
         timestamp = datetime.now()
 
         # Salvar a análise no banco de dados
-        new_analysis = SWOTAnalysis(swot_id=swot.id, content=analysis, timestamp=timestamp)
-        db.session.add(new_analysis)
-        db.session.commit()
+        await aio.db(save_swot_ai_analysis, swot_id, analysis, timestamp)
 
         return jsonify({'success': True, 'analysis': analysis, 'timestamp': timestamp.strftime("%d/%m/%Y %H:%M:%S")})
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error analyzing SWOT: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+def swot_analysis_context(swot_id):
+    swot = SWOT.query.get_or_404(swot_id)
+    
+    # Preparar o contexto para a IA
+    context = "Análise SWOT:\n"
+    for category in ['strength', 'weakness', 'opportunity', 'threat']:
+        items = SWOTItem.query.filter_by(swot_id=swot.id, category=category).all()
+        context += f"{category.capitalize()}s:\n"
+        for item in items:
+            context += f"- {item.content}\n"
+    return context
+
+def save_swot_ai_analysis(swot_id, analysis, timestamp):
+    with unit_of_work.transaction():
+        db.session.add(SWOTAnalysis(swot_id=swot_id, content=analysis, timestamp=timestamp))
+
 @main.route('/update_swot_item', methods=['POST'])
 @login_required
 @csrf.exempt
@@ -846,6 +1179,26 @@ def update_swot_item_category():
     
     return jsonify({'success': True})
 
+def kanban_view_data(idea):
+    # O quadro busca as tarefas em /get_tasks; a página não lê nenhuma tabela filha
+    return {}
+
+def swot_view_data(idea):
+    swot = SWOT.query.filter_by(idea_id=idea.id).first()
+    swot_items = {category: [] for category in ('strength', 'weakness', 'opportunity', 'threat')}
+    analyses = []
+    if swot:
+        # Todos os itens numa consulta, agrupados por categoria
+        for item in SWOTItem.query.filter_by(swot_id=swot.id).order_by(SWOTItem.category, SWOTItem.id):
+            swot_items.setdefault(item.category, []).append(item)
+        analyses = SWOTAnalysis.query.filter_by(swot_id=swot.id).order_by(SWOTAnalysis.timestamp.desc()).all()
+    return {'swot': swot, 'swot_items': swot_items, 'analyses': analyses}
+
+VIEW_LOADERS = {
+    'kanban': kanban_view_data,
+    'swot': swot_view_data,
+}
+
 @main.route('/idea/<int:idea_id>/<string:view>')
 @login_required
 def view_idea(idea_id, view):
@@ -853,16 +1206,11 @@ def view_idea(idea_id, view):
     if idea.user_id != current_user.id:
         abort(403)
     
-    tasks = Task.query.filter_by(idea_id=idea_id).order_by(Task.order).all()
-    swot = SWOT.query.filter_by(idea_id=idea_id).first()
-    if not swot:
-        swot = SWOT(idea_id=idea_id)
-        db.session.add(swot)
-        db.session.commit()
-    
-    analyses = SWOTAnalysis.query.filter_by(swot_id=swot.id).order_by(SWOTAnalysis.timestamp.desc()).all()
+    # Cada aba carrega só o que mostra, e a leitura não cria linhas
+    loader = VIEW_LOADERS.get(view)
+    data = loader(idea) if loader else {}
     
-    return render_template('view_idea.html', idea=idea, tasks=tasks, swot=swot, analyses=analyses, view=view, selected_idea_id=idea_id)
+    return render_template('view_idea.html', idea=idea, view=view, selected_idea_id=idea_id, **data)
 
 @main.context_processor
 def inject_user_ideas():
@@ -881,51 +1229,10 @@ def delete_idea(idea_id):
         return jsonify({'success': False, 'error': 'Não autorizado'}), 403
     
     try:
-        # Excluir mensagens de chat relacionadas
-        ChatMessage.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir tarefas relacionadas
-        Task.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir análise SWOT relacionada
-        swot = SWOT.query.filter_by(idea_id=idea.id).first()
-        if swot:
-            SWOTItem.query.filter_by(swot_id=swot.id).delete()
-            SWOTAnalysis.query.filter_by(swot_id=swot.id).delete()
-            db.session.delete(swot)
-        
-        # Excluir perguntas relacionadas
-        Question.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir despesas relacionadas
-        Expense.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir metas relacionadas
-        Goal.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir pesquisas de mercado relacionadas
-        MarketResearch.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir etapas legais relacionadas
-        LegalStep.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir consultas legais relacionadas
-        LegalConsultation.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir contatos de networking relacionados
-        NetworkingContact.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir posts de networking relacionados
-        NetworkingPost.query.filter_by(idea_id=idea.id).delete()
-        
-        # Excluir clientes relacionados
-        Customer.query.filter_by(idea_id=idea.id).delete()
-        
-        # Finalmente, excluir a ideia
-        db.session.delete(idea)
-        db.session.commit()
-        
-        return jsonify({'success': True, 'message': 'Ideia excluída com sucesso'})
+        # As chaves estrangeiras removem tarefas, despesas, SWOT, tags e o resto
+        # junto com a ideia; ideias grandes são removidas em segundo plano
+        background = idea_deletion.delete_idea(idea)
+        return jsonify({'success': True, 'message': 'Ideia excluída com sucesso', 'background': background})
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Erro ao excluir ideia: {str(e)}")
@@ -951,19 +1258,10 @@ def api_expenses(idea_id):
                 description=data['description'],
                 amount=data['amount'],
                 date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
-                category=category
+                category=category,
+                tags=reference_data.tags(data.get('tags', []))
             )
             db.session.add(new_expense)
-
-            # Adicionar tags
-            tags = data.get('tags', [])
-            for tag_name in tags:
-                tag = Tag.query.filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(name=tag_name)
-                    db.session.add(tag)
-                new_expense.tags.append(tag)
-            
             db.session.commit()
             return jsonify({"success": True, "id": new_expense.id}), 201
         except Exception as e:
@@ -972,7 +1270,7 @@ def api_expenses(idea_id):
             return jsonify({"error": "Erro ao adicionar despesa"}), 500
 
     try:
-        expenses = Expense.query.filter_by(idea_id=idea_id).all()
+        expenses = loading.apply(Expense.query.filter_by(idea_id=idea_id), 'expense_list').all()
         return jsonify([{
             'id': e.id,
             'description': e.description,
@@ -1024,13 +1322,15 @@ def api_expense(expense_id):
 def api_categories():
     if request.method == 'POST':
         data = request.json
-        new_category = ExpenseCategory(name=data['name'])
-        db.session.add(new_category)
+        # Criar uma categoria que já existe devolve a existente
+        category_ids = reference_data.category_ids([data['name']])
+        if not category_ids:
+            return jsonify({'success': False, 'error': 'Nome da categoria é obrigatório'}), 400
         db.session.commit()
-        return jsonify({'success': True, 'id': new_category.id, 'name': new_category.name})
+        name, category_id = next(iter(category_ids.items()))
+        return jsonify({'success': True, 'id': category_id, 'name': name})
     
-    categories = ExpenseCategory.query.all()
-    return jsonify([{'id': c.id, 'name': c.name} for c in categories])
+    return jsonify(reference_data.categories())
 
 @main.route('/api/expenses/<int:idea_id>/analyze', methods=['POST'])
 @login_required
@@ -1040,7 +1340,7 @@ def analyze_expenses(idea_id):
     if idea.user_id != current_user.id:
         abort(403)
 
-    expenses = Expense.query.filter_by(idea_id=idea_id).all()
+    expenses = loading.apply(Expense.query.filter_by(idea_id=idea_id), 'expense_summary').all()
     expense_data = [{
         'description': e.description,
         'amount': e.amount,
@@ -1057,7 +1357,7 @@ def analyze_expenses(idea_id):
 @main.route('/debug/expenses')
 @login_required
 def debug_expenses():
-    expenses = Expense.query.all()
+    expenses = loading.apply(Expense.query, 'expense_list').all()
     return jsonify([{
         'id': e.id,
         'description': e.description,
@@ -1078,30 +1378,26 @@ def networking(idea_id):
 
 @main.route('/api/networking/<int:idea_id>/search', methods=['POST'])
 @login_required
-def search_networking(idea_id):
-    idea = Idea.query.get_or_404(idea_id)
-    if idea.user_id != current_user.id:
-        abort(403)
-
+@scheduler.admit
+async def search_networking(idea_id):
+    unit_of_work.release()
     # Preparar o contexto para a OpenAI
-    context = prepare_networking_context(idea)
+    context = await aio.db(networking_context, idea_id, current_user.id)
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4",
+        content = await llm.acomplete(
+            'search_networking',
             messages=[
                 {"role": "system", "content": "Você é um assistente especializado em networking. Com base nas informações fornecidas sobre a ideia de negócio, sugira até três palavras-chave ou frases curtas relevantes para buscar posts no LinkedIn. Separe as palavras-chave por vírgulas."},
                 {"role": "user", "content": context}
             ]
         )
         
-        keywords = [k.strip() for k in completion.choices[0].message.content.split(',')]
+        keywords = [k.strip() for k in content.split(',')]
         
         current_app.logger.info(f"Keywords geradas: {keywords}")
 
-        conn = http.client.HTTPSConnection("linkedin-data-api.p.rapidapi.com")
-
-        payload = json.dumps({
+        payload = {
             "keyword": keywords[0],  # Usando apenas a primeira keyword para aumentar as chances de resultados
             "sortBy": "date_posted",
             "datePosted": "",
@@ -1114,18 +1410,9 @@ def search_networking(idea_id):
             "authorIndustry": [],
             "authorCompany": [],
             "authorTitle": ""
-        })
-
-        headers = {
-            'x-rapidapi-key': current_app.config['RAPIDAPI_KEY'],
-            'x-rapidapi-host': "linkedin-data-api.p.rapidapi.com",
-            'Content-Type': "application/json"
         }
 
-        conn.request("POST", "/search-posts", payload, headers)
-
-        res = conn.getresponse()
-        data = json.loads(res.read().decode("utf-8"))
+        data = await asyncio.to_thread(transport.rapidapi_post, "/search-posts", payload)
 
         current_app.logger.info(f"Resposta da API: {data}")
 
@@ -1139,6 +1426,8 @@ def search_networking(idea_id):
             current_app.logger.error(f"{error_message}: {data}")
             return jsonify({"success": False, "error": error_message}), 400
 
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in networking search: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1165,12 +1454,15 @@ def save_networking_contact(idea_id):
     return jsonify({"success": True, "id": new_contact.id})
 
 def prepare_networking_context(idea):
-    context = f"Ideia de negócio: {idea.description}\n\n"
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    for question in questions:
-        context += f"Q: {question.text}\nA: {question.answer}\n\n"
+    context = idea_context.business_context(idea)
     return context
 
+def networking_context(idea_id, user_id):
+    idea = Idea.query.get_or_404(idea_id)
+    if idea.user_id != user_id:
+        abort(403)
+    return prepare_networking_context(idea)
+
 @main.route('/api/networking/<int:idea_id>/manual_search', methods=['POST'])
 @login_required
 def manual_search_networking(idea_id):
@@ -1185,9 +1477,7 @@ def manual_search_networking(idea_id):
         return jsonify({"success": False, "error": "Nenhuma palavra-chave fornecida"}), 400
 
     try:
-        conn = http.client.HTTPSConnection("linkedin-data-api.p.rapidapi.com")
-
-        payload = json.dumps({
+        payload = {
             "keyword": " ".join(keywords),
             "sortBy": "date_posted",
             "datePosted": "",
@@ -1200,18 +1490,9 @@ def manual_search_networking(idea_id):
             "authorIndustry": [],
             "authorCompany": [],
             "authorTitle": ""
-        })
-
-        headers = {
-            'x-rapidapi-key': current_app.config['RAPIDAPI_KEY'],
-            'x-rapidapi-host': "linkedin-data-api.p.rapidapi.com",
-            'Content-Type': "application/json"
         }
 
-        conn.request("POST", "/search-posts", payload, headers)
-
-        res = conn.getresponse()
-        data = json.loads(res.read().decode("utf-8"))
+        data = transport.rapidapi_post("/search-posts", payload)
 
         current_app.logger.info(f"Resposta da API: {data}")
 
@@ -1222,6 +1503,8 @@ def manual_search_networking(idea_id):
             current_app.logger.error(f"{error_message}: {data}")
             return jsonify({"success": False, "error": error_message}), 400
 
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in manual networking search: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1284,49 +1567,54 @@ def delete_networking_post(idea_id, post_id):
     return jsonify({"success": True})
 
 
+def legal_steps_messages(idea):
+    context = idea_context.business_context(idea)
+    return [
+        {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios no Brasil. Com base nas informações fornecidas sobre a ideia de negócio, sugira 5 etapas legais cruciais para a legalização e operação do negócio. Cada etapa deve ser específica, detalhada e focada em um aspecto particular do processo de legalização, considerando as leis e regulamentações brasileiras atuais. Inclua informações sobre documentos necessários, prazos estimados e possíveis custos envolvidos. Formate cada etapa como um item de lista numerado e inclua sub-itens se necessário."},
+        {"role": "user", "content": context}
+    ]
+
+def legal_step_rows(idea_id, content):
+    legal_steps = content.split('\n')
+    legal_steps = [step.strip() for step in legal_steps if step.strip() and step[0].isdigit()]
+    return [
+        {
+            'idea_id': idea_id,
+            'description': step[step.index(' ')+1:],  # Remove o número do início
+            'order': i+1,
+            'progress': 0
+        }
+        for i, step in enumerate(legal_steps)
+    ]
+
+def save_legal_steps(idea_id, rows):
+    with unit_of_work.transaction():
+        # Deletar etapas existentes
+        LegalStep.query.filter_by(idea_id=idea_id).delete()
+        if rows:
+            db.session.execute(db.insert(LegalStep), rows)
+
+@jobs.handler('generate_legal_steps')
+async def create_legal_steps(idea_id):
+    messages = await aio.db(idea_messages, idea_id, legal_steps_messages)
+    if messages is None:
+        return {"success": False, "error": "Ideia não encontrada"}
+
+    content = await llm.acomplete('generate_legal_steps', messages=messages)
+    rows = legal_step_rows(idea_id, content)
+
+    await aio.db(save_legal_steps, idea_id, rows)
+    return {"success": True, "message": f"Etapas legais geradas com sucesso: {len(rows)} etapas criadas."}
+
 @main.route('/api/legal/<int:idea_id>/generate', methods=['POST'])
 @login_required
+@idempotency.single_flight('generate_legal_steps')
 def generate_legal_steps(idea_id):
     idea = Idea.query.get_or_404(idea_id)
     if idea.user_id != current_user.id:
         abort(403)
 
-    context = f"Ideia de negócio: {idea.description}\n\n"
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    for question in questions:
-        context += f"Q: {question.text}\nA: {question.answer}\n\n"
-
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios no Brasil. Com base nas informações fornecidas sobre a ideia de negócio, sugira 5 etapas legais cruciais para a legalização e operação do negócio. Cada etapa deve ser específica, detalhada e focada em um aspecto particular do processo de legalização, considerando as leis e regulamentações brasileiras atuais. Inclua informações sobre documentos necessários, prazos estimados e possíveis custos envolvidos. Formate cada etapa como um item de lista numerado e inclua sub-itens se necessário."},
-                {"role": "user", "content": context}
-            ]
-        )
-        
-        legal_steps = completion.choices[0].message.content.split('\n')
-        legal_steps = [step.strip() for step in legal_steps if step.strip() and step[0].isdigit()]
-
-        # Deletar etapas existentes
-        LegalStep.query.filter_by(idea_id=idea_id).delete()
-        
-        for i, step in enumerate(legal_steps):
-            new_step = LegalStep(
-                idea_id=idea_id,
-                description=step[step.index(' ')+1:],  # Remove o número do início
-                order=i+1,
-                progress=0
-            )
-            db.session.add(new_step)
-        
-        db.session.commit()
-        return jsonify({"success": True, "message": f"Etapas legais geradas com sucesso: {len(legal_steps)} etapas criadas."})
-
-    except Exception as e:
-        current_app.logger.error(f"Error in legal steps generation: {str(e)}")
-        db.session.rollback()
-        return jsonify({"success": False, "error": str(e)}), 500
+    return enqueue_generation('generate_legal_steps', idea)
 
 @main.route('/api/legal/<int:idea_id>/update_progress', methods=['POST'])
 @login_required
@@ -1346,6 +1634,7 @@ def update_legal_step_progress(idea_id):
 
 @main.route('/api/legal/<int:idea_id>/consult', methods=['POST'])
 @login_required
+@scheduler.admit
 def legal_consultation(idea_id):
     idea = Idea.query.get_or_404(idea_id)
     if idea.user_id != current_user.id:
@@ -1354,45 +1643,63 @@ def legal_consultation(idea_id):
     data = request.json
     user_message = data.get('message')
 
-    # Verificar se o usuário já enviou 10 mensagens
-    user_message_count = LegalConsultation.query.filter_by(idea_id=idea_id, is_user=True).count()
-    if user_message_count >= 10:
-        return jsonify({"success": False, "error": "Limite de mensagens atingido"}), 400
+    # Pergunta quase igual a uma já respondida: reaproveita a resposta
+    reused = legal_answers.lookup(user_message, current_user.id, idea_id)
+    if reused is not None:
+        db.session.add(LegalConsultation(idea_id=idea_id, message=user_message, is_user=True))
+        db.session.add(LegalConsultation(idea_id=idea_id, message=reused, is_user=False))
+        db.session.commit()
+        payload = {"success": True, "response": reused, "reused": True}
+        if wants_stream():
+            return Response(
+                sse_event({'token': reused}) + sse_event(payload, event='done'),
+                mimetype='text/event-stream'
+            )
+        return jsonify(payload)
+
+    # Verificar o orçamento diário de tokens antes de gravar a pergunta, para
+    # que uma recusa não deixe pergunta sem resposta no histórico
+    usage.check_budget()
 
-    # Salvar a mensagem do usuário
+    # A mensagem do usuário é gravada no release() abaixo, antes da chamada
+    # à OpenAI, para que a inserção não fique pendente (e o banco travado)
     user_consultation = LegalConsultation(idea_id=idea_id, message=user_message, is_user=True)
     db.session.add(user_consultation)
+    db.session.flush()
 
-    context = f"Ideia de negócio: {idea.description}\n\n"
-    questions = Question.query.filter_by(idea_id=idea.id).all()
-    for question in questions:
-        context += f"Q: {question.text}\nA: {question.answer}\n\n"
+    context = idea_context.business_context(idea)
 
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios. Responda às perguntas do usuário com base no contexto fornecido e nas informações mais recentes disponíveis sobre legislação e procedimentos legais para abertura de empresas."},
-                {"role": "user", "content": context + f"\nPergunta do usuário: {user_message}"}
-            ]
-        )
-        
-        ai_response = completion.choices[0].message.content
+    messages = [
+        {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios. Responda às perguntas do usuário com base no contexto fornecido e nas informações mais recentes disponíveis sobre legislação e procedimentos legais para abertura de empresas."},
+        {"role": "user", "content": context + f"\nPergunta do usuário: {user_message}"}
+    ]
+    user_id = current_user.id
+    question_id = user_consultation.id
+    unit_of_work.release()
 
+    def save_response(ai_response):
         # Salvar a resposta do AI
-        ai_consultation = LegalConsultation(idea_id=idea_id, message=ai_response, is_user=False)
-        db.session.add(ai_consultation)
-        
-        db.session.commit()
-        return jsonify({"success": True, "response": ai_response})
+        with unit_of_work.transaction():
+            db.session.add(LegalConsultation(idea_id=idea_id, message=ai_response, is_user=False))
+        legal_answers.add(question_id, user_message, ai_response, user_id, idea_id)
+        return {"success": True, "response": ai_response}
+
+    if wants_stream():
+        return sse_response('legal_consultation', messages, save_response)
 
+    try:
+        ai_response = llm.complete('legal_consultation', messages=messages)
+        return jsonify(save_response(ai_response))
+
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in legal consultation: {str(e)}")
-        db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
 @main.route('/api/legal/<int:idea_id>/step_details/<int:step_id>', methods=['GET'])
 @login_required
+@scheduler.admit
 def get_legal_step_details(idea_id, step_id):
     idea = Idea.query.get_or_404(idea_id)
     if idea.user_id != current_user.id:
@@ -1402,19 +1709,37 @@ def get_legal_step_details(idea_id, step_id):
     if step.idea_id != idea_id:
         abort(404)
 
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios. Forneça detalhes específicos sobre a seguinte etapa legal, incluindo possíveis desafios, documentos necessários e dicas para completar a etapa com sucesso."},
-                {"role": "user", "content": f"Detalhe a seguinte etapa legal para a ideia de negócio '{idea.title}': {step.description}"}
-            ]
-        )
-        
-        details = completion.choices[0].message.content
+    title, description = idea.title, step.description
+    prompt = f"Detalhe a seguinte etapa legal para a ideia de negócio '{title}': {description}"
+    # O hash do prompt invalida o detalhamento salvo quando a etapa ou o título mudam
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    if step.details and step.details_hash == prompt_hash:
+        return jsonify({"success": True, "details": step.details})
+
+    messages = [
+        {"role": "system", "content": "Você é um consultor jurídico especializado em legalização de negócios. Forneça detalhes específicos sobre a seguinte etapa legal, incluindo possíveis desafios, documentos necessários e dicas para completar a etapa com sucesso."},
+        {"role": "user", "content": prompt}
+    ]
+    unit_of_work.release()
+
+    def save_details(details):
+        with unit_of_work.transaction():
+            saved_step = LegalStep.query.get(step_id)
+            # A etapa pode ter sido removida durante a chamada
+            if saved_step is not None:
+                saved_step.details = details
+                saved_step.details_hash = prompt_hash
+        return {"success": True, "details": details}
+
+    if wants_stream():
+        return sse_response('get_legal_step_details', messages, save_details)
 
-        return jsonify({"success": True, "details": details})
+    try:
+        details = llm.complete('get_legal_step_details', messages=messages)
+        return jsonify(save_details(details))
 
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error in getting legal step details: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1591,7 +1916,8 @@ def customer_stats(idea_id):
 
 @main.route('/api/improve_email', methods=['POST'])
 @login_required
-def improve_email():
+@scheduler.admit
+async def improve_email():
     data = request.json
     subject = data.get('subject')
     content = data.get('content')
@@ -1599,16 +1925,15 @@ def improve_email():
     if not subject or not content:
         return jsonify({'success': False, 'error': 'Assunto e conteúdo são obrigatórios'}), 400
 
+    unit_of_work.release()
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4",
+        improved_text = await llm.acomplete(
+            'improve_email',
             messages=[
                 {"role": "system", "content": "Você é um especialista em marketing por e-mail. Melhore o assunto e o conteúdo do e-mail fornecido, tornando-o mais atraente e persuasivo."},
                 {"role": "user", "content": f"Assunto: {subject}\n\nConteúdo: {content}"}
             ]
         )
-        
-        improved_text = completion.choices[0].message.content
         improved_subject, improved_content = improved_text.split('\n\n', 1)
         improved_subject = improved_subject.replace('Assunto: ', '')
         improved_content = improved_content.replace('Conteúdo: ', '')
@@ -1618,10 +1943,60 @@ def improve_email():
             'improved_subject': improved_subject,
             'improved_content': improved_content
         })
+    except (scheduler.Overloaded, usage.BudgetExceeded):
+        raise
     except Exception as e:
         current_app.logger.error(f"Error improving email: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def operator_required(view):
+    # Métricas internas do processo (incluem ids de outros usuários): só
+    # para os e-mails listados em OPERATOR_EMAILS
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if (current_user.email or '').lower() not in current_app.config.get('OPERATOR_EMAILS', set()):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+@main.route('/api/llm/cache/stats')
+@login_required
+@operator_required
+def llm_cache_stats():
+    return jsonify({'success': True, 'stats': llm.cache_stats()})
+
+@main.route('/api/llm/scheduler/stats')
+@login_required
+@operator_required
+def llm_scheduler_stats():
+    return jsonify({'success': True, 'stats': scheduler.get_scheduler().stats()})
+
+@main.route('/api/transport/status')
+@login_required
+@operator_required
+def transport_status():
+    return jsonify({'success': True, 'status': transport.status()})
+
+@main.route('/api/llm/routing/stats')
+@login_required
+@operator_required
+def llm_routing_stats():
+    return jsonify({'success': True, 'stats': routing.stats()})
+
+@main.route('/api/llm/usage')
+@login_required
+def llm_usage():
+    group_by = request.args.get('group_by', 'route')
+    if group_by not in usage.GROUPS or group_by == 'user':
+        return jsonify({'success': False, 'error': 'Agrupamento inválido'}), 400
+    days = request.args.get('days', 30, type=int)
+    return jsonify({'success': True, 'usage': usage.aggregate(group_by, days, user_id=current_user.id)})
+
+@main.route('/api/llm/usage/budget')
+@login_required
+def llm_usage_budget():
+    return jsonify(dict(usage.budget_status(current_user.id), success=True))
+
 @main.route('/profile_settings', methods=['GET', 'POST'])
 @login_required
 def profile_settings():
@@ -0,0 +1,106 @@
+from flask import current_app
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from app import transport
+import threading
+import time
+
+# Roteamento de modelos por rota: cada rota tem uma lista de modelos em ordem
+# de preferência (do melhor para o mais rápido). O primeiro modelo cuja
+# latência p95 observada cabe no prazo da rota e cuja taxa de erro está
+# aceitável é usado; os seguintes servem de fallback.
+
+
+class LatencyTracker:
+    def __init__(self, window):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, ok):
+        with self._lock:
+            self._samples[model].append((seconds, ok))
+
+    def _snapshot(self, model):
+        with self._lock:
+            return list(self._samples.get(model, ()))
+
+    def p95(self, model, min_samples=1):
+        latencies = sorted(seconds for seconds, ok in self._snapshot(model) if ok)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def error_rate(self, model, min_samples=1):
+        samples = self._snapshot(model)
+        if len(samples) < min_samples:
+            return 0
+        return sum(1 for _, ok in samples if not ok) / len(samples)
+
+    def stats(self):
+        with self._lock:
+            models = list(self._samples)
+        return {
+            model: {
+                'samples': len(self._snapshot(model)),
+                'p95': self.p95(model),
+                'error_rate': round(self.error_rate(model), 3)
+            }
+            for model in models
+        }
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker(current_app.config.get('LLM_ROUTING_WINDOW', 50))
+        return _tracker
+
+
+@contextmanager
+def measure(model):
+    # Só falhas do provedor contam como erro; respostas inválidas não penalizam o modelo
+    start = time.monotonic()
+    try:
+        yield
+    except Exception as e:
+        if transport.is_upstream_failure(e):
+            get_tracker().record(model, time.monotonic() - start, False)
+        raise
+    get_tracker().record(model, time.monotonic() - start, True)
+
+
+def tiers(route):
+    model_tiers = current_app.config.get('LLM_MODEL_TIERS', {})
+    return list(model_tiers.get(route, model_tiers.get('default', ['gpt-4o-mini'])))
+
+
+def plan(route):
+    # Modelos a tentar, em ordem: o escolhido e os mais rápidos depois dele
+    config = current_app.config
+    candidates = tiers(route)
+    tracker = get_tracker()
+    min_samples = config.get('LLM_ROUTING_MIN_SAMPLES', 10)
+    budget = transport.deadline_for(route) * config.get('LLM_ROUTING_DEADLINE_FRACTION', 0.8)
+    max_error_rate = config.get('LLM_ROUTING_MAX_ERROR_RATE', 0.2)
+
+    for i, model in enumerate(candidates):
+        p95 = tracker.p95(model, min_samples)
+        if (p95 is None or p95 <= budget) and tracker.error_rate(model, min_samples) <= max_error_rate:
+            return candidates[i:]
+    return candidates[-1:]
+
+
+def hedge_delay(route):
+    return current_app.config.get('LLM_HEDGE_ROUTES', {}).get(route)
+
+
+def stats():
+    return {
+        'models': get_tracker().stats(),
+        'plans': {route: plan(route) for route in current_app.config.get('LLM_MODEL_TIERS', {})}
+    }
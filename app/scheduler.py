@@ -0,0 +1,225 @@
+from flask import current_app, jsonify, g
+from flask_login import current_user
+from sqlalchemy import inspect
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+import itertools
+import re
+import threading
+import time
+
+# Escalonador justo para as chamadas à OpenAI: limita chamadas simultâneas por
+# usuário e no total, respeita os limites de taxa informados pelo provedor
+# (token bucket) e dá prioridade ao chat interativo sobre gerações em lote.
+# Quando a fila passa do limite, falha rápido com 503 + Retry-After.
+
+INTERACTIVE = 0
+BULK = 1
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after, message="Muitas solicitações em andamento. Tente novamente em instantes."):
+        super().__init__(message)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+def overloaded_response(error):
+    response = jsonify({"success": False, "error": str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_second):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.tokens = capacity
+        self.blocked_until = 0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount):
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.per_second
+
+    def take(self, amount):
+        self._refill(time.monotonic())
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, remaining, reset_seconds):
+        # Ajusta o balde ao que o provedor informou nos cabeçalhos
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_seconds:
+            self.blocked_until = now + reset_seconds
+
+
+def _parse_duration(value):
+    # Formatos usados pela OpenAI: "20ms", "1s", "6m0s", "1h2m3.5s"
+    if not value:
+        return 0
+    total = 0
+    for amount, unit in re.findall(r'([\d.]+)(ms|s|m|h)', value):
+        total += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total
+
+
+class FairScheduler:
+    def __init__(self, max_concurrency, per_user_limit, max_backlog, max_wait, requests_per_minute, tokens_per_minute):
+        self.max_concurrency = max_concurrency
+        self.per_user_limit = per_user_limit
+        self.max_backlog = max_backlog
+        self.max_wait = max_wait
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_user = defaultdict(int)
+        self._waiting = []
+        self._seq = itertools.count()
+        self._rejected = 0
+
+    def _retry_after(self):
+        return max(self.requests.wait_time(1), len(self._waiting) / max(self.max_concurrency, 1), 1)
+
+    def check_admission(self):
+        with self._cond:
+            if len(self._waiting) >= self.max_backlog:
+                self._rejected += 1
+                raise Overloaded(self._retry_after())
+
+    def _delay_for(self, ticket, estimated_tokens):
+        if self._active >= self.max_concurrency:
+            return self.max_wait
+        # Próximo a rodar: maior prioridade, usuário com menos chamadas ativas, ordem de chegada
+        eligible = [t for t in self._waiting if self._active_by_user[t[2]] < self.per_user_limit]
+        if not eligible or min(eligible, key=lambda t: (t[0], self._active_by_user[t[2]], t[1])) is not ticket:
+            return self.max_wait
+        return max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+
+    # `acquire` bloqueia até liberar uma vaga e `release` a devolve; o caminho
+    # assíncrono (app/aio.py) usa os dois separados, o síncrono usa `slot`.
+    def acquire(self, user_id, priority, estimated_tokens):
+        ticket = (priority, next(self._seq), user_id)
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            if len(self._waiting) >= self.max_backlog:
+                self._rejected += 1
+                raise Overloaded(self._retry_after())
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    delay = self._delay_for(ticket, estimated_tokens)
+                    if delay <= 0:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise Overloaded(self._retry_after())
+                    self._cond.wait(min(delay, remaining))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            self._active += 1
+            self._active_by_user[user_id] += 1
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+
+    def release(self, user_id):
+        with self._cond:
+            self._active -= 1
+            self._active_by_user[user_id] -= 1
+            if not self._active_by_user[user_id]:
+                del self._active_by_user[user_id]
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user_id, priority, estimated_tokens):
+        self.acquire(user_id, priority, estimated_tokens)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def update_from_headers(self, headers):
+        with self._cond:
+            if headers.get('x-ratelimit-remaining-requests') is not None:
+                self.requests.sync(int(headers['x-ratelimit-remaining-requests']),
+                                   _parse_duration(headers.get('x-ratelimit-reset-requests')))
+            if headers.get('x-ratelimit-remaining-tokens') is not None:
+                self.tokens.sync(int(headers['x-ratelimit-remaining-tokens']),
+                                 _parse_duration(headers.get('x-ratelimit-reset-tokens')))
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self._active,
+                'active_by_user': dict(self._active_by_user),
+                'waiting': len(self._waiting),
+                'waiting_interactive': sum(1 for t in self._waiting if t[0] == INTERACTIVE),
+                'rejected': self._rejected,
+                'request_tokens': round(self.requests.tokens, 1),
+                'token_tokens': round(self.tokens.tokens, 1)
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            config = current_app.config
+            _scheduler = FairScheduler(
+                max_concurrency=config.get('LLM_MAX_CONCURRENCY', 16),
+                per_user_limit=config.get('LLM_PER_USER_CONCURRENCY', 2),
+                max_backlog=config.get('LLM_MAX_BACKLOG', 32),
+                max_wait=config.get('LLM_MAX_QUEUE_WAIT', 20),
+                requests_per_minute=config.get('LLM_REQUESTS_PER_MINUTE', 500),
+                tokens_per_minute=config.get('LLM_TOKENS_PER_MINUTE', 200000)
+            )
+        return _scheduler
+
+
+def priority_for(route):
+    return INTERACTIVE if route in current_app.config.get('LLM_INTERACTIVE_ROUTES', set()) else BULK
+
+
+def current_user_id():
+    try:
+        if current_user and current_user.is_authenticated:
+            # A identidade não depende dos atributos do objeto, que podem estar
+            # expirados após um commit; assim não reabre conexão no meio da chamada
+            return inspect(current_user._get_current_object()).identity[0]
+    except Exception:
+        pass
+    # Jobs em segundo plano rodam em nome do usuário que os enfileirou
+    return g.get('job_user_id')
+
+
+# Para rotas que chamam a OpenAI durante a requisição: recusa com 503 antes de
+# fazer qualquer trabalho quando a fila já está cheia.
+def admit(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            get_scheduler().check_admission()
+        except Overloaded as e:
+            return overloaded_response(e)
+        return current_app.ensure_sync(view)(*args, **kwargs)
+    return wrapper
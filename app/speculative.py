@@ -0,0 +1,75 @@
+from flask import current_app
+from app import db, jobs, usage
+from app.models import Job, Task, SWOT, SWOTItem
+from datetime import datetime, timedelta
+import json
+
+# Pré-geração especulativa: ao salvar as respostas de uma ideia, as gerações
+# que o usuário costuma pedir em seguida (tarefas e SWOT) já são enfileiradas
+# com prioridade baixa. Quando o usuário pede a mesma geração, o job
+# especulativo (na fila, rodando ou concluído há pouco) é adotado em vez de
+# gerar de novo. Cada usuário tem um limite diário de jobs especulativos, e a
+# especulação para quando sobra pouco do orçamento de tokens dele.
+
+ACTIVE = ('queued', 'running')
+
+
+def _already_generated(kind, idea_id):
+    if kind == 'generate_tasks':
+        return db.session.query(Task.query.filter_by(idea_id=idea_id).exists()).scalar()
+    if kind == 'generate_swot':
+        return db.session.query(
+            SWOTItem.query.join(SWOT, SWOT.id == SWOTItem.swot_id).filter(SWOT.idea_id == idea_id).exists()
+        ).scalar()
+    return False
+
+
+def _pending_or_recent(kind, idea_id, payload):
+    window = datetime.utcnow() - timedelta(seconds=current_app.config.get('SPECULATIVE_RESULT_WINDOW', 3600))
+    return Job.query.filter(
+        Job.kind == kind,
+        Job.idea_id == idea_id,
+        Job.payload == json.dumps(payload),
+        db.or_(Job.status.in_(ACTIVE), db.and_(Job.status == 'done', Job.finished_at >= window))
+    )
+
+
+def used_today(user_id):
+    start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    return Job.query.filter(Job.user_id == user_id, Job.speculative.is_(True), Job.created_at >= start).count()
+
+
+def schedule(idea, user_id):
+    config = current_app.config
+    if not config.get('SPECULATIVE_GENERATION', False):
+        return []
+
+    remaining = usage.budget_status(user_id)['remaining']
+    if remaining is not None and remaining < config.get('SPECULATIVE_MIN_REMAINING_TOKENS', 20000):
+        return []
+    allowance = config.get('SPECULATIVE_DAILY_LIMIT', 10) - used_today(user_id)
+
+    scheduled = []
+    for kind in config.get('SPECULATIVE_KINDS', ()):
+        if allowance <= 0:
+            break
+        payload = {'idea_id': idea.id}
+        # Nada a antecipar se o conteúdo já existe ou se a geração já foi pedida
+        if _already_generated(kind, idea.id) or _pending_or_recent(kind, idea.id, payload).first() is not None:
+            continue
+        scheduled.append(jobs.enqueue(kind, payload, user_id=user_id, idea_id=idea.id, speculative=True))
+        allowance -= 1
+    return scheduled
+
+
+def adopt(kind, idea_id, payload):
+    job = _pending_or_recent(kind, idea_id, payload).filter(Job.speculative.is_(True)).order_by(Job.id.desc()).first()
+    if job is None:
+        return None
+    # A partir daqui o job é do usuário: sobe de prioridade, não conta no
+    # limite e ganha as mesmas tentativas de um job pedido por ele
+    job.speculative = False
+    job.max_attempts = current_app.config.get('JOBS_MAX_ATTEMPTS', 3)
+    db.session.commit()
+    current_app.logger.info(f"Job especulativo {job.id} ({kind}) adotado para a ideia {idea_id}")
+    return job
@@ -14,35 +14,41 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function sendMessage(message) {
         appendMessage('user', message);
+        const responseContent = appendMessage('assistant', '');
+        let responseText = '';
 
-        fetch(`/api/assistant/${ideaId}/chat`, {
+        streamEvents(`/api/assistant/${ideaId}/chat`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCsrfToken()
             },
             body: JSON.stringify({ message: message }),
+        }, token => {
+            responseText += token;
+            responseContent.textContent = responseText;
+            chatContainer.scrollTop = chatContainer.scrollHeight;
         })
-        .then(response => response.json())
         .then(data => {
             if (data.success) {
-                appendMessage('assistant', data.response);
+                responseContent.innerHTML = data.response;
             } else {
-                appendMessage('assistant', 'Desculpe, ocorreu um erro. Por favor, tente novamente.');
+                responseContent.textContent = 'Desculpe, ocorreu um erro. Por favor, tente novamente.';
             }
         })
         .catch(error => {
             console.error('Error:', error);
-            appendMessage('assistant', 'Desculpe, ocorreu um erro. Por favor, tente novamente.');
+            responseContent.textContent = 'Desculpe, ocorreu um erro. Por favor, tente novamente.';
         });
     }
 
     function appendMessage(role, content) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}-message`;
-        messageDiv.innerHTML = `<strong>${role.charAt(0).toUpperCase() + role.slice(1)}:</strong> ${content}`;
+        messageDiv.innerHTML = `<strong>${role.charAt(0).toUpperCase() + role.slice(1)}:</strong> <span class="message-content">${content}</span>`;
         chatContainer.appendChild(messageDiv);
         chatContainer.scrollTop = chatContainer.scrollHeight;
+        return messageDiv.querySelector('.message-content');
     }
 
     function getCsrfToken() {
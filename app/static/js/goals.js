@@ -474,6 +474,7 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify(data)
         })
         .then(response => response.json())
+        .then(waitForJob)
         .then(data => {
             if (data.success) {
                 loadGoals();
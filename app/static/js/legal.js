@@ -5,7 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const consultationForm = document.getElementById('consultationForm');
     const consultationInput = document.getElementById('consultationInput');
     const consultationChat = document.getElementById('consultationChat');
-    const remainingMessages = document.getElementById('remainingMessages');
+    const remainingTokens = document.getElementById('remainingTokens');
 
     const checkInModalElement = document.getElementById('checkInModal');
     const checkInModal = checkInModalElement ? new bootstrap.Modal(checkInModalElement) : null;
@@ -89,6 +89,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         })
         .then(response => response.json())
+        .then(waitForJob)
         .then(data => {
             if (data.success) {
                 if (legalStepsSuccessModal) {
@@ -125,27 +126,35 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     function sendConsultation(message) {
-        fetch(`/api/legal/${ideaId}/consult`, {
+        appendMessage('Você', message);
+        const responseMessage = appendMessage('Consultor', '');
+        let responseText = '';
+
+        streamEvents(`/api/legal/${ideaId}/consult`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCsrfToken()
             },
             body: JSON.stringify({ message: message })
+        }, token => {
+            responseText += token;
+            responseMessage.textContent = responseText;
+            consultationChat.scrollTop = consultationChat.scrollHeight;
         })
-        .then(response => response.json())
         .then(data => {
             if (data.success) {
-                appendMessage('Você', message);
-                appendMessage('Consultor', data.response);
-                updateRemainingMessages();
+                responseMessage.innerHTML = data.response;
+                updateRemainingTokens();
             } else {
+                responseMessage.closest('.chat-message').remove();
                 alert('Erro na consulta: ' + (data.error || 'Erro desconhecido'));
             }
         })
         .catch(error => {
             console.error('Error:', error);
-            alert('Erro ao enviar consulta. Por favor, tente novamente.');
+            responseMessage.closest('.chat-message').remove();
+            alert('Erro ao enviar consulta: ' + error.message);
         });
     }
 
@@ -155,15 +164,22 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDiv.innerHTML = `<strong>${sender}:</strong><p>${message}</p>`;
         consultationChat.appendChild(messageDiv);
         consultationChat.scrollTop = consultationChat.scrollHeight;
+        return messageDiv.querySelector('p');
     }
 
-    function updateRemainingMessages() {
-        const remaining = parseInt(remainingMessages.textContent) - 1;
-        remainingMessages.textContent = remaining;
-        if (remaining <= 0) {
-            consultationInput.disabled = true;
-            consultationForm.querySelector('button').disabled = true;
-        }
+    function updateRemainingTokens() {
+        if (!remainingTokens) return;
+        fetch('/api/llm/usage/budget')
+        .then(response => response.json())
+        .then(data => {
+            if (data.remaining === null) return;
+            remainingTokens.textContent = data.remaining;
+            if (data.remaining <= 0) {
+                consultationInput.disabled = true;
+                consultationForm.querySelector('button').disabled = true;
+            }
+        })
+        .catch(error => console.error('Error:', error));
     }
 
     function updateStepProgress(stepId, progress) {
@@ -196,15 +212,19 @@ document.addEventListener('DOMContentLoaded', function() {
     function getStepDetails(stepId, container) {
         container.innerHTML = '<div class="spinner-border text-primary" role="status"><span class="visually-hidden">Carregando...</span></div>';
         container.style.display = 'block';
+        let detailsText = '';
 
-        fetch(`/api/legal/${ideaId}/step_details/${stepId}`, {
+        streamEvents(`/api/legal/${ideaId}/step_details/${stepId}`, {
             method: 'GET',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCsrfToken()
             }
+        }, token => {
+            detailsText += token;
+            container.innerHTML = '<p></p>';
+            container.querySelector('p').textContent = detailsText;
         })
-        .then(response => response.json())
         .then(data => {
             if (data.success) {
                 container.innerHTML = `<p>${data.details}</p>`;
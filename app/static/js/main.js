@@ -35,7 +35,8 @@ document.addEventListener('DOMContentLoaded', function() {
             `;
             ideaForm.closest('.card').insertAdjacentElement('afterend', creativeMessage);
 
-            fetch('/save_idea', {
+            // Título e perguntas são gerados em paralelo em uma única requisição
+            fetch('/onboard_idea', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -45,19 +46,12 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(response => response.json())
             .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Erro ao criar a ideia');
+                }
                 console.log('Ideia salva:', data);
                 currentIdeaId = data.id;
-                return fetch('/generate_questions', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'X-CSRFToken': getCsrfToken()
-                    },
-                    body: JSON.stringify({ idea_id: currentIdeaId }),
-                });
-            })
-            .then(response => response.json())
-            .then(questions => {
+                const questions = data.questions;
                 console.log('Perguntas geradas:', questions);
                 currentQuestions = questions;
                 currentQuestionIndex = 0;
@@ -161,17 +155,18 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                return fetch('/generate_tasks', {
+                return fetch(`/api/ideas/${currentIdeaId}/bootstrap`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
                         'X-CSRFToken': getCsrfToken()
                     },
-                    body: JSON.stringify({ idea_id: currentIdeaId }),
+                    body: JSON.stringify({}),
                 });
             }
         })
         .then(response => response.json())
+        .then(waitForJob)
         .then(data => {
             if (data.success) {
                 // Criar e exibir o modal de sucesso
@@ -185,7 +180,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                     <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
                                 </div>
                                 <div class="modal-body">
-                                    <p>Respostas enviadas e tarefas geradas com sucesso! Redirecionando para o quadro Kanban.</p>
+                                    <p>Respostas enviadas! Tarefas, análise SWOT, metas e etapas legais foram geradas. Redirecionando para o quadro Kanban.</p>
                                 </div>
                                 <div class="modal-footer">
                                     <button type="button" class="btn btn-primary" data-bs-dismiss="modal">OK</button>
@@ -362,6 +357,72 @@ function getCsrfToken() {
     return document.querySelector('meta[name="csrf-token"]').getAttribute('content');
 }
 
+// Acompanha um job de geração em segundo plano (/api/jobs/<id>) até o fim e
+// resolve com o resultado. Respostas sem job_id são repassadas sem alteração.
+function waitForJob(data, interval = 1500) {
+    if (!data || !data.job_id) {
+        return Promise.resolve(data);
+    }
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(`/api/jobs/${data.job_id}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done') {
+                    resolve(job.result);
+                } else if (job.status === 'failed') {
+                    reject(new Error(job.error || 'Falha ao processar a solicitação'));
+                } else {
+                    setTimeout(poll, interval);
+                }
+            })
+            .catch(reject);
+        }
+        poll();
+    });
+}
+
+// Lê uma resposta Server-Sent Events via fetch (funciona com POST) e chama
+// onToken para cada trecho recebido. Resolve com o payload do evento 'done'.
+async function streamEvents(url, options, onToken) {
+    const response = await fetch(url, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Accept': 'text/event-stream' }
+    });
+    if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || `HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+
+            const payload = JSON.parse(data);
+            if (eventName === 'done') return payload;
+            if (eventName === 'error') throw new Error(payload.error || 'Erro desconhecido');
+            onToken(payload.token);
+        }
+    }
+    throw new Error('Conexão encerrada antes do fim da resposta');
+}
+
 function showAlert(message, type) {
     const existingAlert = document.querySelector('.alert');
     if (existingAlert) {
@@ -43,19 +43,18 @@ document.addEventListener('DOMContentLoaded', function() {
         generateResearchBtn.disabled = true;
         generateResearchBtn.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Gerando...';
 
-        fetch(`/api/market_research/${getIdeaId()}/generate`, {
+        let researchText = '';
+        streamEvents(`/api/market_research/${getIdeaId()}/generate`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCsrfToken()
             },
             body: JSON.stringify({ location: location, options: options })
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            return response.json();
+        }, token => {
+            researchText += token;
+            researchContent.innerHTML = formatResearchContent(researchText);
+            researchResults.style.display = 'block';
         })
         .then(data => {
             if (data.success) {
@@ -134,8 +134,28 @@ document.addEventListener('DOMContentLoaded', function() {
             this.disabled = true;
             document.querySelector('#confirmRegenerateModal .btn-secondary').disabled = true;
 
-            // Fazer uma requisição GET em vez de POST
-            window.location.href = `/generate_swot/${ideaId}`;
+            fetch(`/generate_swot/${ideaId}`, {
+                method: 'POST',
+                headers: {
+                    'X-CSRFToken': getCsrfToken()
+                }
+            })
+            .then(response => response.json())
+            .then(waitForJob)
+            .then(data => {
+                if (data.success) {
+                    location.reload();
+                } else {
+                    throw new Error(data.error || 'Erro desconhecido');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                alert('Erro ao gerar SWOT. Por favor, tente novamente.');
+                document.getElementById('regenerateLoader').style.display = 'none';
+                this.disabled = false;
+                document.querySelector('#confirmRegenerateModal .btn-secondary').disabled = false;
+            });
         });
     });
 
@@ -183,28 +203,29 @@ document.addEventListener('DOMContentLoaded', function() {
             generateSwotBtn.disabled = true;
             
             // Fazer uma requisição AJAX em vez de redirecionar
-            $.ajax({
+            Promise.resolve($.ajax({
                 url: `/generate_swot/${ideaId}`,
                 method: 'POST',
                 headers: {
                     'X-CSRFToken': getCsrfToken()
-                },
-                success: function(response) {
-                    if (response.success) {
-                        // Recarregar a página ou atualizar o conteúdo SWOT
-                        location.reload();
-                    } else {
-                        alert('Erro ao gerar SWOT: ' + response.error);
-                    }
-                },
-                error: function() {
-                    alert('Erro ao gerar SWOT. Por favor, tente novamente.');
-                },
-                complete: function() {
-                    // Restaurar o botão ao estado original
-                    generateSwotBtn.innerHTML = originalBtnText;
-                    generateSwotBtn.disabled = false;
                 }
+            }))
+            .then(waitForJob)
+            .then(function(response) {
+                if (response.success) {
+                    // Recarregar a página ou atualizar o conteúdo SWOT
+                    location.reload();
+                } else {
+                    alert('Erro ao gerar SWOT: ' + response.error);
+                }
+            })
+            .catch(function() {
+                alert('Erro ao gerar SWOT. Por favor, tente novamente.');
+            })
+            .finally(function() {
+                // Restaurar o botão ao estado original
+                generateSwotBtn.innerHTML = originalBtnText;
+                generateSwotBtn.disabled = false;
             });
         });
     }
@@ -216,7 +237,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCsrfToken()
             },
-            body: JSON.stringify({ swot_id: swotId, category: category, content: content }),
+            // Sem swotId, o servidor cria a SWOT da ideia junto com o primeiro item
+            body: JSON.stringify({ swot_id: swotId, idea_id: swotAnalysisElement.dataset.ideaId, category: category, content: content }),
         })
         .then(response => response.json())
         .then(data => {
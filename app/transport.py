@@ -0,0 +1,192 @@
+from flask import current_app
+from contextlib import contextmanager
+from config import Config
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from app.scheduler import Overloaded
+import httpx
+import random
+import threading
+import time
+
+# Camada única de saída HTTP: pools keep-alive compartilhados, prazos por
+# rota, novas tentativas com jitter em 429/5xx e um circuit breaker por
+# serviço externo (OpenAI e RapidAPI).
+
+RAPIDAPI_HOST = "linkedin-data-api.p.rapidapi.com"
+
+
+class CircuitOpen(Overloaded):
+    def __init__(self, name, retry_after):
+        super().__init__(retry_after, f"Serviço externo '{name}' indisponível no momento. Tente novamente em instantes.")
+        self.name = name
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self.probe_started_at = None  # chamada de teste em andamento no estado half_open
+        self.total_failures = 0
+        self.total_rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'open':
+                elapsed = now - self.opened_at
+                if elapsed < self.reset_timeout:
+                    self.total_rejected += 1
+                    raise CircuitOpen(self.name, self.reset_timeout - elapsed)
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                # Só uma chamada de teste por vez; uma que passe de reset_timeout
+                # sem resultado conta como perdida e libera a próxima
+                if self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+                    self.total_rejected += 1
+                    raise CircuitOpen(self.name, self.reset_timeout - (now - self.probe_started_at))
+                self.probe_started_at = now
+
+    def release_probe(self):
+        # A chamada terminou sem dizer nada sobre o serviço (erro local, cancelamento)
+        with self._lock:
+            self.probe_started_at = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.probe_started_at = None
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'total_failures': self.total_failures,
+                'total_rejected': self.total_rejected
+            }
+
+
+_breakers = {
+    'openai': CircuitBreaker('openai', Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_TIMEOUT),
+    'rapidapi': CircuitBreaker('rapidapi', Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_TIMEOUT),
+}
+
+
+def is_upstream_failure(error):
+    if isinstance(error, (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, httpx.TransportError)):
+        return True
+    return isinstance(error, UpstreamError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+@contextmanager
+def guard(name):
+    breaker = _breakers[name]
+    breaker.before_call()
+    try:
+        yield
+    except Exception as e:
+        if is_upstream_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.release_probe()
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    else:
+        breaker.record_success()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=Config.OUTBOUND_POOL_SIZE,
+        max_keepalive_connections=Config.OUTBOUND_POOL_SIZE,
+        keepalive_expiry=30
+    )
+
+
+def build_openai_client():
+    # A SDK da OpenAI já repete 429/5xx com backoff exponencial e jitter.
+    # Com OPENAI_BASE_URL apontando para `flask openai-stub serve` a chave é opcional.
+    return OpenAI(
+        api_key=Config.OPENAI_API_KEY or ('stub' if Config.OPENAI_BASE_URL else None),
+        base_url=Config.OPENAI_BASE_URL,
+        max_retries=Config.OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(Config.LLM_DEFAULT_TIMEOUT, connect=Config.OUTBOUND_CONNECT_TIMEOUT),
+        http_client=httpx.Client(limits=_limits())
+    )
+
+
+def build_async_openai_client():
+    # Só pode ser usado no event loop de app/aio.py: o pool do httpx fica
+    # preso ao loop em que as conexões foram abertas.
+    size = Config.LLM_ASYNC_POOL_SIZE
+    return AsyncOpenAI(
+        api_key=Config.OPENAI_API_KEY or ('stub' if Config.OPENAI_BASE_URL else None),
+        base_url=Config.OPENAI_BASE_URL,
+        max_retries=Config.OPENAI_MAX_RETRIES,
+        timeout=httpx.Timeout(Config.LLM_DEFAULT_TIMEOUT, connect=Config.OUTBOUND_CONNECT_TIMEOUT),
+        http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=30))
+    )
+
+
+_rapidapi_client = httpx.Client(
+    base_url=f"https://{RAPIDAPI_HOST}",
+    limits=_limits(),
+    timeout=httpx.Timeout(Config.RAPIDAPI_TIMEOUT, connect=Config.OUTBOUND_CONNECT_TIMEOUT)
+)
+
+
+def deadline_for(route):
+    return current_app.config.get('LLM_ROUTE_TIMEOUTS', {}).get(route, current_app.config.get('LLM_DEFAULT_TIMEOUT', 60))
+
+
+def rapidapi_post(path, payload):
+    headers = {
+        'x-rapidapi-key': current_app.config['RAPIDAPI_KEY'],
+        'x-rapidapi-host': RAPIDAPI_HOST,
+        'Content-Type': "application/json"
+    }
+    max_retries = current_app.config.get('RAPIDAPI_MAX_RETRIES', 2)
+    attempt = 0
+    while True:
+        try:
+            with guard('rapidapi'):
+                response = _rapidapi_client.post(path, json=payload, headers=headers)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise UpstreamError(response.status_code, f"RapidAPI respondeu {response.status_code}")
+                return response.json()
+        except (UpstreamError, httpx.TransportError):
+            if attempt >= max_retries:
+                raise
+            # Backoff exponencial com jitter completo
+            time.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+            attempt += 1
+
+
+def status():
+    return {
+        'breakers': {name: breaker.status() for name, breaker in _breakers.items()},
+        'pool_size': Config.OUTBOUND_POOL_SIZE
+    }
@@ -0,0 +1,43 @@
+from flask import current_app
+from contextlib import contextmanager
+from app import db
+
+# Chamadas à OpenAI levam segundos. Se a sessão do banco continuar com uma
+# transação aberta durante esse tempo, a conexão fica presa fora do pool (a
+# concorrência passa a depender do tamanho do pool) e, no SQLite, quem quer
+# escrever fica bloqueado. Os handlers que chamam o LLM seguem três fases:
+#
+#   1. carregar as entradas (mensagens, ids) com a sessão normalmente;
+#   2. `release()`: encerrar a transação e devolver a conexão ao pool;
+#   3. chamar o LLM e gravar o resultado em `with transaction():`.
+
+
+def release():
+    # Grava o que estiver pendente e encerra a transação sem expirar os
+    # objetos: os atributos já carregados continuam legíveis sem voltar ao
+    # banco. Relacionamentos ainda não carregados abrem uma nova transação.
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire_on_commit
+
+
+@contextmanager
+def transaction():
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def warn_if_held(route):
+    # Avisa quando uma chamada ao LLM começa com a transação ainda aberta
+    if not current_app.config.get('DB_WARN_HELD_DURING_LLM', True):
+        return
+    if db.session.registry.has() and db.session().in_transaction():
+        current_app.logger.warning(f"Chamada ao LLM em '{route}' com transação do banco aberta; use unit_of_work.release()")
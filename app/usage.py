@@ -0,0 +1,235 @@
+from flask import current_app, jsonify, g, request, has_request_context
+from flask.cli import AppGroup
+from app import db, scheduler
+from app.models import LLMUsage, UsageBudget, User
+from datetime import datetime, timedelta
+import atexit
+import click
+import threading
+import time
+
+# Registro de uso da OpenAI (tokens, custo e latência por chamada) e orçamento
+# diário de tokens por usuário. Os registros ficam em memória e são gravados
+# em lote por uma thread própria, fora do caminho da requisição. O dia do
+# orçamento é o dia UTC.
+
+_pending = []
+_lock = threading.Lock()
+_flush_now = threading.Event()
+_flusher = None
+_spent = {}
+
+usage_cli = AppGroup('usage', help='Consumo de tokens da OpenAI.')
+
+
+class BudgetExceeded(Exception):
+    retryable = False
+
+    def __init__(self, budget):
+        super().__init__("Limite diário de uso de IA atingido. Tente novamente amanhã.")
+        self.budget = budget
+
+
+def budget_exceeded_response(error):
+    return jsonify({"success": False, "error": str(error), "budget": error.budget}), 429
+
+
+def current_idea_id():
+    if has_request_context() and request.view_args and request.view_args.get('idea_id') is not None:
+        return request.view_args['idea_id']
+    return g.get('job_idea_id')
+
+
+def cost_for(model, prompt_tokens, completion_tokens):
+    prices = current_app.config.get('LLM_PRICES', {})
+    prompt_price, completion_price = prices.get(model, prices.get('default', (0, 0)))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def record(route, model, prompt_tokens, completion_tokens, latency):
+    user_id = scheduler.current_user_id()
+    now = datetime.utcnow()
+    entry = {
+        'user_id': user_id,
+        'idea_id': current_idea_id(),
+        'route': route,
+        'model': model,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'cost': cost_for(model, prompt_tokens, completion_tokens),
+        'latency_ms': int(latency * 1000),
+        'created_at': now
+    }
+    with _lock:
+        _pending.append(entry)
+        spent = _spent.get(user_id)
+        if spent and spent['day'] == now.date():
+            spent['tokens'] += entry['total_tokens']
+        pending = len(_pending)
+
+    _ensure_flusher(current_app._get_current_object())
+    if pending >= current_app.config.get('LLM_USAGE_BATCH_SIZE', 50):
+        _flush_now.set()
+
+
+def flush():
+    with _lock:
+        batch = _pending[:]
+        del _pending[:]
+    if not batch:
+        return 0
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(LLMUsage.__table__.insert(), batch)
+    except Exception as e:
+        current_app.logger.error(f"Falha ao gravar uso da OpenAI: {str(e)}")
+        # Devolve o lote para a próxima tentativa, sem deixar a fila crescer sem limite
+        max_pending = current_app.config.get('LLM_USAGE_MAX_PENDING', 10000)
+        with _lock:
+            _pending[:0] = batch
+            del _pending[:max(len(_pending) - max_pending, 0)]
+        return 0
+    return len(batch)
+
+
+def _flusher_loop(app):
+    with app.app_context():
+        interval = app.config.get('LLM_USAGE_FLUSH_INTERVAL', 5)
+        while True:
+            _flush_now.wait(interval)
+            _flush_now.clear()
+            flush()
+
+
+def _flush_at_exit(app):
+    with app.app_context():
+        flush()
+
+
+def _ensure_flusher(app):
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flusher_loop, args=(app,), name='llm-usage-flusher', daemon=True)
+        _flusher.start()
+    atexit.register(_flush_at_exit, app)
+
+
+def _today_start():
+    return datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+
+def _spent_today(user_id):
+    # Total do dia lido do banco no máximo a cada LLM_USAGE_REFRESH_INTERVAL
+    # segundos; entre leituras é atualizado em memória a cada registro.
+    today = datetime.utcnow().date()
+    with _lock:
+        spent = _spent.get(user_id)
+    if spent and spent['day'] == today and time.monotonic() - spent['loaded_at'] < current_app.config.get('LLM_USAGE_REFRESH_INTERVAL', 60):
+        return spent
+
+    start = _today_start()
+    table = LLMUsage.__table__
+    with db.engine.connect() as conn:
+        tokens = conn.execute(
+            db.select(db.func.coalesce(db.func.sum(table.c.total_tokens), 0))
+            .where(table.c.user_id == user_id, table.c.created_at >= start)
+        ).scalar()
+        budget = conn.execute(
+            db.select(UsageBudget.__table__.c.daily_tokens).where(UsageBudget.__table__.c.user_id == user_id)
+        ).scalar()
+
+    with _lock:
+        tokens += sum(e['total_tokens'] for e in _pending if e['user_id'] == user_id and e['created_at'] >= start)
+        spent = {'day': today, 'tokens': tokens, 'budget': budget, 'loaded_at': time.monotonic()}
+        _spent[user_id] = spent
+    return spent
+
+
+def budget_status(user_id):
+    spent = _spent_today(user_id)
+    budget = spent['budget'] if spent['budget'] is not None else current_app.config.get('LLM_DAILY_TOKEN_BUDGET', 0)
+    return {
+        'budget': budget or None,
+        'spent_today': spent['tokens'],
+        'remaining': max(budget - spent['tokens'], 0) if budget else None
+    }
+
+
+def check_budget(estimated_tokens=0):
+    user_id = scheduler.current_user_id()
+    if user_id is None:
+        return
+    status = budget_status(user_id)
+    if status['budget'] and status['spent_today'] + estimated_tokens > status['budget']:
+        raise BudgetExceeded(status['budget'])
+
+
+GROUPS = {
+    'route': LLMUsage.route,
+    'model': LLMUsage.model,
+    'idea': LLMUsage.idea_id,
+    'user': LLMUsage.user_id,
+    'day': db.func.date(LLMUsage.created_at),
+}
+
+
+def aggregate(group_by, days, user_id=None):
+    flush()
+    key = GROUPS[group_by]
+    query = db.session.query(
+        key.label('key'),
+        db.func.count(LLMUsage.id),
+        db.func.sum(LLMUsage.prompt_tokens),
+        db.func.sum(LLMUsage.completion_tokens),
+        db.func.sum(LLMUsage.total_tokens),
+        db.func.sum(LLMUsage.cost),
+        db.func.avg(LLMUsage.latency_ms)
+    ).filter(LLMUsage.created_at >= datetime.utcnow() - timedelta(days=days))
+    if user_id is not None:
+        query = query.filter(LLMUsage.user_id == user_id)
+    rows = query.group_by(key).order_by(db.func.sum(LLMUsage.total_tokens).desc()).all()
+    return [
+        {
+            'key': str(row[0]) if row[0] is not None else None,
+            'calls': row[1],
+            'prompt_tokens': row[2] or 0,
+            'completion_tokens': row[3] or 0,
+            'total_tokens': row[4] or 0,
+            'cost': round(row[5] or 0, 4),
+            'avg_latency_ms': int(row[6] or 0)
+        }
+        for row in rows
+    ]
+
+
+@usage_cli.command('report')
+@click.option('--by', 'group_by', type=click.Choice(sorted(GROUPS)), default='route', help='Agrupamento.')
+@click.option('--days', default=7, help='Janela em dias.')
+def report_command(group_by, days):
+    """Mostra o consumo agregado de todos os usuários."""
+    click.echo(f"{group_by:<30} {'chamadas':>9} {'tokens':>12} {'custo (USD)':>12} {'lat. média':>11}")
+    for row in aggregate(group_by, days):
+        click.echo(f"{str(row['key']):<30} {row['calls']:>9} {row['total_tokens']:>12} {row['cost']:>12.4f} {row['avg_latency_ms']:>9}ms")
+
+
+@usage_cli.command('set-budget')
+@click.argument('username')
+@click.argument('daily_tokens', type=int)
+def set_budget_command(username, daily_tokens):
+    """Define o orçamento diário de tokens de um usuário (0 = sem limite)."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"Usuário '{username}' não encontrado.")
+    budget = UsageBudget.query.filter_by(user_id=user.id).first()
+    if budget is None:
+        budget = UsageBudget(user_id=user.id, daily_tokens=daily_tokens)
+        db.session.add(budget)
+    else:
+        budget.daily_tokens = daily_tokens
+    db.session.commit()
+    with _lock:
+        _spent.pop(user.id, None)
+    click.echo(f"Orçamento diário de {username}: {daily_tokens or 'sem limite'} tokens.")
@@ -10,6 +10,7 @@ class Config:
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')  # ex.: http://localhost:8765/v1 para o stub local
     RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY')
     WTF_CSRF_ENABLED = True
     MAIL_SERVER = 'smtp.example.com'
@@ -18,3 +19,152 @@ class Config:
     MAIL_USERNAME = 'your_email@example.com'
     MAIL_PASSWORD = 'your_email_password'
     MAIL_DEFAULT_SENDER = 'your_email@example.com'
+
+    # Cache de respostas da OpenAI (app/llm.py)
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))  # segundos
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 5000))
+    LLM_CACHE_EVICTION_INTERVAL = 50  # gravações entre cada limpeza
+    # Rotas conversacionais ou que devem sempre gerar conteúdo novo
+    LLM_CACHE_DISABLED_ROUTES = set(filter(None, os.environ.get(
+        'LLM_CACHE_DISABLED_ROUTES',
+        'chat_with_assistant,legal_consultation,generate_more_tasks'
+    ).split(',')))
+
+    # Fila de jobs em segundo plano (app/jobs.py)
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))  # threads no processo web; 0 = só `flask jobs worker`
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    JOBS_RETRY_BACKOFF = 5  # segundos, dobra a cada tentativa
+    JOBS_POLL_INTERVAL = 2
+    JOBS_STALE_AFTER = 600  # jobs 'running' há mais tempo que isso voltam para a fila
+
+    # Snapshots de contexto por ideia usados nos prompts (app/idea_context.py)
+    CONTEXT_CACHE_TTL = int(os.environ.get('CONTEXT_CACHE_TTL', 300))  # limita a defasagem entre processos
+    CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get('CONTEXT_CACHE_MAX_ENTRIES', 2000))
+
+    # Memória do assistente (app/memory.py)
+    CHAT_MEMORY_WINDOW = 6  # mensagens recentes enviadas literalmente
+    CHAT_SUMMARY_BATCH = 4  # mensagens fora da janela acumuladas antes de resumir
+    CHAT_SUMMARY_MAX_WORDS = 250
+    CHAT_TOKEN_BUDGETS = {'gpt-4': 6000, 'gpt-4o-mini': 16000, 'default': 6000}
+    CHAT_REPLY_RESERVE = 1000  # tokens reservados para a resposta
+
+    # Escalonador das chamadas à OpenAI (app/scheduler.py)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 16))
+    LLM_PER_USER_CONCURRENCY = int(os.environ.get('LLM_PER_USER_CONCURRENCY', 2))
+    LLM_MAX_BACKLOG = int(os.environ.get('LLM_MAX_BACKLOG', 32))  # acima disso responde 503
+    LLM_MAX_QUEUE_WAIT = 20  # segundos esperando na fila antes de desistir
+    LLM_REQUESTS_PER_MINUTE = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 500))
+    LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 200000))
+    # Rotas em que o usuário está esperando a resposta têm prioridade
+    LLM_INTERACTIVE_ROUTES = {
+        'chat_with_assistant', 'legal_consultation', 'get_legal_step_details', 'improve_email',
+        'save_idea', 'generate_questions', 'search_networking', 'analyze_swot'
+    }
+
+    # Camada de saída HTTP para OpenAI e RapidAPI (app/transport.py)
+    OUTBOUND_POOL_SIZE = int(os.environ.get('OUTBOUND_POOL_SIZE', LLM_MAX_CONCURRENCY + JOBS_WORKERS))  # conexões keep-alive por serviço
+    OUTBOUND_CONNECT_TIMEOUT = 5  # segundos
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+    LLM_DEFAULT_TIMEOUT = int(os.environ.get('LLM_DEFAULT_TIMEOUT', 60))  # prazo total de cada chamada
+    # Rotas interativas com prazo menor; gerações longas em segundo plano com prazo maior
+    LLM_ROUTE_TIMEOUTS = {
+        'save_idea': 20, 'generate_questions': 30, 'improve_email': 30,
+        'search_networking': 20, 'analyze_swot': 45, 'get_legal_step_details': 45,
+        'generate_market_research': 120, 'generate_goals': 120, 'generate_legal_steps': 120
+    }
+    RAPIDAPI_TIMEOUT = 15
+    RAPIDAPI_MAX_RETRIES = 2
+    BREAKER_FAILURE_THRESHOLD = 5  # falhas seguidas antes de abrir o circuito
+    BREAKER_RESET_TIMEOUT = 30  # segundos com o circuito aberto antes de testar de novo
+
+    # Roteamento de modelos por rota (app/routing.py), do melhor para o mais rápido
+    LLM_MODEL_TIERS = {
+        'default': ['gpt-4o-mini'],
+        'chat_with_assistant': ['gpt-4', 'gpt-4o-mini'],
+        'analyze_swot': ['gpt-4', 'gpt-4o-mini'],
+        'generate_goals': ['gpt-4', 'gpt-4o-mini'],
+        'search_networking': ['gpt-4', 'gpt-4o-mini'],
+        'improve_email': ['gpt-4', 'gpt-4o-mini'],
+    }
+    LLM_ROUTING_WINDOW = 50  # amostras de latência guardadas por modelo
+    LLM_ROUTING_MIN_SAMPLES = 10  # abaixo disso o modelo é considerado saudável
+    LLM_ROUTING_DEADLINE_FRACTION = 0.8  # o p95 precisa caber nesta fração do prazo da rota
+    LLM_ROUTING_MAX_ERROR_RATE = 0.2
+    # Rota -> segundos até disparar uma segunda chamada em paralelo (dobra o custo quando dispara)
+    LLM_HEDGE_ROUTES = {'save_idea': 8, 'generate_questions': 12}
+
+    # Regeneração em lote via `flask regen` (app/regenerate.py)
+    REGEN_BATCH_BACKEND = os.environ.get('REGEN_BATCH_BACKEND', 'openai')  # 'openai' ou 'local'
+    REGEN_STATE_DIR = os.environ.get('REGEN_STATE_DIR')  # padrão: instance/regeneration
+    REGEN_POLL_INTERVAL = 60  # segundos entre consultas ao lote
+    REGEN_APPLY_CHUNK = 500  # resultados aplicados por transação
+
+    # Benchmark dos prompts via `flask bench` (app/bench.py)
+    BENCH_REPORT_DIR = os.environ.get('BENCH_REPORT_DIR')  # padrão: instance/benchmarks
+
+    # Registro de uso e orçamento de tokens (app/usage.py)
+    LLM_DAILY_TOKEN_BUDGET = int(os.environ.get('LLM_DAILY_TOKEN_BUDGET', 200000))  # por usuário; 0 = sem limite
+    LLM_USAGE_BATCH_SIZE = 50  # registros acumulados que disparam uma gravação
+    LLM_USAGE_FLUSH_INTERVAL = 5  # segundos entre gravações
+    LLM_USAGE_MAX_PENDING = 10000  # registros mantidos em memória se o banco falhar
+    LLM_USAGE_REFRESH_INTERVAL = 60  # segundos entre releituras do total diário no banco
+    # USD por milhão de tokens (entrada, saída)
+    LLM_PRICES = {
+        'gpt-4': (30.0, 60.0),
+        'gpt-4o-mini': (0.15, 0.60),
+        'default': (0, 0)
+    }
+
+    # Reaproveitamento de respostas jurídicas semelhantes (app/legal_answers.py)
+    LEGAL_ANSWER_REUSE_ENABLED = os.environ.get('LEGAL_ANSWER_REUSE_ENABLED', 'true').lower() == 'true'
+    LEGAL_ANSWER_MIN_SIMILARITY = 0.85  # similaridade do cosseno mínima para reaproveitar
+    LEGAL_ANSWER_SHARE_ACROSS_USERS = False  # as respostas levam em conta o contexto da ideia; sem compartilhar, só a mesma ideia reaproveita
+    LEGAL_ANSWER_INDEX_MAX = 20000  # mensagens mais recentes carregadas no índice
+    LEGAL_ANSWER_INDEX_TTL = 600  # segundos até reconstruir o índice a partir do banco
+
+    # Coalescência e idempotência das rotas de geração (app/idempotency.py)
+    IDEMPOTENCY_TTL = 24 * 3600  # segundos que uma resposta com Idempotency-Key é reaproveitada
+    SINGLE_FLIGHT_REPLAY_WINDOW = 10  # segundos que uma resposta sem chave é reaproveitada (clique duplo)
+    SINGLE_FLIGHT_WAIT = 60  # segundos que uma requisição repetida espera pela original
+    SINGLE_FLIGHT_LEASE = 120  # depois disso uma execução sem resposta é considerada abandonada
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.2
+    IDEMPOTENCY_PURGE_INTERVAL = 100  # requisições entre limpezas dos registros vencidos
+
+    # Pré-geração especulativa após salvar as respostas (app/speculative.py)
+    SPECULATIVE_GENERATION = os.environ.get('SPECULATIVE_GENERATION', 'false').lower() == 'true'
+    SPECULATIVE_KINDS = ('generate_tasks', 'generate_swot')
+    SPECULATIVE_DAILY_LIMIT = int(os.environ.get('SPECULATIVE_DAILY_LIMIT', 10))  # jobs especulativos por usuário por dia
+    SPECULATIVE_MIN_REMAINING_TOKENS = 20000  # abaixo disso do orçamento diário não especula
+    SPECULATIVE_RESULT_WINDOW = 3600  # segundos em que um resultado especulativo pode ser adotado
+
+    # Contexto do assistente por busca local (app/retrieval.py)
+    RETRIEVAL_TOP_K = 12  # itens mais relevantes incluídos no prompt
+    RETRIEVAL_TOKEN_BUDGET = 1500  # tokens para os itens; se a ideia inteira couber, vai inteira
+    RETRIEVAL_BM25_K1 = 1.2
+    RETRIEVAL_BM25_B = 0.75
+    RETRIEVAL_INDEX_TTL = 600  # segundos até remontar o índice de uma ideia a partir do banco
+    RETRIEVAL_MAX_INDEXES = 500  # ideias com índice em memória
+
+    # Sessão do banco durante chamadas ao LLM (app/unit_of_work.py)
+    DB_WARN_HELD_DURING_LLM = True  # loga quando uma chamada começa com transação aberta
+
+    # Caminho assíncrono das chamadas ao LLM (app/aio.py)
+    LLM_ASYNC_POOL_SIZE = int(os.environ.get('LLM_ASYNC_POOL_SIZE', 200))  # conexões do AsyncOpenAI
+    DB_THREAD_POOL_SIZE = int(os.environ.get('DB_THREAD_POOL_SIZE', 8))  # threads para o trabalho de banco das views/jobs async
+    JOBS_ASYNC_SLOTS = int(os.environ.get('JOBS_ASYNC_SLOTS', 0))  # jobs async simultâneos no event loop; 0 = só as threads
+
+    # Carregamento antecipado nas rotas de listagem (app/loading.py)
+    EAGER_LOAD_STRICT = os.environ.get('EAGER_LOAD_STRICT', '0') == '1'  # erro em carregamento preguiçoso fora do perfil
+
+    # Tags e categorias de despesa (app/reference_data.py)
+    REFERENCE_CACHE_SIZE = 5000  # nomes em cache por tipo, por processo
+    REFERENCE_CATEGORY_TTL = 300  # segundos até recarregar a lista de categorias (alterações em outros processos)
+
+    # Exclusão de ideias (app/idea_deletion.py)
+    IDEA_PURGE_THRESHOLD = 2000  # linhas dependentes acima das quais a remoção vai para um job
+    IDEA_PURGE_BATCH = 500  # linhas removidas por transação no job
+    IDEA_PURGE_PAUSE = 0.05  # segundos entre os blocos
+
+    # Endpoints de métricas internas (cache, escalonador, transporte, roteamento)
+    OPERATOR_EMAILS = {e.strip().lower() for e in os.environ.get('OPERATOR_EMAILS', '').split(',') if e.strip()}  # vazio = ninguém
@@ -0,0 +1,60 @@
+"""indices por ideia
+
+Revision ID: 4f2a9c1d7e35
+Revises: 0729c4e5f187
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from contextlib import nullcontext
+
+
+# revision identifiers, used by Alembic.
+revision = '4f2a9c1d7e35'
+down_revision = '0729c4e5f187'
+branch_labels = None
+depends_on = None
+
+
+# Tabela -> índices (nome, colunas), na ordem dos filtros e ordenações das rotas
+INDEXES = {
+    'idea': [('ix_idea_user_timestamp', ['user_id', 'timestamp'])],
+    'question': [('ix_question_idea', ['idea_id'])],
+    'task': [('ix_task_idea_order', ['idea_id', 'order']), ('ix_task_idea_status', ['idea_id', 'status'])],
+    'task_tags': [('ix_task_tags_tag', ['tag_id'])],
+    'expense': [('ix_expense_idea_date', ['idea_id', 'date'])],
+    'expense_tags': [('ix_expense_tags_tag', ['tag_id'])],
+    'swot_item': [('ix_swot_item_swot_category', ['swot_id', 'category'])],
+    'swot_analysis': [('ix_swot_analysis_swot_timestamp', ['swot_id', 'timestamp'])],
+    'chat_message': [('ix_chat_message_idea_id', ['idea_id', 'id'])],
+    'networking_contact': [('ix_networking_contact_idea_created', ['idea_id', 'created_at'])],
+    'networking_post': [('ix_networking_post_idea_created', ['idea_id', 'created_at'])],
+    'goal': [('ix_goal_idea_created', ['idea_id', 'created_at'])],
+    'legal_step': [('ix_legal_step_idea_order', ['idea_id', 'order'])],
+    'legal_consultation': [('ix_legal_consultation_idea_created', ['idea_id', 'created_at'])],
+    'market_research': [('ix_market_research_idea_created', ['idea_id', 'created_at'])],
+    'customer': [('ix_customer_idea_name', ['idea_id', 'name'])],
+}
+
+
+def _concurrently():
+    # No PostgreSQL os índices são criados fora de transação, sem bloquear
+    # as escritas nas tabelas durante a criação
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    concurrently = _concurrently()
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for table, indexes in INDEXES.items():
+            for name, columns in indexes:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = _concurrently()
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for table, indexes in reversed(list(INDEXES.items())):
+            for name, _ in indexes:
+                op.drop_index(name, table_name=table, postgresql_concurrently=concurrently)
@@ -0,0 +1,72 @@
+"""exclusao em cascata
+
+Revision ID: 9b3e6d2f8a41
+Revises: 4f2a9c1d7e35
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e6d2f8a41'
+down_revision = '4f2a9c1d7e35'
+branch_labels = None
+depends_on = None
+
+
+# Tabela -> [(coluna, tabela referenciada)] das chaves que passam a ter ON DELETE CASCADE
+FOREIGN_KEYS = {
+    'question': [('idea_id', 'idea')],
+    'task': [('idea_id', 'idea')],
+    'task_tags': [('task_id', 'task'), ('tag_id', 'tag')],
+    'swot': [('idea_id', 'idea')],
+    'swot_analysis': [('swot_id', 'swot')],
+    'swot_item': [('swot_id', 'swot')],
+    'expense': [('idea_id', 'idea')],
+    'expense_tags': [('expense_id', 'expense'), ('tag_id', 'tag')],
+    'chat_message': [('idea_id', 'idea')],
+    'networking_contact': [('idea_id', 'idea')],
+    'networking_post': [('idea_id', 'idea')],
+    'goal': [('idea_id', 'idea')],
+    'legal_step': [('idea_id', 'idea')],
+    'legal_consultation': [('idea_id', 'idea')],
+    'market_research': [('idea_id', 'idea')],
+    'customer': [('idea_id', 'idea')],
+    'conversation_memory': [('idea_id', 'idea')],
+}
+
+# Mesmo nome que o PostgreSQL dá às chaves sem nome; no SQLite, que não
+# guarda nomes, a convenção permite achar as chaves ao recriar a tabela
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _replace_foreign_keys(ondelete):
+    bind = op.get_bind()
+    sqlite = bind.dialect.name == 'sqlite'
+    if sqlite:
+        # Com as chaves ativas, recriar uma tabela apagaria em cascata as linhas que a referenciam
+        with op.get_context().autocommit_block():
+            op.execute('PRAGMA foreign_keys=OFF')
+    for table, keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in keys:
+                name = f'{table}_{column}_fkey'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+    if sqlite:
+        with op.get_context().autocommit_block():
+            op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    with op.batch_alter_table('idea') as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
+    with op.batch_alter_table('idea') as batch_op:
+        batch_op.drop_column('deleted_at')
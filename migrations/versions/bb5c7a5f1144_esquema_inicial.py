@@ -0,0 +1,27 @@
+"""esquema inicial
+
+Revision ID: bb5c7a5f1144
+Revises: 
+Create Date: 2024-10-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bb5c7a5f1144'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Revisão em que os bancos existentes estão carimbados. As tabelas dela foram
+# criadas antes de o histórico de migrações entrar no repositório, então a
+# revisão não altera nada; as migrações seguintes partem dela.
+def upgrade():
+    pass
+
+
+def downgrade():
+    pass